@@ -1,8 +1,14 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
 from app.database import get_db
-from app.services.calculation_service import CalculationService
-from typing import List, Dict, Any
+from app.services.calculation_service import CalculationService, ABC_GROUPS, SALES_METRICS_DAYS, ANALYTICS_PAGE_SIZE
+from app.services.recalc_service import dirty_count, process_dirty
+from app.services.summary_service import SummaryService, SUMMARY_DIMENSIONS
+from app.services.shard_service import ShardedRecalculation
+from app.services.pricing_service import PricingSimulator
+from app.services.snapshot_service import catalog_snapshot
+from app.schemas.product import PricingSimulationRequest
+from typing import List, Dict, Any, Literal, Optional
 
 router = APIRouter()
 
@@ -41,11 +47,16 @@ def recalculate_margin(barcode: str, db: Session = Depends(get_db)):
         raise HTTPException(status_code=500, detail=f"Ошибка расчета: {str(e)}")
 
 @router.post("/abc-categories/recalculate")
-def recalculate_abc_categories(db: Session = Depends(get_db)):
-    """Пересчитать ABC категории для всех товаров"""
+def recalculate_abc_categories(group_by: Optional[str] = None, db: Session = Depends(get_db)):
+    """
+    Пересчитать ABC категории для всех товаров
+    group_by — ABC внутри групп: brand, product_category или product_type
+    """
+    if group_by is not None and group_by not in ABC_GROUPS:
+        raise HTTPException(status_code=400, detail=f"group_by: одно из {', '.join(ABC_GROUPS)}")
     try:
         calc_service = CalculationService(db)
-        result = calc_service.calculate_abc_category()
+        result = calc_service.calculate_abc_category(group_by=group_by)
         return {
             "status": "success",
             "message": f"ABC категории рассчитаны для {result['success']} товаров",
@@ -54,12 +65,68 @@ def recalculate_abc_categories(db: Session = Depends(get_db)):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Ошибка расчета: {str(e)}")
 
-@router.post("/recalculate-all")
-def recalculate_all(db: Session = Depends(get_db)):
-    """Пересчитать все расчетные поля"""
+@router.post("/turnover/recalculate")
+def recalculate_turnover(days: int = Query(SALES_METRICS_DAYS, ge=7), db: Session = Depends(get_db)):
+    """
+    Пересчитать оборачиваемость и XYZ категории всех товаров
+    по истории продаж за последние days дней (целыми неделями)
+    """
     try:
         calc_service = CalculationService(db)
-        result = calc_service.recalculate_all()
+        result = calc_service.calculate_sales_metrics(days=days)
+        return {
+            "status": "success",
+            "message": f"Оборачиваемость рассчитана для {result['total']} товаров, с продажами: {result['success']}",
+            "data": result
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Ошибка расчета: {str(e)}")
+
+@router.post("/stock/recalculate")
+def recalculate_stock_metrics(db: Session = Depends(get_db)):
+    """Пересчитать дни с остатком, серии без остатка и средний остаток по снимкам остатков 1С"""
+    try:
+        calc_service = CalculationService(db)
+        result = calc_service.calculate_stock_metrics()
+        return {
+            "status": "success",
+            "message": f"Показатели остатков рассчитаны для {result['total']} товаров",
+            "data": result
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Ошибка расчета: {str(e)}")
+
+@router.get("/dirty")
+def get_dirty_status(db: Session = Depends(get_db)):
+    """Число товаров, ожидающих фонового пересчета расчетных полей"""
+    return {"pending": dirty_count(db)}
+
+@router.post("/dirty/process")
+def process_dirty_now(db: Session = Depends(get_db)):
+    """Пересчитать отмеченные товары сейчас, не дожидаясь фонового пересчета"""
+    try:
+        processed = process_dirty(db)
+        return {
+            "status": "success",
+            "message": f"Пересчитано товаров: {processed}",
+            "data": {"processed": processed}
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Ошибка расчета: {str(e)}")
+
+@router.post("/recalculate-all")
+def recalculate_all(shards: int = Query(1, ge=1, le=64), db: Session = Depends(get_db)):
+    """
+    Пересчитать все расчетные поля.
+    shards > 1 — параллельно: каталог делится на shards диапазонов штрихкодов,
+    которые считаются в пуле процессов; в ответе — время по каждой части
+    """
+    try:
+        if shards > 1:
+            result = ShardedRecalculation(db).run(shards)
+        else:
+            calc_service = CalculationService(db)
+            result = calc_service.recalculate_all()
         return {
             "status": "success",
             "message": "Все расчетные поля обновлены",
@@ -68,37 +135,84 @@ def recalculate_all(db: Session = Depends(get_db)):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Ошибка расчета: {str(e)}")
 
+@router.post("/pricing/simulate")
+def simulate_pricing(request: PricingSimulationRequest, refresh: bool = False, db: Session = Depends(get_db)):
+    """
+    Симуляция изменения цен без записи в базу: правила (фильтры + скидка или изменение цены, %)
+    применяются по порядку. В ответе — наценка и число товаров ниже минимальной цены до и после,
+    изменившиеся товары (первые limit). refresh — перечитать цены из базы
+    """
+    try:
+        result = PricingSimulator(db).simulate(
+            [rule.model_dump() for rule in request.rules], request.limit, refresh
+        )
+        return {
+            "status": "success",
+            "data": result
+        }
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Ошибка расчета: {str(e)}")
+
+def _analytics_page(result: dict) -> dict:
+    return {
+        "status": "success",
+        "count": len(result['items']),
+        "data": result['items'],
+        "next_cursor": result['next_cursor'],
+        "source": result['source']
+    }
+
 @router.get("/analytics/low-stock")
 def get_low_stock_products(
     threshold: int = 5,
+    limit: int = Query(ANALYTICS_PAGE_SIZE, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    sort: str = 'stock_total',
+    order: Literal['asc', 'desc'] = 'asc',
+    brand: Optional[str] = None,
+    product_category: Optional[str] = None,
     db: Session = Depends(get_db)
 ):
-    """Получить товары с низким остатком"""
+    """
+    Получить товары с низким остатком постранично.
+    Следующая страница — с cursor=next_cursor из ответа (null — страниц больше нет)
+    """
     try:
         calc_service = CalculationService(db)
-        products = calc_service.get_low_stock_products(threshold)
-        return {
-            "status": "success",
-            "count": len(products),
-            "data": products
-        }
+        result = calc_service.get_low_stock_products(
+            threshold, limit, cursor, sort, order == 'desc', brand, product_category
+        )
+        return _analytics_page(result)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Ошибка: {str(e)}")
 
 @router.get("/analytics/high-margin")
 def get_high_margin_products(
     min_margin_percent: float = 50.0,
+    limit: int = Query(ANALYTICS_PAGE_SIZE, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    sort: str = 'margin_percent',
+    order: Literal['asc', 'desc'] = 'desc',
+    brand: Optional[str] = None,
+    product_category: Optional[str] = None,
     db: Session = Depends(get_db)
 ):
-    """Получить товары с высокой наценкой"""
+    """
+    Получить товары с высокой наценкой постранично.
+    Следующая страница — с cursor=next_cursor из ответа (null — страниц больше нет)
+    """
     try:
         calc_service = CalculationService(db)
-        products = calc_service.get_high_margin_products(min_margin_percent)
-        return {
-            "status": "success",
-            "count": len(products),
-            "data": products
-        }
+        result = calc_service.get_high_margin_products(
+            min_margin_percent, limit, cursor, sort, order == 'desc', brand, product_category
+        )
+        return _analytics_page(result)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Ошибка: {str(e)}")
 
@@ -113,4 +227,55 @@ def get_abc_summary(db: Session = Depends(get_db)):
             "data": summary
         }
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Ошибка: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Ошибка: {str(e)}")
+
+@router.get("/analytics/summary/{dimension}")
+def get_summary(dimension: str, db: Session = Depends(get_db)):
+    """
+    Материализованная сводка: число товаров, остаток и стоимость остатка
+    по abc, brand, category или marketplace (без агрегации по каталогу)
+    """
+    if dimension not in SUMMARY_DIMENSIONS:
+        raise HTTPException(status_code=404, detail=f"Сводка: одна из {', '.join(SUMMARY_DIMENSIONS)}")
+    return {
+        "status": "success",
+        "data": SummaryService(db).get(dimension)
+    }
+
+@router.post("/analytics/summary/refresh")
+def refresh_summaries(db: Session = Depends(get_db)):
+    """Пересобрать сводки по всему каталогу"""
+    try:
+        rows = SummaryService(db).refresh()
+        db.commit()
+        return {
+            "status": "success",
+            "message": f"Сводки обновлены, строк: {rows}",
+            "data": {"rows": rows}
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Ошибка расчета: {str(e)}")
+
+@router.get("/analytics/snapshot")
+def get_snapshot_status(db: Session = Depends(get_db)):
+    """
+    Состояние снимка каталога в памяти: число товаров, объем, время сборки, возраст.
+    stale_reason не null — аналитика читается из БД
+    """
+    return {
+        "status": "success",
+        "data": catalog_snapshot.status(db)
+    }
+
+@router.post("/analytics/snapshot/rebuild")
+def rebuild_snapshot(db: Session = Depends(get_db)):
+    """Пересобрать снимок каталога сейчас"""
+    try:
+        snapshot = catalog_snapshot.rebuild(db)
+        return {
+            "status": "success",
+            "message": f"Снимок собран, товаров: {snapshot.rows}",
+            "data": catalog_snapshot.status(db)
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Ошибка: {str(e)}")
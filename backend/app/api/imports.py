@@ -1,168 +1,278 @@
-from fastapi import APIRouter, Depends, UploadFile, File, HTTPException
+from fastapi import APIRouter, Depends, UploadFile, File, HTTPException, Query, Request
+from starlette.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional, Union
 from app.database import get_db
-from app.services.import_service import ImportService
-from app.schemas.product import ImportLogResponse
-from app.models.product import ImportLog
+from app.services.import_service import (
+    ImportService, DryRunReport, IMPORT_SOURCES, check_import_file, is_import_active
+)
+from app.services.job_service import JobService
+from app.services.batch_service import BatchImportService
+from app.services.export_service import ExportService
+from app.services.upload_service import UPLOAD_DIR, ResumableUploads, save_upload, upload_path
+from app.utils.readers import STREAM_CHUNK_SIZE, SUPPORTED_EXTENSIONS, WrongFileError
+from app.schemas.product import (
+    ImportLogResponse, ImportJobResponse, BatchImportResponse,
+    ImportErrorListResponse, ImportDryRunResponse
+)
+from app.models.product import ImportLog, ImportRowError
+import logging
+import math
 import os
-import shutil
-from datetime import datetime
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, StreamingResponse
+from starlette.background import BackgroundTask
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
 
-UPLOAD_DIR = "uploads"
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 
-@router.post("/1c", response_model=ImportLogResponse)
-async def import_1c(
-    file: UploadFile = File(...),
-    db: Session = Depends(get_db)
-):
-    """Импорт данных из 1С"""
-    if not file.filename.endswith(('.xlsx', '.xls')):
-        raise HTTPException(status_code=400, detail="Файл должен быть в формате Excel")
+resumable_uploads = ResumableUploads()
+
+# Загрузка пишется на диск асинхронно порциями (с подсчетом SHA-256),
+# а сам импорт выполняется в пуле потоков — event loop (и /health) не блокируется
+
+def _check_extension(filename: str):
+    if not filename.lower().endswith(SUPPORTED_EXTENSIONS):
+        raise HTTPException(status_code=400, detail=f"Файл {filename} должен быть в формате Excel или CSV")
+
+def _check_file(source: str, file_path: str):
+    """Проверка заголовка до постановки в очередь: чужой файл отклоняется сразу (400)"""
+    try:
+        check_import_file(source, file_path)
+    except (WrongFileError, FileNotFoundError) as e:
+        os.remove(file_path)
+        raise HTTPException(status_code=400, detail=str(e))
+
+def _find_imported(db: Session, source: str, file_path: str, file_hash: str, force: bool) -> Optional[ImportLog]:
+    """
+    Ищет прошлый импорт того же файла из того же источника.
+    Если найден (и не передан force) — сохраненная копия удаляется, импорт не повторяется.
+    """
+    if force:
+        return None
+    import_log = ImportService(db).find_imported(source, file_hash)
+    if import_log is not None:
+        os.remove(file_path)
+    return import_log
+
+def _run_import(db: Session, source: str, file_path: str, file_hash: str, force: bool, **options) -> ImportLog:
+    import_log = _find_imported(db, source, file_path, file_hash, force)
+    if import_log is not None:
+        return import_log
+    import_service = ImportService(db, file_hash=file_hash)
+    return getattr(import_service, IMPORT_SOURCES[source])(file_path, **options)
+
+def _mark_duplicate(db: Session, report: DryRunReport, file_hash: str):
+    import_log = ImportService(db).find_imported(report.source, file_hash)
+    report.duplicate_of = import_log.id if import_log is not None else None
+
+def _dry_run(db: Session, source: str, file_path: str, file_hash: str, **options) -> DryRunReport:
+    """
+    Пробный импорт: разбор, проверка и сопоставление с каталогом без записи в БД.
+    Ошибка чтения файла попадает в отчет (status='failed'); сохраненная копия удаляется
+    """
+    import_service = ImportService(db, file_hash=file_hash, dry_run=True)
+    try:
+        getattr(import_service, IMPORT_SOURCES[source])(file_path, **options)
+    except Exception:
+        # Ошибка, закрывшая лог импорта, уже в отчете (status='failed'); до создания лога — отчета нет
+        if import_service.dry_run_report is None:
+            raise
+        logger.exception("Пробный импорт %s завершился ошибкой", source)
+    finally:
+        try:
+            os.remove(file_path)
+        except OSError:
+            logger.warning("Не удалось удалить копию загруженного файла %s", file_path, exc_info=True)
+    report = import_service.dry_run_report
+    _mark_duplicate(db, report, file_hash)
+    return report
+
+async def _import_upload(
+    db: Session,
+    source: str,
+    file: UploadFile,
+    force: bool,
+    dry_run: bool = False,
+    **options
+) -> Union[ImportLog, DryRunReport]:
+    _check_extension(file.filename)
     
-    # Сохраняем файл
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    file_path = os.path.join(UPLOAD_DIR, f"1c_{timestamp}_{file.filename}")
+    file_path = upload_path(source, file.filename)
     
     try:
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-        
-        # Импортируем данные
-        import_service = ImportService(db)
-        import_log = import_service.import_1c_data(file_path)
-        
-        return import_log
+        file_hash = await save_upload(file, file_path)
+        if dry_run:
+            return await run_in_threadpool(_dry_run, db, source, file_path, file_hash, **options)
+        return await run_in_threadpool(_run_import, db, source, file_path, file_hash, force, **options)
     
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Ошибка импорта: {str(e)}")
-    
-    finally:
-        # Опционально: удаляем файл после импорта
-        # os.remove(file_path)
-        pass
 
-@router.post("/wb/barcodes", response_model=ImportLogResponse)
+@router.post("/1c", response_model=Union[ImportLogResponse, ImportDryRunResponse])
+async def import_1c(
+    file: UploadFile = File(...),
+    bulk: bool = False,
+    stream: bool = False,
+    force: bool = False,
+    dry_run: bool = False,
+    db: Session = Depends(get_db)
+):
+    """
+    Импорт данных из 1С
+    bulk=true — массовая загрузка пачками;
+    stream=true — потоковое чтение файла порциями (для очень больших выгрузок);
+    force=true — импортировать повторно, даже если этот файл уже загружался;
+    dry_run=true — только проверить файл: счетчики, примеры ошибок и изменений без записи в БД
+    """
+    return await _import_upload(
+        db, '1c', file, force, dry_run,
+        bulk=bulk,
+        chunk_size=STREAM_CHUNK_SIZE if stream else None
+    )
+
+@router.post("/wb/barcodes", response_model=Union[ImportLogResponse, ImportDryRunResponse])
 async def import_wb_barcodes(
     file: UploadFile = File(...),
+    force: bool = False,
+    dry_run: bool = False,
     db: Session = Depends(get_db)
 ):
-    """Импорт таблицы с ШК Wildberries"""
-    if not file.filename.endswith(('.xlsx', '.xls')):
-        raise HTTPException(status_code=400, detail="Файл должен быть в формате Excel")
-    
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    file_path = os.path.join(UPLOAD_DIR, f"wb_barcodes_{timestamp}_{file.filename}")
-    
-    try:
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-        
-        import_service = ImportService(db)
-        import_log = import_service.import_wb_barcodes(file_path)
-        
-        return import_log
-    
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Ошибка импорта: {str(e)}")
+    """Импорт таблицы с ШК Wildberries (dry_run=true — только проверка файла, без записи в БД)"""
+    return await _import_upload(db, 'wb_barcodes', file, force, dry_run)
 
-@router.post("/wb/prices", response_model=ImportLogResponse)
+@router.post("/wb/prices", response_model=Union[ImportLogResponse, ImportDryRunResponse])
 async def import_wb_prices(
     file: UploadFile = File(...),
+    force: bool = False,
+    dry_run: bool = False,
     db: Session = Depends(get_db)
 ):
-    """Импорт цен Wildberries"""
-    if not file.filename.endswith(('.xlsx', '.xls')):
-        raise HTTPException(status_code=400, detail="Файл должен быть в формате Excel")
-    
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    file_path = os.path.join(UPLOAD_DIR, f"wb_prices_{timestamp}_{file.filename}")
-    
-    try:
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-        
-        import_service = ImportService(db)
-        import_log = import_service.import_wb_prices(file_path)
-        
-        return import_log
-    
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Ошибка импорта: {str(e)}")
+    """Импорт цен Wildberries (dry_run=true — только проверка файла, без записи в БД)"""
+    return await _import_upload(db, 'wb_prices', file, force, dry_run)
 
-@router.post("/wb/min-prices", response_model=ImportLogResponse)
+@router.post("/wb/min-prices", response_model=Union[ImportLogResponse, ImportDryRunResponse])
 async def import_wb_min_prices(
     file: UploadFile = File(...),
+    force: bool = False,
+    dry_run: bool = False,
     db: Session = Depends(get_db)
 ):
-    """Импорт минимальных цен Wildberries"""
-    if not file.filename.endswith(('.xlsx', '.xls')):
-        raise HTTPException(status_code=400, detail="Файл должен быть в формате Excel")
-    
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    file_path = os.path.join(UPLOAD_DIR, f"wb_min_prices_{timestamp}_{file.filename}")
-    
-    try:
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-        
-        import_service = ImportService(db)
-        import_log = import_service.import_wb_min_prices(file_path)
-        
-        return import_log
-    
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Ошибка импорта: {str(e)}")
+    """Импорт минимальных цен Wildberries (dry_run=true — только проверка файла, без записи в БД)"""
+    return await _import_upload(db, 'wb_min_prices', file, force, dry_run)
 
-@router.post("/ozon/barcodes", response_model=ImportLogResponse)
+@router.post("/ozon/barcodes", response_model=Union[ImportLogResponse, ImportDryRunResponse])
 async def import_ozon_barcodes(
     file: UploadFile = File(...),
+    force: bool = False,
+    dry_run: bool = False,
     db: Session = Depends(get_db)
 ):
-    """Импорт таблицы с ШК Ozon"""
-    if not file.filename.endswith(('.xlsx', '.xls')):
-        raise HTTPException(status_code=400, detail="Файл должен быть в формате Excel")
-    
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    file_path = os.path.join(UPLOAD_DIR, f"ozon_barcodes_{timestamp}_{file.filename}")
-    
-    try:
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-        
-        import_service = ImportService(db)
-        import_log = import_service.import_ozon_barcodes(file_path)
-        
-        return import_log
-    
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Ошибка импорта: {str(e)}")
+    """Импорт таблицы с ШК Ozon (dry_run=true — только проверка файла, без записи в БД)"""
+    return await _import_upload(db, 'ozon_barcodes', file, force, dry_run)
 
-@router.post("/ozon/prices", response_model=ImportLogResponse)
+@router.post("/ozon/prices", response_model=Union[ImportLogResponse, ImportDryRunResponse])
 async def import_ozon_prices(
     file: UploadFile = File(...),
+    force: bool = False,
+    dry_run: bool = False,
     db: Session = Depends(get_db)
 ):
-    """Импорт цен Ozon"""
-    if not file.filename.endswith(('.xlsx', '.xls')):
-        raise HTTPException(status_code=400, detail="Файл должен быть в формате Excel")
-    
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    file_path = os.path.join(UPLOAD_DIR, f"ozon_prices_{timestamp}_{file.filename}")
+    """Импорт цен Ozon (dry_run=true — только проверка файла, без записи в БД)"""
+    return await _import_upload(db, 'ozon_prices', file, force, dry_run)
+
+@router.post("/wb/sales", response_model=Union[ImportLogResponse, ImportDryRunResponse])
+async def import_wb_sales(
+    file: UploadFile = File(...),
+    force: bool = False,
+    dry_run: bool = False,
+    db: Session = Depends(get_db)
+):
+    """Импорт отчета о продажах Wildberries по дням в историю продаж (dry_run=true — без записи в БД)"""
+    return await _import_upload(db, 'wb_sales', file, force, dry_run)
+
+@router.post("/ozon/sales", response_model=Union[ImportLogResponse, ImportDryRunResponse])
+async def import_ozon_sales(
+    file: UploadFile = File(...),
+    force: bool = False,
+    dry_run: bool = False,
+    db: Session = Depends(get_db)
+):
+    """Импорт отчета о продажах Ozon по дням в историю продаж (dry_run=true — без записи в БД)"""
+    return await _import_upload(db, 'ozon_sales', file, force, dry_run)
+
+def _dry_run_batch(db: Session, files: dict, bulk: bool) -> dict:
+    try:
+        result = BatchImportService(db).run(files, {'1c': {'bulk': bulk}}, dry_run=True)
+    finally:
+        for file_path, _ in files.values():
+            if os.path.exists(file_path):
+                os.remove(file_path)
+    for report in result['logs']:
+        _mark_duplicate(db, report, files[report.source][1])
+    return result
+
+def _run_batch(db: Session, files: dict, force: bool, bulk: bool, dry_run: bool = False) -> dict:
+    if dry_run:
+        return _dry_run_batch(db, files, bulk)
+    imported = {}
+    for source, (file_path, file_hash) in files.items():
+        import_log = _find_imported(db, source, file_path, file_hash, force)
+        if import_log is not None:
+            imported[source] = import_log
+        else:
+            _check_file(source, file_path)
+    return BatchImportService(db).run(files, {'1c': {'bulk': bulk}}, imported)
+
+@router.post("/batch", response_model=BatchImportResponse)
+async def import_batch(
+    file_1c: Optional[UploadFile] = File(None),
+    wb_barcodes: Optional[UploadFile] = File(None),
+    wb_prices: Optional[UploadFile] = File(None),
+    wb_min_prices: Optional[UploadFile] = File(None),
+    ozon_barcodes: Optional[UploadFile] = File(None),
+    ozon_prices: Optional[UploadFile] = File(None),
+    wb_sales: Optional[UploadFile] = File(None),
+    ozon_sales: Optional[UploadFile] = File(None),
+    bulk: bool = False,
+    force: bool = False,
+    dry_run: bool = False,
+    db: Session = Depends(get_db)
+):
+    """
+    Пакетный импорт: любые из выгрузок одним запросом.
+    Файлы разбираются параллельно в пуле процессов и применяются в порядке
+    1С -> ШК WB -> цены WB -> мин. цены WB -> ШК Ozon -> цены Ozon -> продажи WB и Ozon.
+    Возвращает сводный статус и ImportLog по каждому файлу.
+    dry_run=true — каждый файл только сверяется с текущим каталогом, без записи в БД
+    """
+    uploads = {
+        '1c': file_1c,
+        'wb_barcodes': wb_barcodes,
+        'wb_prices': wb_prices,
+        'wb_min_prices': wb_min_prices,
+        'ozon_barcodes': ozon_barcodes,
+        'ozon_prices': ozon_prices,
+        'wb_sales': wb_sales,
+        'ozon_sales': ozon_sales,
+    }
+    uploads = {source: upload for source, upload in uploads.items() if upload is not None and upload.filename}
+    if not uploads:
+        raise HTTPException(status_code=400, detail="Не передано ни одного файла")
+    for upload in uploads.values():
+        _check_extension(upload.filename)
     
     try:
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-        
-        import_service = ImportService(db)
-        import_log = import_service.import_ozon_prices(file_path)
+        files = {}
+        for source, upload in uploads.items():
+            file_path = upload_path(source, upload.filename)
+            files[source] = (file_path, await save_upload(upload, file_path))
         
-        return import_log
+        return await run_in_threadpool(_run_batch, db, files, force, bulk, dry_run)
     
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Ошибка импорта: {str(e)}")
 
@@ -175,24 +285,231 @@ def get_import_logs(
     logs = db.query(ImportLog).order_by(ImportLog.created_at.desc()).limit(limit).all()
     return logs
 
+@router.get("/logs/{log_id}/errors", response_model=ImportErrorListResponse)
+def get_import_errors(
+    log_id: int,
+    page: int = Query(1, ge=1),
+    page_size: int = Query(100, ge=1, le=1000),
+    reason: Optional[str] = None,
+    search: Optional[str] = None,
+    row_from: Optional[int] = None,
+    row_to: Optional[int] = None,
+    db: Session = Depends(get_db)
+):
+    """
+    Ошибки импорта постранично.
+    reason — подстрока причины ошибки; search — подстрока штрихкода/артикула строки;
+    row_from / row_to — диапазон строк файла
+    """
+    if not db.query(ImportLog.id).filter(ImportLog.id == log_id).first():
+        raise HTTPException(status_code=404, detail="Лог импорта не найден")
+    
+    query = db.query(ImportRowError).filter(ImportRowError.import_log_id == log_id)
+    
+    if reason:
+        query = query.filter(ImportRowError.reason.ilike(f"%{reason}%"))
+    if search:
+        query = query.filter(ImportRowError.key.ilike(f"%{search}%"))
+    if row_from is not None:
+        query = query.filter(ImportRowError.row_number >= row_from)
+    if row_to is not None:
+        query = query.filter(ImportRowError.row_number <= row_to)
+    
+    total = query.count()
+    offset = (page - 1) * page_size
+    items = query.order_by(ImportRowError.row_number, ImportRowError.id).offset(offset).limit(page_size).all()
+    
+    return ImportErrorListResponse(
+        items=items,
+        total=total,
+        page=page,
+        page_size=page_size,
+        total_pages=math.ceil(total / page_size)
+    )
+
 @router.get("/logs/{log_id}/error-report")
-def download_error_report(log_id: int, db: Session = Depends(get_db)):
-    """Скачать отчет об ошибках для конкретного импорта"""
+def download_error_report(log_id: int, format: str = "xlsx", db: Session = Depends(get_db)):
+    """
+    Скачать отчет об ошибках для конкретного импорта.
+    Отчет строится по запросу из import_errors: format=xlsx или csv (потоковая отдача)
+    """
     log_entry = db.query(ImportLog).filter(ImportLog.id == log_id).first()
     
     if not log_entry:
         raise HTTPException(status_code=404, detail="Лог импорта не найден")
     
-    if not log_entry.error_report_file:
+    # Импорты, сохранившие отчет файлом в exports/ до появления import_errors
+    if log_entry.error_report_file:
+        file_path = os.path.join("exports", log_entry.error_report_file)
+        if not os.path.exists(file_path):
+            raise HTTPException(status_code=404, detail="Файл отчета не найден на сервере")
+        return FileResponse(
+            path=file_path,
+            filename=log_entry.error_report_file,
+            media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+        )
+    
+    if not db.query(ImportRowError.id).filter(ImportRowError.import_log_id == log_id).first():
         raise HTTPException(status_code=404, detail="Отчет об ошибках для этого импорта отсутствует")
-        
-    file_path = os.path.join("exports", log_entry.error_report_file)
     
-    if not os.path.exists(file_path):
-        raise HTTPException(status_code=404, detail="Файл отчета не найден на сервере")
-
+    export_service = ExportService(db)
+    filename = f"error_report_{log_entry.source}_{log_entry.id}"
+    
+    if format == "csv":
+        return StreamingResponse(
+            export_service.iter_import_errors_csv(log_id),
+            media_type="text/csv; charset=utf-8",
+            headers={"Content-Disposition": f'attachment; filename="{filename}.csv"'}
+        )
+    if format != "xlsx":
+        raise HTTPException(status_code=400, detail="Формат отчета: xlsx или csv")
+    
+    file_path = export_service.export_import_errors(log_id)
     return FileResponse(
         path=file_path,
-        filename=log_entry.error_report_file,
-        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-    )
\ No newline at end of file
+        filename=f"{filename}.xlsx",
+        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        background=BackgroundTask(os.remove, file_path)
+    )
+
+def _job_options(source: str, bulk: bool, stream: bool) -> dict:
+    if source == '1c':
+        return {'bulk': bulk, 'chunk_size': STREAM_CHUNK_SIZE if stream else None}
+    return {}
+
+def _submit_job(db: Session, source: str, file_path: str, file_hash: str, force: bool, options: dict):
+    import_log = _find_imported(db, source, file_path, file_hash, force)
+    if import_log is not None:
+        return JobService(db).record_duplicate(source, os.path.basename(file_path), import_log)
+    _check_file(source, file_path)
+    return JobService(db).submit(source, file_path, options, file_hash=file_hash)
+
+@router.post("/logs/{log_id}/resume", response_model=ImportJobResponse, status_code=202)
+def resume_import(
+    log_id: int,
+    bulk: bool = False,
+    stream: bool = False,
+    db: Session = Depends(get_db)
+):
+    """
+    Возобновить упавший или прерванный (status='running' после перезапуска) импорт.
+    Строки файла до checkpoint_row уже записаны и пропускаются; счетчики и ошибки
+    дописываются в тот же ImportLog. Импорт ставится в очередь фоновых заданий
+    """
+    import_log = db.query(ImportLog).filter(ImportLog.id == log_id).first()
+    if not import_log:
+        raise HTTPException(status_code=404, detail="Лог импорта не найден")
+    if import_log.status not in ('failed', 'running'):
+        raise HTTPException(status_code=409, detail="Импорт уже завершен")
+    if is_import_active(import_log.id):
+        raise HTTPException(status_code=409, detail="Импорт еще выполняется")
+    if not import_log.file_path or not os.path.exists(import_log.file_path):
+        raise HTTPException(status_code=404, detail="Файл импорта не найден на сервере")
+    
+    return JobService(db).submit(
+        import_log.source,
+        import_log.file_path,
+        _job_options(import_log.source, bulk, stream),
+        file_hash=import_log.file_hash,
+        resume_log_id=import_log.id
+    )
+
+@router.post("/jobs/{source}", response_model=ImportJobResponse, status_code=202)
+async def submit_import_job(
+    source: str,
+    file: UploadFile = File(...),
+    bulk: bool = False,
+    stream: bool = False,
+    force: bool = False,
+    db: Session = Depends(get_db)
+):
+    """
+    Поставить импорт в очередь фоновых заданий.
+    source — '1c', 'wb_barcodes', 'wb_prices', 'wb_min_prices', 'ozon_barcodes', 'ozon_prices',
+    'wb_sales', 'ozon_sales'.
+    Возвращает задание сразу; ход выполнения — GET /jobs/{job_id}.
+    Повторная загрузка уже импортированного файла возвращает завершенное задание
+    со ссылкой на прежний ImportLog (stage='duplicate'), если не передан force=true
+    """
+    if source not in IMPORT_SOURCES:
+        raise HTTPException(status_code=404, detail="Неизвестный источник импорта")
+    _check_extension(file.filename)
+    
+    file_path = upload_path(source, file.filename)
+    file_hash = await save_upload(file, file_path)
+    
+    return await run_in_threadpool(
+        _submit_job, db, source, file_path, file_hash, force, _job_options(source, bulk, stream)
+    )
+
+@router.get("/jobs", response_model=List[ImportJobResponse])
+def get_import_jobs(
+    limit: int = 50,
+    db: Session = Depends(get_db)
+):
+    """Получить список фоновых заданий импорта"""
+    return JobService(db).list(limit)
+
+@router.get("/jobs/{job_id}", response_model=ImportJobResponse)
+def get_import_job(job_id: str, db: Session = Depends(get_db)):
+    """Статус и прогресс задания импорта: стадия, строки разобрано/записано, ETA, ссылка на ImportLog"""
+    job = JobService(db).get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Задание импорта не найдено")
+    return job
+
+# Возобновляемая загрузка больших файлов (выгрузки 1С на 100+ МБ):
+#   POST /uploads                        — начать загрузку, получить upload_id
+#   PUT  /uploads/{upload_id}?offset=N   — тело запроса дописывается с байта N
+#   GET  /uploads/{upload_id}            — сколько байт уже принято (с какого места продолжать)
+#   POST /uploads/{upload_id}/complete   — поставить импорт собранного файла в очередь
+
+@router.post("/uploads", status_code=201)
+def create_upload(file_name: str):
+    """Начать возобновляемую загрузку файла"""
+    _check_extension(file_name)
+    return resumable_uploads.create(file_name)
+
+@router.get("/uploads/{upload_id}")
+def get_upload(upload_id: str):
+    """Состояние загрузки: имя файла и число принятых байт"""
+    info = resumable_uploads.info(upload_id)
+    if info is None:
+        raise HTTPException(status_code=404, detail="Загрузка не найдена")
+    return info
+
+@router.put("/uploads/{upload_id}")
+async def upload_chunk(upload_id: str, offset: int, request: Request):
+    """Дописать порцию файла (сырое тело запроса) начиная с байта offset"""
+    try:
+        return await resumable_uploads.append(upload_id, offset, request.stream())
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Загрузка не найдена")
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+@router.delete("/uploads/{upload_id}", status_code=204)
+def abort_upload(upload_id: str):
+    """Отменить загрузку и удалить принятые данные"""
+    if resumable_uploads.info(upload_id) is None:
+        raise HTTPException(status_code=404, detail="Загрузка не найдена")
+    resumable_uploads.abort(upload_id)
+
+@router.post("/uploads/{upload_id}/complete", response_model=ImportJobResponse, status_code=202)
+def complete_upload(
+    upload_id: str,
+    source: str,
+    bulk: bool = False,
+    stream: bool = False,
+    force: bool = False,
+    db: Session = Depends(get_db)
+):
+    """Завершить загрузку и поставить импорт файла в очередь фоновых заданий"""
+    if source not in IMPORT_SOURCES:
+        raise HTTPException(status_code=404, detail="Неизвестный источник импорта")
+    try:
+        file_path, file_hash = resumable_uploads.complete(upload_id, source)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Загрузка не найдена")
+    
+    return _submit_job(db, source, file_path, file_hash, force, _job_options(source, bulk, stream))
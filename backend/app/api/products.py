@@ -1,8 +1,13 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
-from typing import List, Optional
+from sqlalchemy import select, func
+from sqlalchemy.orm import Session, selectinload
+from typing import List, Literal, Optional, Tuple
 from app.database import get_db
-from app.models.product import Product, MarketplaceData, CalculatedData
+from app.models.product import Product, MarketplaceData, CalculatedData, ImportRowHash
+from app.services.recalc_service import mark_dirty
+from app.services.snapshot_service import catalog_snapshot
+from app.services.search_service import ProductSearch
+from app.utils.pagination import CountCache, keyset_filter, encode_cursor, estimate_count
 from app.schemas.product import (
     ProductResponse, ProductCreate, ProductUpdate, 
     ProductListResponse
@@ -11,53 +16,120 @@ import math
 
 router = APIRouter()
 
+def _reset_import_hash(db: Session, barcode: str):
+    """Товар изменен вручную — следующий импорт 1С перезапишет его, даже если строка выгрузки не менялась"""
+    db.query(ImportRowHash).filter(
+        ImportRowHash.source == '1c',
+        ImportRowHash.key == barcode
+    ).delete(synchronize_session=False)
+
+# Точные COUNT списка товаров по фильтрам (count='estimated' берет их отсюда, пока не устарели)
+_product_counts = CountCache()
+
+def _count_products(db: Session, conditions: list, key: tuple, mode: str) -> Tuple[Optional[int], str]:
+    """total для списка товаров и его источник (см. ProductListResponse.count_mode)"""
+    if mode == 'none':
+        return None, 'none'
+    if mode == 'estimated':
+        cached = _product_counts.get(key)
+        if cached is not None:
+            return cached, 'cached'
+        estimate = estimate_count(db, select(Product.barcode).where(*conditions))
+        if estimate is not None:
+            return estimate, 'planner'
+    total = db.execute(select(func.count()).select_from(Product).where(*conditions)).scalar()
+    _product_counts.set(key, total)
+    return total, 'exact'
+
 @router.get("/", response_model=ProductListResponse)
 def get_products(
     page: int = Query(1, ge=1),
     page_size: int = Query(50, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    count: Literal['estimated', 'exact', 'none'] = 'estimated',
     search: Optional[str] = None,
+    search_mode: Literal['substring', 'similarity'] = 'substring',
     brand: Optional[str] = None,
     product_category: Optional[str] = None,
     marketplace: Optional[str] = None,
     db: Session = Depends(get_db)
 ):
-    """Получить список товаров с фильтрацией и пагинацией"""
-    query = db.query(Product)
+    """
+    Получить список товаров с фильтрацией и пагинацией (в порядке штрихкода).
+    page — страница по номеру; cursor=next_cursor из ответа — следующая страница по ключу,
+    ее время не зависит от глубины (page при этом не используется).
+    search — по названию, штрихкоду и артикулу 1С: штрихкод или артикул целиком находится
+    сразу по индексу; иначе search_mode: 'substring' — подстрока, 'similarity' — подстрока
+    или похожая строка, по убыванию похожести.
+    count — как считать total: 'estimated' (по умолчанию: недавний точный подсчет
+    или оценка планировщика PostgreSQL), 'exact' — COUNT по выборке, 'none' — не считать
+    """
+    conditions = []
+    rank = None
     
     # Фильтры
     if search:
-        query = query.filter(
-            (Product.name.ilike(f"%{search}%")) |
-            (Product.barcode.ilike(f"%{search}%")) |
-            (Product.article_1c.ilike(f"%{search}%"))
-        )
+        condition, rank, search_mode = ProductSearch(db).build(search, search_mode)
+        conditions.append(condition)
     
     if brand:
-        query = query.filter(Product.brand == brand)
+        conditions.append(Product.brand == brand)
     
     if product_category:
-        query = query.filter(Product.product_category == product_category)
+        conditions.append(Product.product_category == product_category)
     
     if marketplace:
-        query = query.join(MarketplaceData).filter(
-            MarketplaceData.marketplace == marketplace
-        )
+        # EXISTS вместо JOIN: товар с несколькими строками маркетплейса не повторяется на страницах
+        conditions.append(Product.marketplace_data.any(MarketplaceData.marketplace == marketplace))
     
-    # Подсчет общего количества
-    total = query.count()
+    # Связи для ProductResponse — двумя запросами на страницу, а не по запросу на товар
+    columns = [Product] if rank is None else [Product, rank.label('search_rank')]
+    query = select(*columns).where(*conditions).options(
+        selectinload(Product.marketplace_data),
+        selectinload(Product.calculated_data)
+    )
+    # Поиск по похожести — сначала самые похожие (ранг входит в ключ курсора)
+    order = [Product.barcode] if rank is None else [rank, Product.barcode]
     
     # Пагинация
-    offset = (page - 1) * page_size
-    items = query.offset(offset).limit(page_size).all()
+    offset = 0
+    try:
+        query = keyset_filter(query, order, cursor, descending=rank is not None)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if cursor is None:
+        offset = (page - 1) * page_size
+        query = query.offset(offset)
+    rows = db.execute(query.limit(page_size + 1)).all()
+    
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        next_cursor = encode_cursor(list(rows[-1][1:]) + [rows[-1][0].barcode])
+    items = [row[0] for row in rows]
+    
+    key = (search, search_mode, brand, product_category, marketplace)
+    if count != 'none' and cursor is None and next_cursor is None and (items or page == 1):
+        # Последняя страница по номеру: total известен без подсчета
+        total, count_mode = offset + len(items), 'exact'
+        _product_counts.set(key, total)
+    else:
+        total, count_mode = _count_products(db, conditions, key, count)
+        if total is not None and count_mode != 'exact':
+            # Оценка не меньше уже увиденных строк
+            total = max(total, offset + len(items) + (1 if next_cursor else 0))
     
-    total_pages = math.ceil(total / page_size)
+    total_pages = math.ceil(total / page_size) if total is not None else None
     
     return ProductListResponse(
         items=items,
         total=total,
         page=page,
         page_size=page_size,
-        total_pages=total_pages
+        total_pages=total_pages,
+        next_cursor=next_cursor,
+        count_mode=count_mode,
+        search_mode=search_mode if search else None
     )
 
 @router.get("/{barcode}", response_model=ProductResponse)
@@ -77,7 +149,10 @@ def create_product(product: ProductCreate, db: Session = Depends(get_db)):
     
     db_product = Product(**product.model_dump())
     db.add(db_product)
+    _reset_import_hash(db, product.barcode)
+    mark_dirty(db, [product.barcode])
     db.commit()
+    _product_counts.clear()
     db.refresh(db_product)
     return db_product
 
@@ -95,8 +170,12 @@ def update_product(
     update_data = product_update.model_dump(exclude_unset=True)
     for field, value in update_data.items():
         setattr(product, field, value)
+    _reset_import_hash(db, barcode)
+    mark_dirty(db, [barcode])
     
     db.commit()
+    # Бренд или категория могли измениться — подсчеты по фильтрам устарели
+    _product_counts.clear()
     db.refresh(product)
     return product
 
@@ -108,18 +187,27 @@ def delete_product(barcode: str, db: Session = Depends(get_db)):
         raise HTTPException(status_code=404, detail="Товар не найден")
     
     db.delete(product)
+    # Удаленный товар вычитается из сводок фоновым пересчетом
+    mark_dirty(db, [barcode])
     db.commit()
+    _product_counts.clear()
     return None
 
 @router.get("/filters/brands", response_model=List[str])
 def get_brands(db: Session = Depends(get_db)):
     """Получить список всех брендов"""
+    snapshot = catalog_snapshot.get(db)
+    if snapshot is not None:
+        return snapshot.distinct('brand')
     brands = db.query(Product.brand).distinct().filter(Product.brand.isnot(None)).all()
     return [b[0] for b in brands]
 
 @router.get("/filters/categories", response_model=List[str])
 def get_categories(db: Session = Depends(get_db)):
     """Получить список всех категорий"""
+    snapshot = catalog_snapshot.get(db)
+    if snapshot is not None:
+        return snapshot.distinct('product_category')
     categories = db.query(Product.product_category).distinct().filter(
         Product.product_category.isnot(None)
     ).all()
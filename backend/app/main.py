@@ -1,10 +1,14 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.database import engine, Base
+from app.models.upgrades import upgrade_schema
 from app.api import products, imports, exports, calculations
+from app.services.recalc_service import recalculator
+from app.services.snapshot_service import catalog_snapshot
 
-# Создание таблиц
+# Создание таблиц и недостающих колонок/индексов в существующих
 Base.metadata.create_all(bind=engine)
+upgrade_schema(engine)
 
 app = FastAPI(
     title="Product Management System",
@@ -27,6 +31,20 @@ app.include_router(imports.router, prefix="/api/imports", tags=["imports"])
 app.include_router(exports.router, prefix="/api/exports", tags=["exports"])
 app.include_router(calculations.router, prefix="/api/calculations", tags=["calculations"])
 
+# Фоновый пересчет расчетных полей отмеченных товаров
+@app.on_event("startup")
+def start_recalculator():
+    recalculator.start()
+
+# Снимок каталога для аналитики собирается в фоне; до готовности чтения идут в БД
+@app.on_event("startup")
+def build_catalog_snapshot():
+    catalog_snapshot.schedule_rebuild()
+
+@app.on_event("shutdown")
+def stop_recalculator():
+    recalculator.stop()
+
 @app.get("/")
 def read_root():
     return {"message": "Product Management System API"}
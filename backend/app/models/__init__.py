@@ -2,12 +2,30 @@ from app.models.product import (
     Product,
     MarketplaceData,
     CalculatedData,
-    ImportLog
+    ImportLog,
+    ImportRowError,
+    ImportRowHash,
+    ImportJob,
+    SalesHistory,
+    StockSnapshot,
+    StockState,
+    DirtyBarcode,
+    SummaryContribution,
+    AnalyticsSummary
 )
 
 __all__ = [
     "Product",
     "MarketplaceData",
     "CalculatedData",
-    "ImportLog"
+    "ImportLog",
+    "ImportRowError",
+    "ImportRowHash",
+    "ImportJob",
+    "SalesHistory",
+    "StockSnapshot",
+    "StockState",
+    "DirtyBarcode",
+    "SummaryContribution",
+    "AnalyticsSummary"
 ]
@@ -1,7 +1,18 @@
-from sqlalchemy import Column, String, Float, Integer, DateTime, ForeignKey, JSON, Index
+from sqlalchemy import Column, String, Float, Integer, Date, DateTime, ForeignKey, JSON, Index, text
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.database import Base
+from datetime import datetime, timezone
+
+
+def pg_trgm_installed(bind) -> bool:
+    """Установлено ли в базе расширение pg_trgm (триграммный поиск)"""
+    return bind.execute(text("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")).first() is not None
+
+
+def _pg_trgm_installed(ddl, target, bind, **kw) -> bool:
+    return pg_trgm_installed(bind)
+
 
 class Product(Base):
     __tablename__ = "products"
@@ -36,6 +47,19 @@ class Product(Base):
     
     __table_args__ = (
         Index('idx_brand_category', 'brand', 'product_category'),
+        # Постраничные выборки по остатку (штрихкод — уникальный хвост ключа сортировки)
+        Index('idx_products_stock_total', 'stock_total', 'barcode'),
+        # Поиск подстроки (ILIKE '%...%') и по похожести — триграммные GIN-индексы PostgreSQL (pg_trgm).
+        # Расширение и индексы создает upgrade_schema при старте; create_all — только если расширение уже есть
+        Index('idx_products_name_trgm', 'name',
+              postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'}
+              ).ddl_if(dialect='postgresql', callable_=_pg_trgm_installed),
+        Index('idx_products_barcode_trgm', 'barcode',
+              postgresql_using='gin', postgresql_ops={'barcode': 'gin_trgm_ops'}
+              ).ddl_if(dialect='postgresql', callable_=_pg_trgm_installed),
+        Index('idx_products_article_1c_trgm', 'article_1c',
+              postgresql_using='gin', postgresql_ops={'article_1c': 'gin_trgm_ops'}
+              ).ddl_if(dialect='postgresql', callable_=_pg_trgm_installed),
     )
 
 
@@ -78,7 +102,9 @@ class CalculatedData(Base):
     turnover_rate = Column(Float)  # Оборачиваемость
     abc_category = Column(String)  # ABC категория
     xyz_category = Column(String)  # XYZ категория
-    days_in_stock = Column(Integer)  # Дней на складе
+    days_in_stock = Column(Integer)  # Дней на складе (с остатком > 0) за историю снимков
+    stock_out_days = Column(Integer)  # Дней подряд без остатка на текущий момент
+    avg_stock = Column(Float)  # Средний остаток за историю снимков
     
     # Дополнительные расчетные поля
     calculated_fields = Column(JSON)
@@ -86,6 +112,11 @@ class CalculatedData(Base):
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     
     product = relationship("Product", back_populates="calculated_data")
+    
+    __table_args__ = (
+        # Постраничные выборки по наценке
+        Index('idx_calculated_margin_percent', 'margin_percent', 'barcode'),
+    )
 
 
 class ImportLog(Base):
@@ -98,8 +129,170 @@ class ImportLog(Base):
     records_added = Column(Integer)
     records_updated = Column(Integer)
     records_failed = Column(Integer)
-    status = Column(String)  # 'success', 'partial', 'failed'
+    records_unchanged = Column(Integer, default=0)  # Строки, совпавшие с прошлым импортом (не перезаписывались)
+    status = Column(String)  # 'running', 'success', 'partial', 'failed'
     error_message = Column(String)
-    error_report_file = Column(String, nullable=True)
+    checkpoint_row = Column(Integer, default=0)  # Последняя строка файла, записанная и зафиксированная (для возобновления)
+    file_path = Column(String)  # Путь к загруженному файлу на сервере (для возобновления)
+    error_report_file = Column(String, nullable=True)  # Файл отчета в exports/ (импорты до появления import_errors)
+    file_hash = Column(String(64), index=True)  # SHA-256 загруженного файла (для дедупликации повторных загрузок)
+    
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class ImportRowError(Base):
+    __tablename__ = "import_errors"
+    
+    id = Column(Integer, primary_key=True)
+    import_log_id = Column(Integer, ForeignKey("import_logs.id", ondelete="CASCADE"), nullable=False)
+    row_number = Column(Integer)  # Строка в Excel
+    key = Column(String)  # Штрихкод / артикул строки (первая колонка отчета)
+    reason = Column(String)  # Причина ошибки
+    row_data = Column(JSON)  # Значения колонок отчета: {подпись: значение}
+    
+    __table_args__ = (
+        Index('idx_import_errors_log_row', 'import_log_id', 'row_number'),
+    )
+
+class ImportRowHash(Base):
+    __tablename__ = "import_row_hashes"
+    
+    # Хэш содержимого строки, записанной последним импортом источника
+    source = Column(String, primary_key=True)  # ImportLog.source
+    key = Column(String, primary_key=True)  # Штрихкод (1С) или id строки marketplace_data
+    row_hash = Column(String(16), nullable=False)
+
+class ImportJob(Base):
+    __tablename__ = "import_jobs"
+    
+    id = Column(String, primary_key=True)  # uuid4
+    source = Column(String, nullable=False)  # ключ из IMPORT_SOURCES
+    file_name = Column(String)
+    options = Column(JSON)  # Параметры импорта (bulk, stream и т.п.)
+    status = Column(String, nullable=False, default='queued')  # 'queued', 'running', 'success', 'partial', 'failed'
+    stage = Column(String)  # 'reading', 'writing', 'finishing', 'done', 'duplicate'
+    rows_total = Column(Integer)
+    rows_parsed = Column(Integer, default=0)
+    rows_written = Column(Integer, default=0)
+    error_message = Column(String)
+    import_log_id = Column(Integer, ForeignKey("import_logs.id", ondelete="SET NULL"), nullable=True)
+    
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    started_at = Column(DateTime(timezone=True))
+    finished_at = Column(DateTime(timezone=True))
+    
+    import_log = relationship("ImportLog")
+    
+    @property
+    def progress_percent(self):
+        """Доля записанных строк, % (если общее число строк известно)"""
+        if self.status in ('success', 'partial'):
+            return 100.0
+        if not self.rows_total:
+            return None
+        return round(min((self.rows_written or 0) / self.rows_total, 1.0) * 100, 1)
+    
+    @property
+    def eta_seconds(self):
+        """Оценка оставшегося времени по скорости записи"""
+        percent = self.progress_percent
+        if self.status != 'running' or not percent or not self.started_at:
+            return None
+        started_at = self.started_at if self.started_at.tzinfo else self.started_at.replace(tzinfo=timezone.utc)
+        elapsed = (datetime.now(timezone.utc) - started_at).total_seconds()
+        return round(elapsed * (100 - percent) / percent, 1)
+
+
+class SalesHistory(Base):
+    """
+    Продажи и остатки по дням из отчетов маркетплейсов — компактный ряд только на дописывание
+    (повторная загрузка того же дня заменяет его значения).
+    В PostgreSQL таблица секционирована по месяцам sale_date; секции создаются при импорте
+    """
+    __tablename__ = "sales_history"
+    
+    barcode = Column(String, primary_key=True)
+    sale_date = Column(Date, primary_key=True)
+    marketplace = Column(String, primary_key=True)  # 'wb', 'ozon'
+    quantity = Column(Integer, nullable=False, default=0)  # Продано, шт
+    revenue = Column(Float)  # Выручка, руб.
+    stock = Column(Integer)  # Остаток на маркетплейсе (если есть в отчете)
+    
+    __table_args__ = (
+        Index('idx_sales_history_date', 'sale_date'),
+        {'postgresql_partition_by': 'RANGE (sale_date)'},
+    )
+
+
+class StockSnapshot(Base):
+    """
+    Снимки остатков 1С: строка пишется, только когда stock_total товара изменился,
+    и действует до следующего снимка того же товара.
+    В PostgreSQL таблица секционирована по месяцам snapshot_date; секции создаются при импорте
+    """
+    __tablename__ = "stock_snapshots"
+    
+    barcode = Column(String, primary_key=True)
+    snapshot_date = Column(Date, primary_key=True)
+    stock_total = Column(Integer, nullable=False)
+    
+    __table_args__ = (
+        {'postgresql_partition_by': 'RANGE (snapshot_date)'},
+    )
+
+
+class StockState(Base):
+    """
+    Последний снимок остатка товара и показатели, накопленные до него.
+    При новом снимке показатели сдвигаются на дни с предыдущего — история не перечитывается
+    """
+    __tablename__ = "stock_state"
+    
+    barcode = Column(String, ForeignKey("products.barcode", ondelete="CASCADE"), primary_key=True)
+    since_date = Column(Date, nullable=False)  # Дата последнего изменения остатка
+    stock_total = Column(Integer, nullable=False)  # Остаток с since_date
+    tracked_days = Column(Integer, nullable=False, default=0)  # Дней истории до since_date
+    days_in_stock = Column(Integer, nullable=False, default=0)  # Из них с остатком > 0
+    stock_days = Column(Float, nullable=False, default=0)  # Сумма остатков по дням до since_date
+
+
+class DirtyBarcode(Base):
+    """
+    Товары, расчетные поля которых устарели после записи (импорт, ручная правка).
+    Фоновый пересчет обрабатывает их пачками и удаляет отметку
+    """
+    __tablename__ = "dirty_barcodes"
+    
+    barcode = Column(String, primary_key=True)
+    # Время последней отметки: отметка, обновленная во время пересчета, не удаляется
+    marked_at = Column(DateTime(timezone=True), nullable=False, index=True)
+
+
+class SummaryContribution(Base):
+    """
+    Вклад товара в сводки analytics_summary на момент последнего обновления.
+    При изменении товара из сводок вычитается старый вклад и прибавляется новый
+    """
+    __tablename__ = "summary_contributions"
+    
+    barcode = Column(String, primary_key=True)
+    abc_category = Column(String, nullable=False, default='')
+    brand = Column(String, nullable=False, default='')
+    product_category = Column(String, nullable=False, default='')
+    marketplaces = Column(String, nullable=False, default='')  # 'ozon,wb'
+    stock_total = Column(Integer, nullable=False, default=0)
+    stock_value = Column(Float, nullable=False, default=0)
+
+
+class AnalyticsSummary(Base):
+    """
+    Материализованные сводки для дашборда: число товаров, остаток и стоимость остатка
+    по ABC категории, бренду, типу товара и маркетплейсу. Пустое значение — key=''
+    """
+    __tablename__ = "analytics_summary"
     
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
\ No newline at end of file
+    dimension = Column(String, primary_key=True)  # 'abc', 'brand', 'category', 'marketplace'
+    key = Column(String, primary_key=True)
+    product_count = Column(Integer, nullable=False, default=0)
+    stock_total = Column(Integer, nullable=False, default=0)
+    stock_value = Column(Float, nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
@@ -0,0 +1,108 @@
+from sqlalchemy import Column, Index, Table, inspect, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.schema import CreateColumn, CreateIndex
+from app.models.product import Product, CalculatedData, ImportLog
+from typing import List
+import logging
+import re
+
+logger = logging.getLogger(__name__)
+
+
+def _index(table: Table, name: str) -> Index:
+    return next(index for index in table.indexes if index.name == name)
+
+
+# create_all создает только недостающие таблицы. Колонки и индексы, добавленные
+# в уже существующие таблицы, доводятся при старте приложения; каждый шаг идемпотентен
+ADDED_COLUMNS: List[Column] = [
+    ImportLog.__table__.c.file_hash,
+    ImportLog.__table__.c.records_unchanged,
+    ImportLog.__table__.c.checkpoint_row,
+    ImportLog.__table__.c.file_path,
+    CalculatedData.__table__.c.stock_out_days,
+    CalculatedData.__table__.c.avg_stock,
+]
+
+ADDED_INDEXES: List[Index] = [
+    _index(ImportLog.__table__, 'ix_import_logs_file_hash'),
+    _index(Product.__table__, 'idx_products_stock_total'),
+    _index(CalculatedData.__table__, 'idx_calculated_margin_percent'),
+]
+
+# Триграммные индексы поиска: только PostgreSQL и только при установленном pg_trgm
+TRIGRAM_INDEXES: List[Index] = [
+    _index(Product.__table__, 'idx_products_name_trgm'),
+    _index(Product.__table__, 'idx_products_barcode_trgm'),
+    _index(Product.__table__, 'idx_products_article_1c_trgm'),
+]
+
+
+def upgrade_schema(engine: Engine) -> None:
+    """
+    Добавляет недостающие колонки (ADD COLUMN) и индексы в таблицы, созданные прежними версиями.
+    PostgreSQL: ADD COLUMN IF NOT EXISTS и CREATE INDEX CONCURRENTLY IF NOT EXISTS — без блокировки записи.
+    Другие СУБД: колонки сверяются с инспектором, индексы — CREATE INDEX IF NOT EXISTS.
+    Без прав на CREATE EXTENSION pg_trgm триграммные индексы пропускаются, поиск по похожести отключен
+    """
+    postgresql = engine.dialect.name == 'postgresql'
+    _add_columns(engine, postgresql)
+    _add_indexes(engine, ADDED_INDEXES, postgresql)
+    if postgresql and _create_pg_trgm(engine):
+        _add_indexes(engine, TRIGRAM_INDEXES, postgresql)
+
+
+def _create_pg_trgm(engine: Engine) -> bool:
+    try:
+        with engine.begin() as conn:
+            conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+    except DBAPIError:
+        # IF NOT EXISTS проверяется до прав: ошибка — расширения нет и создать его нельзя
+        logger.warning("Расширение pg_trgm недоступно: поиск по похожести отключен", exc_info=True)
+        return False
+    return True
+
+
+def _add_columns(engine: Engine, postgresql: bool) -> None:
+    preparer = engine.dialect.identifier_preparer
+    with engine.begin() as conn:
+        existing = {}
+        inspector = inspect(conn)
+        for column in ADDED_COLUMNS:
+            table = column.table.name
+            definition = CreateColumn(column).compile(dialect=engine.dialect)
+            if postgresql:
+                conn.execute(text(f"ALTER TABLE {preparer.quote(table)} ADD COLUMN IF NOT EXISTS {definition}"))
+                continue
+            if table not in existing:
+                existing[table] = {c['name'] for c in inspector.get_columns(table)}
+            if column.name not in existing[table]:
+                conn.execute(text(f"ALTER TABLE {preparer.quote(table)} ADD COLUMN {definition}"))
+                existing[table].add(column.name)
+
+
+def _add_indexes(engine: Engine, indexes: List[Index], postgresql: bool) -> None:
+    if not postgresql:
+        with engine.begin() as conn:
+            for index in indexes:
+                conn.execute(CreateIndex(index, if_not_exists=True))
+        return
+
+    # CONCURRENTLY не выполняется в транзакции
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        # Прерванная параллельная сборка оставляет невалидный индекс — IF NOT EXISTS его пропустит
+        invalid = set(conn.execute(text(
+            "SELECT c.relname FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid WHERE NOT i.indisvalid"
+        )).scalars())
+        for index in indexes:
+            name = engine.dialect.identifier_preparer.quote(index.name)
+            ddl = str(CreateIndex(index, if_not_exists=True).compile(dialect=engine.dialect))
+            ddl = re.sub(r'^CREATE (UNIQUE )?INDEX', r'CREATE \1INDEX CONCURRENTLY', ddl)
+            try:
+                if index.name in invalid:
+                    conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+                conn.execute(text(ddl))
+            except DBAPIError:
+                # Например, тот же индекс одновременно строит другой воркер; повторится при следующем старте
+                logger.exception("Не удалось создать индекс %s", index.name)
@@ -8,7 +8,16 @@ from app.schemas.product import (
     MarketplaceDataResponse,
     CalculatedDataBase,
     CalculatedDataResponse,
-    ImportLogResponse
+    ImportLogResponse,
+    ImportErrorResponse,
+    ImportErrorListResponse,
+    ImportErrorSample,
+    ImportChangeSample,
+    ImportDryRunResponse,
+    ImportJobResponse,
+    BatchImportResponse,
+    PricingRule,
+    PricingSimulationRequest
 )
 
 __all__ = [
@@ -21,5 +30,14 @@ __all__ = [
     "MarketplaceDataResponse",
     "CalculatedDataBase",
     "CalculatedDataResponse",
-    "ImportLogResponse"
+    "ImportLogResponse",
+    "ImportErrorResponse",
+    "ImportErrorListResponse",
+    "ImportErrorSample",
+    "ImportChangeSample",
+    "ImportDryRunResponse",
+    "ImportJobResponse",
+    "BatchImportResponse",
+    "PricingRule",
+    "PricingSimulationRequest"
 ]
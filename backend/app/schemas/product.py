@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Union
 from datetime import datetime
 
 class MarketplaceDataBase(BaseModel):
@@ -27,6 +27,8 @@ class CalculatedDataBase(BaseModel):
     abc_category: Optional[str] = None
     xyz_category: Optional[str] = None
     days_in_stock: Optional[int] = None
+    stock_out_days: Optional[int] = None
+    avg_stock: Optional[float] = None
     calculated_fields: Optional[Dict[str, Any]] = None
 
 class CalculatedDataResponse(CalculatedDataBase):
@@ -85,23 +87,118 @@ class ProductResponse(ProductBase):
 
 class ProductListResponse(BaseModel):
     items: List[ProductResponse]
-    total: int
+    total: Optional[int] = None  # None при count='none'
     page: int
     page_size: int
-    total_pages: int
+    total_pages: Optional[int] = None
+    next_cursor: Optional[str] = None  # Курсор следующей страницы (null — страниц больше нет)
+    count_mode: str = 'exact'  # Откуда total: 'exact', 'cached', 'planner' (оценка), 'none'
+    search_mode: Optional[str] = None  # Примененный поиск: 'exact', 'substring', 'similarity'
 
 class ImportLogResponse(BaseModel):
-    id: int
+    id: Optional[int] = None  # None — лог ошибки пакетного импорта, который не удалось сохранить
     source: str
     file_name: Optional[str] = None
     records_processed: int
     records_added: int
     records_updated: int
     records_failed: int
+    records_unchanged: Optional[int] = 0
     status: str
     error_message: Optional[str] = None
+    checkpoint_row: Optional[int] = 0
     error_report_file: Optional[str] = None
+    file_hash: Optional[str] = None
+    created_at: datetime
+    
+    class Config:
+        from_attributes = True
+
+class ImportErrorResponse(BaseModel):
+    id: int
+    row_number: Optional[int] = None
+    key: Optional[str] = None
+    reason: Optional[str] = None
+    row_data: Optional[Dict[str, Any]] = None
+    
+    class Config:
+        from_attributes = True
+
+class ImportErrorListResponse(BaseModel):
+    items: List[ImportErrorResponse]
+    total: int
+    page: int
+    page_size: int
+    total_pages: int
+
+class ImportErrorSample(BaseModel):
+    row_number: Optional[int] = None
+    key: Optional[str] = None
+    reason: Optional[str] = None
+    row_data: Optional[Dict[str, Any]] = None
+
+class ImportChangeSample(BaseModel):
+    action: str  # 'add', 'update'
+    key: Optional[str] = None  # Штрихкод товара или строки маркетплейса
+    fields: Dict[str, Any]  # Значения из файла
+    previous: Optional[Dict[str, Any]] = None  # Текущие значения в базе (для 'update')
+
+class ImportDryRunResponse(BaseModel):
+    source: str
+    file_name: Optional[str] = None
+    status: str
+    records_processed: int
+    records_added: int
+    records_updated: int
+    records_failed: int
+    records_unchanged: int
+    error_message: Optional[str] = None
+    duplicate_of: Optional[int] = None  # ImportLog прошлого импорта этого же файла
+    errors: List[ImportErrorSample]  # Первые ошибки (всего — records_failed)
+    changes: List[ImportChangeSample]  # Первые изменения (всего — records_added + records_updated)
+    
+    class Config:
+        from_attributes = True
+
+class ImportJobResponse(BaseModel):
+    id: str
+    source: str
+    file_name: Optional[str] = None
+    status: str
+    stage: Optional[str] = None
+    rows_total: Optional[int] = None
+    rows_parsed: int = 0
+    rows_written: int = 0
+    progress_percent: Optional[float] = None
+    eta_seconds: Optional[float] = None
+    error_message: Optional[str] = None
+    import_log_id: Optional[int] = None
     created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
     
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+class BatchImportResponse(BaseModel):
+    status: str  # 'success', 'partial', 'failed'
+    parse_seconds: float  # Параллельный разбор всех файлов
+    apply_seconds: float  # Последовательная запись в порядке зависимостей
+    total_seconds: float
+    logs: List[Union[ImportLogResponse, ImportDryRunResponse]]  # По одному логу на файл, в порядке применения
+
+class PricingRule(BaseModel):
+    # Фильтры строк маркетплейсов (все заданные должны совпасть; не заданные — любые)
+    marketplace: Optional[str] = None  # 'wb', 'ozon'
+    brand: Optional[str] = None
+    product_category: Optional[str] = None
+    product_type: Optional[str] = None
+    abc_category: Optional[str] = None
+    barcodes: Optional[List[str]] = None
+    # Изменение цены — ровно одно из двух
+    discount_percent: Optional[float] = Field(None, ge=0, lt=100)  # Скидка от цены до скидки
+    price_change_percent: Optional[float] = Field(None, gt=-100)  # Изменение текущей цены, %
+
+class PricingSimulationRequest(BaseModel):
+    rules: List[PricingRule] = Field(..., min_length=1)  # По порядку; изменение цены % — к результату предыдущих правил
+    limit: int = Field(100, ge=0, le=1000)  # Сколько товаров вернуть в items
@@ -1,9 +1,15 @@
 from app.services.import_service import ImportService
 from app.services.export_service import ExportService
 from app.services.calculation_service import CalculationService
+from app.services.job_service import JobService
+from app.services.upload_service import ResumableUploads
+from app.services.batch_service import BatchImportService
 
 __all__ = [
     "ImportService",
     "ExportService",
-    "CalculationService"
+    "CalculationService",
+    "JobService",
+    "ResumableUploads",
+    "BatchImportService"
 ]
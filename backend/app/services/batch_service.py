@@ -0,0 +1,159 @@
+from concurrent.futures import ProcessPoolExecutor
+from sqlalchemy.orm import Session
+from app.models.product import ImportLog
+from app.services.import_service import ImportService, DryRunReport, IMPORT_SOURCES, parse_import_file
+from typing import Any, Dict, Optional, Tuple, Union
+from datetime import datetime, timezone
+import logging
+import multiprocessing
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Разбор XLSX упирается в CPU — файлы пакета разбираются в отдельных процессах
+PARSE_WORKERS = int(os.getenv("IMPORT_PARSE_WORKERS", str(min(len(IMPORT_SOURCES), os.cpu_count() or 1))))
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    """
+    Пул процессов создается один раз на процесс приложения.
+    spawn вместо fork: родитель многопоточный (uvicorn, пул импортов).
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=PARSE_WORKERS,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return _pool
+
+
+class BatchImportService:
+    """
+    Пакетный импорт утренних выгрузок: все файлы разбираются параллельно,
+    затем применяются по одному в порядке зависимостей IMPORT_SOURCES
+    (товары 1С -> строки маркетплейсов -> цены).
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def run(
+        self,
+        files: Dict[str, Tuple[str, Optional[str]]],
+        options: Optional[Dict[str, Dict[str, Any]]] = None,
+        imported: Optional[Dict[str, ImportLog]] = None,
+        dry_run: bool = False
+    ) -> Dict[str, Any]:
+        """
+        files — {источник: (путь к файлу, SHA-256)}.
+        options — параметры импорта по источнику (например, bulk для 1С).
+        imported — уже импортированные ранее файлы {источник: ImportLog}: не разбираются
+        и не применяются повторно, их лог попадает в результат как есть.
+        dry_run — пробный импорт: каждый файл сверяется с текущим каталогом без записи,
+        вместо ImportLog в результат попадает DryRunReport. Файлы пакета не видят изменений
+        друг друга (например, цены WB — новых строк из файла ШК WB того же пакета).
+        """
+        options = options or {}
+        imported = imported or {}
+        started = time.perf_counter()
+
+        pool = _get_pool()
+        futures = {
+            source: pool.submit(parse_import_file, source, file_path)
+            for source, (file_path, _) in files.items()
+            if source not in imported
+        }
+
+        parsed = {}
+        for source, future in futures.items():
+            try:
+                parsed[source] = future.result()
+            except Exception:
+                # Импортер повторит чтение в этом процессе и запишет ImportLog со статусом 'failed'
+                logger.exception("Пакетный импорт: не удалось разобрать файл %s", source)
+                parsed[source] = None
+        parsed_at = time.perf_counter()
+
+        logs = []
+        for source in IMPORT_SOURCES:
+            if source in imported:
+                logs.append(imported[source])
+                continue
+            if source not in files:
+                continue
+
+            file_path, file_hash = files[source]
+            import_service = ImportService(self.db, file_hash=file_hash, dry_run=dry_run)
+            try:
+                getattr(import_service, IMPORT_SOURCES[source])(
+                    file_path, parsed=parsed.pop(source), **options.get(source, {})
+                )
+            except Exception as e:
+                # Ошибка записана в ImportLog (если он успел создаться); остальные файлы пакета применяются дальше
+                logger.exception("Пакетный импорт: ошибка применения файла %s", source)
+                log = import_service.dry_run_report if dry_run else import_service.last_log
+                if log is None:
+                    log = self._failed_log(source, file_path, file_hash, e, dry_run)
+            else:
+                log = import_service.dry_run_report if dry_run else import_service.last_log
+            logs.append(log)
+        finished = time.perf_counter()
+
+        statuses = {log.status for log in logs}
+        if statuses == {'success'}:
+            status = 'success'
+        elif statuses == {'failed'}:
+            status = 'failed'
+        else:
+            status = 'partial'
+
+        return {
+            'status': status,
+            'parse_seconds': round(parsed_at - started, 3),
+            'apply_seconds': round(finished - parsed_at, 3),
+            'total_seconds': round(finished - started, 3),
+            'logs': logs
+        }
+
+    def _failed_log(
+        self, source: str, file_path: str, file_hash: Optional[str], error: Exception, dry_run: bool
+    ) -> Union[ImportLog, DryRunReport]:
+        """
+        Итог файла, импорт которого упал до создания лога (например, не удалась первая запись в БД):
+        лог 'failed' сохраняется, если база доступна, иначе возвращается несохраненным
+        """
+        if dry_run:
+            report = DryRunReport(source)
+            report.file_name = os.path.basename(file_path)
+            report.status = 'failed'
+            report.error_message = str(error)
+            return report
+
+        import_log = ImportLog(
+            source=source,
+            file_name=os.path.basename(file_path),
+            file_hash=file_hash,
+            records_processed=0,
+            records_added=0,
+            records_updated=0,
+            records_failed=0,
+            records_unchanged=0,
+            status='failed',
+            error_message=str(error),
+            created_at=datetime.now(timezone.utc)
+        )
+        try:
+            self.db.rollback()
+            self.db.add(import_log)
+            self.db.commit()
+        except Exception:
+            logger.exception("Пакетный импорт: не удалось сохранить лог ошибки файла %s", source)
+            self.db.rollback()
+        return import_log
@@ -1,241 +1,476 @@
+from sqlalchemy import select, delete, func, case, or_, tuple_, cast, Integer
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.orm import Session
-from app.models.product import Product, MarketplaceData, CalculatedData
-from typing import Optional
-from datetime import datetime, timedelta
+from app.models.product import Product, MarketplaceData, CalculatedData, SalesHistory, StockState, DirtyBarcode
+from app.services.summary_service import SummaryService
+from app.services.snapshot_service import catalog_snapshot
+from app.utils.bulk import bulk_upsert
+from app.utils.pagination import keyset_page
+from typing import Optional, Sequence, Tuple
+from datetime import date, datetime, timedelta
+import numpy as np
+import pandas as pd
+
+# Поля товара, внутри которых можно считать ABC (group_by)
+ABC_GROUPS = ('brand', 'product_category', 'product_type')
+
+# Период продаж для оборачиваемости и XYZ по умолчанию (13 недель)
+SALES_METRICS_DAYS = 91
+
+# Пороги XYZ по коэффициенту вариации недельного спроса
+XYZ_THRESHOLDS = (0.1, 0.25)
+
+# Аналитические выборки: размер страницы по умолчанию и допустимые сортировки
+ANALYTICS_PAGE_SIZE = 100
+LOW_STOCK_SORTS = ('stock_total', 'barcode')
+HIGH_MARGIN_SORTS = ('margin_percent', 'barcode')
 
 class CalculationService:
-    def __init__(self, db: Session):
+    def __init__(self, db: Session, shard: Optional[Tuple[Optional[str], Optional[str]]] = None):
         self.db = db
+        # shard — диапазон штрихкодов [от, до) для параллельного пересчета по частям каталога
+        # (None на границе — без ограничения); расчеты по каталогу берут только его товары
+        self.shard = shard
+
+    def _in_shard(self, column) -> list:
+        """Условия на колонку штрихкода для текущей части каталога"""
+        if self.shard is None:
+            return []
+        low, high = self.shard
+        conditions = []
+        if low is not None:
+            conditions.append(column >= low)
+        if high is not None:
+            conditions.append(column < high)
+        return conditions
     
+    def _margin_select(self, barcodes: Optional[Sequence[str]] = None):
+        """
+        Наценка одним запросом: максимальная текущая цена среди маркетплейсов
+        против закупочной. Товары без закупочной цены или без цен на маркетплейсах не попадают.
+        barcodes — только эти товары
+        """
+        prices = select(
+            MarketplaceData.barcode,
+            func.max(MarketplaceData.current_price).label('max_price')
+        ).where(MarketplaceData.current_price > 0, *self._in_shard(MarketplaceData.barcode))
+        if barcodes is not None:
+            prices = prices.where(MarketplaceData.barcode.in_(barcodes))
+        prices = prices.group_by(MarketplaceData.barcode).subquery()
+
+        margin = prices.c.max_price - Product.purchase_price
+        query = select(
+            Product.barcode,
+            margin.label('margin'),
+            case((Product.purchase_price > 0, margin / Product.purchase_price * 100), else_=0.0).label('margin_percent')
+        ).join(
+            prices, prices.c.barcode == Product.barcode
+        ).where(
+            Product.purchase_price.isnot(None),
+            Product.purchase_price != 0,
+            *self._in_shard(Product.barcode)
+        )
+        if barcodes is not None:
+            query = query.where(Product.barcode.in_(barcodes))
+        return query
+
+    def _upsert_margins(self, query) -> int:
+        """
+        Записывает наценки из запроса в calculated_data, возвращает число товаров.
+        PostgreSQL: один INSERT ... SELECT ... ON CONFLICT, строки с той же наценкой не переписываются.
+        Остальные СУБД: выборка и bulk_upsert пачками.
+        """
+        if self.db.get_bind().dialect.name != 'postgresql':
+            rows = [dict(row._mapping) for row in self.db.execute(query)]
+            bulk_upsert(self.db, CalculatedData, rows)
+            return len(rows)
+
+        columns = ['barcode', 'margin', 'margin_percent']
+        stmt = pg_insert(CalculatedData).from_select(columns, query)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['barcode'],
+            set_={
+                'margin': stmt.excluded.margin,
+                'margin_percent': stmt.excluded.margin_percent,
+                'updated_at': func.now()
+            },
+            where=or_(
+                CalculatedData.margin.is_distinct_from(stmt.excluded.margin),
+                CalculatedData.margin_percent.is_distinct_from(stmt.excluded.margin_percent)
+            )
+        )
+        self.db.execute(stmt)
+        return self.db.execute(select(func.count()).select_from(query.subquery())).scalar()
+
     def calculate_margin(self, barcode: str) -> Optional[dict]:
         """Рассчитать наценку для товара"""
-        product = self.db.query(Product).filter(Product.barcode == barcode).first()
-        if not product or not product.purchase_price:
-            return None
-        
-        # Находим максимальную цену среди маркетплейсов
-        max_price = 0
-        for mp_data in product.marketplace_data:
-            if mp_data.current_price and mp_data.current_price > max_price:
-                max_price = mp_data.current_price
-        
-        if max_price == 0:
+        row = self.db.execute(self._margin_select([barcode])).first()
+        if row is None:
             return None
         
-        # Рассчитываем наценку
-        margin = max_price - product.purchase_price
-        margin_percent = (margin / product.purchase_price) * 100 if product.purchase_price > 0 else 0
-        
-        # Обновляем или создаем расчетные данные
-        calc_data = self.db.query(CalculatedData).filter(
-            CalculatedData.barcode == barcode
-        ).first()
-        
-        if calc_data:
-            calc_data.margin = margin
-            calc_data.margin_percent = margin_percent
-        else:
-            calc_data = CalculatedData(
-                barcode=barcode,
-                margin=margin,
-                margin_percent=margin_percent
-            )
-            self.db.add(calc_data)
-        
+        result = dict(row._mapping)
+        bulk_upsert(self.db, CalculatedData, [result])
         self.db.commit()
+        catalog_snapshot.patch(self.db, [barcode])
         
-        return {
-            'barcode': barcode,
-            'margin': margin,
-            'margin_percent': margin_percent
-        }
+        return result
     
     def calculate_all_margins(self) -> dict:
-        """Рассчитать наценку для всех товаров"""
-        products = self.db.query(Product).all()
-        
-        success_count = 0
-        failed_count = 0
-        
-        for product in products:
-            try:
-                result = self.calculate_margin(product.barcode)
-                if result:
-                    success_count += 1
-                else:
-                    failed_count += 1
-            except Exception as e:
-                print(f"Ошибка расчета для {product.barcode}: {e}")
-                failed_count += 1
+        """
+        Рассчитать наценку для всех товаров набором запросов по всему каталогу
+        (вместо запросов и коммита на каждый товар)
+        """
+        total = self.db.query(func.count(Product.barcode)).filter(*self._in_shard(Product.barcode)).scalar()
+        success_count = self._upsert_margins(self._margin_select())
+        self.db.commit()
+        # Часть каталога считается в процессе пула: снимок сбрасывает ShardedRecalculation в родителе
+        if self.shard is None:
+            catalog_snapshot.invalidate()
         
         return {
-            'total': len(products),
+            'total': total,
             'success': success_count,
-            'failed': failed_count
+            'failed': total - success_count
         }
     
-    def calculate_abc_category(self, barcode: Optional[str] = None) -> dict:
+    def calculate_abc_category(self, barcode: Optional[str] = None, group_by: Optional[str] = None) -> dict:
         """
         Рассчитать ABC категорию товаров
         A - 80% выручки (топ товары)
         B - следующие 15% выручки
         C - оставшиеся 5% выручки
         
-        Пока используем стоимость остатков как прокси для выручки
+        Пока используем стоимость остатков как прокси для выручки.
+        group_by — классификация внутри групп: 'brand', 'product_category' или 'product_type'.
+        Накопленные доли считаются векторно (сортировка и cumsum по колонкам),
+        результат пишется одним bulk_upsert
         """
-        if barcode:
-            products = self.db.query(Product).filter(Product.barcode == barcode).all()
-        else:
-            products = self.db.query(Product).all()
+        if group_by is not None and group_by not in ABC_GROUPS:
+            raise ValueError(f"Неизвестная группировка ABC: {group_by}")
         
-        # Рассчитываем стоимость остатков для каждого товара
-        product_values = []
-        for product in products:
-            if product.purchase_price and product.stock_total:
-                value = product.purchase_price * product.stock_total
-                product_values.append({
-                    'barcode': product.barcode,
-                    'value': value
-                })
-        
-        # Сортируем по убыванию стоимости
-        product_values.sort(key=lambda x: x['value'], reverse=True)
+        columns = [Product.barcode, Product.purchase_price, Product.stock_total]
+        if group_by:
+            columns.append(getattr(Product, group_by))
+        query = self.db.query(*columns)
+        if barcode:
+            query = query.filter(Product.barcode == barcode)
         
-        # Рассчитываем общую стоимость
-        total_value = sum(p['value'] for p in product_values)
+        df = pd.DataFrame(query.all(), columns=['barcode', 'purchase_price', 'stock_total', 'group'][:len(columns)])
+        if df.empty:
+            return {'total': 0, 'success': 0, 'group_by': group_by}
         
-        # Определяем границы категорий
-        cumulative_value = 0
-        threshold_a = total_value * 0.8
-        threshold_b = total_value * 0.95
+        # Стоимость остатков; товары без цены или без остатка не классифицируются
+        price = df['purchase_price'].fillna(0)
+        stock = df['stock_total'].fillna(0)
+        df = df.assign(
+            value=price * stock,
+            group=df['group'].fillna('') if group_by else ''
+        )[(price != 0) & (stock != 0)]
         
-        success_count = 0
+        # По убыванию стоимости внутри группы; при равенстве сохраняется порядок выборки
+        df = df.sort_values('value', ascending=False, kind='stable').sort_values('group', kind='stable')
+        cumulative = df.groupby('group', sort=False)['value'].cumsum()
+        total = cumulative.groupby(df['group'], sort=False).transform('last')
         
-        for item in product_values:
-            cumulative_value += item['value']
-            
-            if cumulative_value <= threshold_a:
-                category = 'A'
-            elif cumulative_value <= threshold_b:
-                category = 'B'
-            else:
-                category = 'C'
-            
-            # Обновляем или создаем расчетные данные
-            calc_data = self.db.query(CalculatedData).filter(
-                CalculatedData.barcode == item['barcode']
-            ).first()
-            
-            if calc_data:
-                calc_data.abc_category = category
-            else:
-                calc_data = CalculatedData(
-                    barcode=item['barcode'],
-                    abc_category=category
-                )
-                self.db.add(calc_data)
-            
-            success_count += 1
+        df['abc_category'] = np.select(
+            [cumulative <= total * 0.8, cumulative <= total * 0.95],
+            ['A', 'B'],
+            default='C'
+        )
         
+        bulk_upsert(self.db, CalculatedData, df[['barcode', 'abc_category']].to_dict('records'))
+        # Классы меняются по всему каталогу — сводки пересобираются целиком
+        SummaryService(self.db).refresh([barcode] if barcode else None)
         self.db.commit()
+        if barcode:
+            catalog_snapshot.patch(self.db, [barcode])
+        else:
+            catalog_snapshot.invalidate()
         
         return {
-            'total': len(product_values),
-            'success': success_count
+            'total': len(df),
+            'success': len(df),
+            'group_by': group_by
         }
     
-    def calculate_turnover_rate(self, barcode: str, days: int = 30) -> Optional[dict]:
+    def _weekly_sales_select(self, start, barcode: Optional[str] = None):
         """
-        Рассчитать оборачиваемость товара
-        Требуется история продаж - пока заглушка
+        Продажи по товарам за период от start одним агрегирующим запросом:
+        сумма и сумма квадратов недельных продаж, сумма остатков и число дней с остатком.
+        Недели без продаж в выборку не попадают — в дисперсии это нули
         """
-        # TODO: Реализовать когда будет таблица с историей продаж
-        # Оборачиваемость = Продажи за период / Средний остаток
-        
-        product = self.db.query(Product).filter(Product.barcode == barcode).first()
-        if not product:
-            return None
-        
-        # Заглушка: используем текущий остаток
-        # В реальности нужно брать данные продаж
-        turnover_rate = 0.0  # Placeholder
-        
-        calc_data = self.db.query(CalculatedData).filter(
-            CalculatedData.barcode == barcode
-        ).first()
-        
-        if calc_data:
-            calc_data.turnover_rate = turnover_rate
+        if self.db.get_bind().dialect.name == 'postgresql':
+            offset = cast(SalesHistory.sale_date - start, Integer)
         else:
-            calc_data = CalculatedData(
-                barcode=barcode,
-                turnover_rate=turnover_rate
-            )
-            self.db.add(calc_data)
-        
+            offset = cast(func.julianday(SalesHistory.sale_date) - func.julianday(start.isoformat()), Integer)
+
+        weekly = select(
+            SalesHistory.barcode,
+            func.sum(SalesHistory.quantity).label('sold'),
+            func.sum(SalesHistory.stock).label('stock_sum'),
+            func.count(case((SalesHistory.stock.isnot(None), SalesHistory.sale_date)).distinct()).label('stock_days')
+        ).where(SalesHistory.sale_date >= start, *self._in_shard(SalesHistory.barcode))
+        if barcode is not None:
+            weekly = weekly.where(SalesHistory.barcode == barcode)
+        weekly = weekly.group_by(SalesHistory.barcode, offset // 7).subquery()
+
+        return select(
+            weekly.c.barcode,
+            func.sum(weekly.c.sold).label('sold'),
+            func.sum(weekly.c.sold * weekly.c.sold).label('sold_sq'),
+            func.sum(weekly.c.stock_sum).label('stock_sum'),
+            func.sum(weekly.c.stock_days).label('stock_days')
+        ).group_by(weekly.c.barcode)
+
+    def calculate_sales_metrics(self, days: int = SALES_METRICS_DAYS, barcode: Optional[str] = None) -> dict:
+        """
+        Оборачиваемость и XYZ категория по истории продаж за последние days дней
+        (целыми неделями, до последней даты в истории) — один проход по всему каталогу.
+        Оборачиваемость = продано за период / средний остаток (по дням с остатком в отчетах,
+        иначе текущий остаток); без продаж — 0.
+        XYZ — по коэффициенту вариации недельных продаж: X ≤ 0.1, Y ≤ 0.25, иначе Z;
+        без продаж за период категория не присваивается
+        """
+        weeks = max(days // 7, 1)
+        end = self.db.query(func.max(SalesHistory.sale_date)).scalar()
+
+        products = self.db.query(Product.barcode, Product.stock_total).filter(*self._in_shard(Product.barcode))
+        if barcode is not None:
+            products = products.filter(Product.barcode == barcode)
+        df = pd.DataFrame(products.all(), columns=['barcode', 'stock_total'])
+        if df.empty:
+            return {'total': 0, 'success': 0, 'days': weeks * 7, 'period_end': end}
+
+        sales = pd.DataFrame(columns=['barcode', 'sold', 'sold_sq', 'stock_sum', 'stock_days'])
+        if end is not None:
+            start = end - timedelta(days=weeks * 7 - 1)
+            rows = self.db.execute(self._weekly_sales_select(start, barcode)).all()
+            if rows:
+                sales = pd.DataFrame(rows, columns=sales.columns)
+        df = df.merge(sales, on='barcode', how='left')
+
+        sold = df['sold'].astype(float).fillna(0).to_numpy()
+        sold_sq = df['sold_sq'].astype(float).fillna(0).to_numpy()
+        stock_days = df['stock_days'].astype(float).fillna(0).to_numpy()
+        stock_sum = df['stock_sum'].astype(float).fillna(0).to_numpy()
+        current_stock = df['stock_total'].astype(float).fillna(0).to_numpy()
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            mean = sold / weeks
+            std = np.sqrt(np.clip(sold_sq / weeks - mean ** 2, 0, None))
+            cv = std / mean
+            avg_stock = np.where(stock_days > 0, stock_sum / stock_days, current_stock)
+            turnover = np.where(sold > 0, sold / avg_stock, 0.0)
+
+        has_sales = sold > 0
+        xyz = np.select(
+            [~has_sales, cv <= XYZ_THRESHOLDS[0], cv <= XYZ_THRESHOLDS[1]],
+            [None, 'X', 'Y'],
+            default='Z'
+        )
+        # Продажи без остатка (остаток 0) — оборачиваемость не определена
+        turnover = np.where(np.isfinite(turnover), np.round(turnover, 4), np.nan)
+
+        result = pd.DataFrame({
+            'barcode': df['barcode'],
+            'turnover_rate': pd.Series(turnover).astype(object).where(~np.isnan(turnover), None),
+            'xyz_category': xyz
+        })
+        bulk_upsert(self.db, CalculatedData, result.to_dict('records'))
         self.db.commit()
-        
+
+        return {
+            'total': len(df),
+            'success': int(has_sales.sum()),
+            'days': weeks * 7,
+            'period_end': end
+        }
+
+    def calculate_turnover_rate(self, barcode: str, days: int = SALES_METRICS_DAYS) -> Optional[dict]:
+        """Рассчитать оборачиваемость (и XYZ) одного товара по истории продаж"""
+        if self.db.query(Product.barcode).filter(Product.barcode == barcode).first() is None:
+            return None
+
+        self.calculate_sales_metrics(days, barcode)
+        calc_data = self.db.query(CalculatedData).filter(CalculatedData.barcode == barcode).first()
+
         return {
             'barcode': barcode,
-            'turnover_rate': turnover_rate
+            'turnover_rate': calc_data.turnover_rate,
+            'xyz_category': calc_data.xyz_category
         }
     
+    def calculate_stock_metrics(
+        self, as_of: Optional[date] = None, barcodes: Optional[Sequence[str]] = None, commit: bool = True
+    ) -> dict:
+        """
+        Дни с остатком, текущая серия дней без остатка и средний остаток на дату as_of
+        (по умолчанию сегодня) из stock_state: показатели, накопленные к последнему
+        изменению остатка, плюс дни с него — без чтения истории снимков.
+        barcodes — только эти товары
+        """
+        as_of = as_of or date.today()
+        query = self.db.query(
+            StockState.barcode, StockState.since_date, StockState.stock_total,
+            StockState.tracked_days, StockState.days_in_stock, StockState.stock_days
+        ).filter(*self._in_shard(StockState.barcode))
+        if barcodes is not None:
+            query = query.filter(StockState.barcode.in_(barcodes))
+        df = pd.DataFrame(
+            query.all(),
+            columns=['barcode', 'since_date', 'stock_total', 'tracked_days', 'days_in_stock', 'stock_days']
+        )
+        if df.empty:
+            return {'total': 0, 'in_stock': 0, 'as_of': as_of}
+
+        elapsed = (pd.Timestamp(as_of) - pd.to_datetime(df['since_date'])).dt.days.clip(lower=0).to_numpy()
+        stock = df['stock_total'].to_numpy()
+        in_stock = stock > 0
+        tracked = df['tracked_days'].to_numpy() + elapsed
+        stock_days = df['stock_days'].to_numpy() + stock * elapsed
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            # Снимок сделан сегодня и истории еще нет — средний остаток равен текущему
+            avg_stock = np.where(tracked > 0, stock_days / tracked, stock)
+
+        result = pd.DataFrame({
+            'barcode': df['barcode'],
+            'days_in_stock': df['days_in_stock'].to_numpy() + np.where(in_stock, elapsed, 0),
+            # Снимок пишется только при изменении: остаток 0 держится с since_date
+            'stock_out_days': np.where(in_stock, 0, elapsed),
+            'avg_stock': np.round(avg_stock.astype(float), 2)
+        })
+        bulk_upsert(self.db, CalculatedData, result.to_dict('records'))
+        if commit:
+            self.db.commit()
+
+        return {
+            'total': len(result),
+            'in_stock': int(in_stock.sum()),
+            'as_of': as_of
+        }
+
+    def recalculate_dirty(self, batch_size: int) -> int:
+        """
+        Пересчитывает наценку и показатели остатков для пачки товаров из dirty_barcodes,
+        обновляет по ним сводки и снимает с товаров отметку (одна транзакция). Возвращает размер пачки.
+        ABC и XYZ зависят от всего каталога и пересчитываются полным расчетом.
+        В PostgreSQL пачка блокируется (SKIP LOCKED) — параллельные обработчики не пересекаются
+        """
+        dirty = self.db.execute(
+            select(DirtyBarcode.barcode, DirtyBarcode.marked_at)
+            .order_by(DirtyBarcode.marked_at)
+            .limit(batch_size)
+            .with_for_update(skip_locked=True)
+        ).all()
+        if not dirty:
+            return 0
+
+        barcodes = [row.barcode for row in dirty]
+        self._upsert_margins(self._margin_select(barcodes))
+        self.calculate_stock_metrics(barcodes=barcodes, commit=False)
+        SummaryService(self.db).refresh(barcodes)
+
+        # Отметки, обновленные во время пересчета (marked_at изменился), остаются до следующей пачки
+        self.db.execute(delete(DirtyBarcode).where(
+            tuple_(DirtyBarcode.barcode, DirtyBarcode.marked_at).in_([tuple(row) for row in dirty])
+        ))
+        self.db.commit()
+        catalog_snapshot.patch(self.db, barcodes)
+        return len(dirty)
+    
     def recalculate_all(self) -> dict:
         """Пересчитать все расчетные поля"""
         margin_result = self.calculate_all_margins()
         abc_result = self.calculate_abc_category()
+        sales_result = self.calculate_sales_metrics()
+        stock_result = self.calculate_stock_metrics()
         
         return {
             'margins': margin_result,
-            'abc_categories': abc_result
+            'abc_categories': abc_result,
+            'sales_metrics': sales_result,
+            'stock_metrics': stock_result
         }
     
-    def get_low_stock_products(self, threshold: int = 5):
-        """Получить товары с низким остатком"""
-        products = self.db.query(Product).filter(
+    def _analytics_filters(self, query, brand: Optional[str], product_category: Optional[str]):
+        if brand:
+            query = query.where(Product.brand == brand)
+        if product_category:
+            query = query.where(Product.product_category == product_category)
+        return query
+
+    def get_low_stock_products(
+        self,
+        threshold: int = 5,
+        limit: int = ANALYTICS_PAGE_SIZE,
+        cursor: Optional[str] = None,
+        sort: str = 'stock_total',
+        descending: bool = False,
+        brand: Optional[str] = None,
+        product_category: Optional[str] = None
+    ) -> dict:
+        """
+        Получить товары с низким остатком — постранично по курсору.
+        sort — 'stock_total' или 'barcode'. Возвращает {'items': [...], 'next_cursor': ..., 'source': ...}.
+        Из снимка каталога в памяти, если он актуален, иначе запросом
+        """
+        if sort not in LOW_STOCK_SORTS:
+            raise ValueError(f"Сортировка: одна из {', '.join(LOW_STOCK_SORTS)}")
+        snapshot = catalog_snapshot.get(self.db)
+        if snapshot is not None:
+            result = snapshot.low_stock(threshold, limit, cursor, sort, descending, brand, product_category)
+            return {**result, 'source': 'snapshot'}
+        query = select(
+            Product.barcode, Product.name, Product.brand, Product.product_category, Product.stock_total
+        ).where(
             Product.stock_total <= threshold,
             Product.stock_total > 0
-        ).all()
-        
-        return [
-            {
-                'barcode': p.barcode,
-                'name': p.name,
-                'brand': p.brand,
-                'stock_total': p.stock_total
-            }
-            for p in products
-        ]
+        )
+        query = self._analytics_filters(query, brand, product_category)
+
+        order = [Product.barcode] if sort == 'barcode' else [Product.stock_total, Product.barcode]
+        items, next_cursor = keyset_page(self.db, query, order, limit, cursor, descending)
+        return {'items': items, 'next_cursor': next_cursor, 'source': 'sql'}
     
-    def get_high_margin_products(self, min_margin_percent: float = 50.0):
-        """Получить товары с высокой наценкой"""
-        calc_data = self.db.query(CalculatedData).filter(
+    def get_high_margin_products(
+        self,
+        min_margin_percent: float = 50.0,
+        limit: int = ANALYTICS_PAGE_SIZE,
+        cursor: Optional[str] = None,
+        sort: str = 'margin_percent',
+        descending: bool = True,
+        brand: Optional[str] = None,
+        product_category: Optional[str] = None
+    ) -> dict:
+        """
+        Получить товары с высокой наценкой одним запросом с join — постранично по курсору.
+        sort — 'margin_percent' или 'barcode'. Возвращает {'items': [...], 'next_cursor': ..., 'source': ...}.
+        Из снимка каталога в памяти, если он актуален
+        """
+        if sort not in HIGH_MARGIN_SORTS:
+            raise ValueError(f"Сортировка: одна из {', '.join(HIGH_MARGIN_SORTS)}")
+        snapshot = catalog_snapshot.get(self.db)
+        if snapshot is not None:
+            result = snapshot.high_margin(min_margin_percent, limit, cursor, sort, descending, brand, product_category)
+            return {**result, 'source': 'snapshot'}
+        # Ключ сортировки — из calculated_data: порядок отдает индекс по (margin_percent, barcode)
+        query = select(
+            CalculatedData.barcode, Product.name, Product.brand, Product.product_category,
+            CalculatedData.margin_percent, CalculatedData.margin
+        ).join(
+            Product, Product.barcode == CalculatedData.barcode
+        ).where(
             CalculatedData.margin_percent >= min_margin_percent
-        ).all()
-        
-        result = []
-        for cd in calc_data:
-            product = self.db.query(Product).filter(
-                Product.barcode == cd.barcode
-            ).first()
-            if product:
-                result.append({
-                    'barcode': product.barcode,
-                    'name': product.name,
-                    'brand': product.brand,
-                    'margin_percent': cd.margin_percent,
-                    'margin': cd.margin
-                })
-        
-        return result
+        )
+        query = self._analytics_filters(query, brand, product_category)
+
+        order = [CalculatedData.barcode] if sort == 'barcode' else [CalculatedData.margin_percent, CalculatedData.barcode]
+        items, next_cursor = keyset_page(self.db, query, order, limit, cursor, descending)
+        return {'items': items, 'next_cursor': next_cursor, 'source': 'sql'}
     
     def get_category_summary(self):
-        """Получить сводку по ABC категориям"""
-        categories = self.db.query(
-            CalculatedData.abc_category,
-            self.db.func.count(CalculatedData.barcode).label('count')
-        ).group_by(CalculatedData.abc_category).all()
-        
+        """Получить сводку по ABC категориям (из материализованной сводки)"""
         return {
-            cat: count for cat, count in categories
-        }
\ No newline at end of file
+            row['key']: row['product_count'] for row in SummaryService(self.db).get('abc')
+        }
@@ -1,8 +1,12 @@
 import pandas as pd
 from sqlalchemy.orm import Session
-from app.models.product import Product, MarketplaceData
-from typing import List, Optional
+from app.models.product import Product, MarketplaceData, ImportRowError
+from openpyxl import Workbook
+from typing import Iterator, List, Optional
+import csv
+import io
 import os
+import tempfile
 from datetime import datetime
 
 class ExportService:
@@ -180,4 +184,57 @@ class ExportService:
         
         df.to_excel(filepath, index=False, sheet_name='Все товары')
         
-        return filepath
\ No newline at end of file
+        return filepath
+    
+    def _import_errors(self, import_log_id: int, batch_size: int = 5000):
+        """Строки ошибок импорта по порядку строк файла, пачками (без загрузки всего отчета в память)"""
+        return self.db.query(
+            ImportRowError.row_number,
+            ImportRowError.reason,
+            ImportRowError.row_data
+        ).filter(
+            ImportRowError.import_log_id == import_log_id
+        ).order_by(ImportRowError.row_number, ImportRowError.id).yield_per(batch_size)
+    
+    def _import_error_labels(self, import_log_id: int) -> List[str]:
+        first = self.db.query(ImportRowError.row_data).filter(
+            ImportRowError.import_log_id == import_log_id
+        ).order_by(ImportRowError.id).first()
+        return list(first.row_data or {}) if first else []
+    
+    def _import_error_rows(self, import_log_id: int) -> Iterator[list]:
+        """Шапка и строки отчета в прежнем формате: строка в Excel, колонки файла, причина"""
+        labels = self._import_error_labels(import_log_id)
+        yield ['Строка в Excel', *labels, 'Причина ошибки']
+        for row in self._import_errors(import_log_id):
+            row_data = row.row_data or {}
+            yield [row.row_number, *[row_data.get(label) for label in labels], row.reason]
+    
+    def export_import_errors(self, import_log_id: int) -> str:
+        """
+        Отчет об ошибках импорта в XLSX, строится по запросу из import_errors.
+        Write-only книга openpyxl пишет строки потоково; возвращает путь к временному файлу
+        """
+        fd, filepath = tempfile.mkstemp(prefix="error_report_", suffix=".xlsx")
+        os.close(fd)
+        
+        wb = Workbook(write_only=True)
+        ws = wb.create_sheet('Ошибки')
+        for row in self._import_error_rows(import_log_id):
+            ws.append(row)
+        wb.save(filepath)
+        
+        return filepath
+    
+    def iter_import_errors_csv(self, import_log_id: int) -> Iterator[str]:
+        """Отчет об ошибках импорта в CSV, отдается по мере чтения из базы"""
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, delimiter=';')
+        buffer.write('\ufeff')  # BOM — чтобы Excel открыл UTF-8 без мастера импорта
+        for i, row in enumerate(self._import_error_rows(import_log_id), 1):
+            writer.writerow(row)
+            if i % 1000 == 0:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue()
@@ -1,827 +1,1194 @@
 import pandas as pd
+from sqlalchemy import insert, update, select, cast, String
 from sqlalchemy.orm import Session
-from app.models.product import Product, MarketplaceData, ImportLog
-from typing import Dict, Any
-import re
+from app.models.product import (
+    Product, MarketplaceData, ImportLog, ImportRowError, ImportRowHash, SalesHistory, StockSnapshot, StockState
+)
+from app.utils.bulk import bulk_upsert, iter_batches
+from app.utils.column_spec import ColumnSpec, ParsedFrame, parse_frame
+from app.utils.partitions import ensure_month_partitions
+from app.services.recalc_service import mark_dirty
+from app.utils.readers import SheetLayout, read_table, iter_table_chunks, check_columns
+from typing import Dict, Any, Callable, List, Optional, Tuple
+from datetime import date
+import math
 import os
+import threading
 import traceback
-import tempfile
-from openpyxl import load_workbook
-from datetime import datetime
 
-# --- ДОБАВЛЕНО: безопасный парсер XLSX без чтения styles.xml ---
-import zipfile
-import xml.etree.ElementTree as ET
+# --- Спецификации колонок выгрузок и разбор без цикла по строкам ---
 
+SPEC_1C = [
+    ColumnSpec('ШК', 'barcode', required=True),
+    ColumnSpec('Артикул', 'article_1c'),
+    ColumnSpec('Номенклатура', 'name'),
+    ColumnSpec('Ед.', 'unit'),
+    ColumnSpec('Свойство: Фирма', 'brand'),
+    ColumnSpec('Свойство: Вид товара', 'product_type'),
+    ColumnSpec('Свойство: Тип товара', 'product_category'),
+    ColumnSpec('Свойство: Коллекция', 'collection'),
+    ColumnSpec('Свойство: Сезон', 'season'),
+    ColumnSpec('Свойство: Размер', 'size'),
+    ColumnSpec('Склад на Есенина', 'stock_esenina', 'int', default=0),
+    ColumnSpec('Склад на Есенина SOFT', 'stock_esenina_soft', 'int', default=0),
+    ColumnSpec('Склад на Есенина Дальний', 'stock_esenina_far', 'int', default=0),
+    ColumnSpec('Цена: Закупочная,руб.', 'purchase_price', 'float', default=0.0),
+]
 
-def safe_read_xlsx_sheet_as_dataframe(xlsx_path: str, sheet_index: int = 1, header_row_index: int = 1) -> pd.DataFrame:
+SPEC_WB_BARCODES = [
+    ColumnSpec('Баркод', 'barcode'),
+    ColumnSpec('Артикул продавца', 'article'),
+    ColumnSpec('Артикул WB', 'external_id'),
+]
+
+SPEC_WB_PRICES = [
+    ColumnSpec('Артикул WB', 'external_id'),
+    ColumnSpec('Последний баркод', 'barcode'),
+    # Новое значение, если задано, иначе текущее (как в формуле шаблона WB)
+    ColumnSpec(('Новая цена', 'Текущая цена'), 'price_before_discount', 'float', default=0.0),
+    ColumnSpec(('Новая скидка', 'Текущая скидка'), 'discount_percent', 'float', default=0.0),
+]
+
+WB_MIN_PRICE_COLUMN = 'Текущая минимальная цена для применения скидки по автоакции'
+
+SPEC_WB_MIN_PRICES = [
+    ColumnSpec('Артикул WB', 'external_id'),
+    ColumnSpec(WB_MIN_PRICE_COLUMN, 'min_price', 'leading_number', default=0.0),
+]
+
+SPEC_OZON_BARCODES = [
+    ColumnSpec('Штрихкод', 'barcode'),
+    ColumnSpec('Артикул', 'article'),
+    ColumnSpec('Ozon Product ID', 'external_id'),
+]
+
+SPEC_OZON_PRICES = [
+    ColumnSpec('Штрихкод', 'barcode'),
+    ColumnSpec('Цена до скидки, руб.', 'price_before_discount', 'number'),
+    ColumnSpec('Текущая цена (со скидкой), руб.', 'current_price', 'number'),
+    ColumnSpec('Скидка, %', 'discount_percent', 'number'),
+    ColumnSpec('Минимальная цена, руб.', 'min_price', 'number'),
+]
+
+# Служебные строки шаблона цен Ozon
+OZON_PRICES_SERVICE_VALUES = ['Нередактируемое', 'Редактируемое', 'Основные характеристики товара']
+
+# Отчеты о продажах по дням (WB и Ozon): названия колонок у маркетплейсов различаются
+SALES_DATE_COLUMNS = ('Дата', 'Дата продажи')
+SALES_BARCODE_COLUMNS = ('Баркод', 'Штрихкод', 'ШК')
+
+SPEC_SALES = [
+    ColumnSpec(SALES_DATE_COLUMNS, 'sale_date', 'date', required=True),
+    ColumnSpec(SALES_BARCODE_COLUMNS, 'barcode', required=True),
+    ColumnSpec(('Количество', 'Кол-во', 'Продано, шт'), 'quantity', 'int', default=0),
+    ColumnSpec(('Сумма', 'Выручка', 'Выручка, руб.'), 'revenue', 'number', default=0.0),
+    ColumnSpec(('Остаток', 'Остаток, шт'), 'stock', 'int'),
+]
+
+# Расположение таблиц в выгрузках и колонки, без которых файл отклоняется сразу по заголовку.
+# CSV/TSV-выгрузки читаются с той же строкой заголовка
+LAYOUT_1C = SheetLayout(required=['ШК'], title="выгрузку 1С")
+LAYOUT_WB_BARCODES = SheetLayout(
+    sheet='Товары', header_row=2, required=['Баркод'], title="таблицу ШК Wildberries"
+)
+LAYOUT_WB_PRICES = SheetLayout(
+    required=[('Артикул WB', 'Последний баркод')], title="выгрузку цен Wildberries"
+)
+LAYOUT_WB_MIN_PRICES = SheetLayout(
+    required=['Артикул WB', WB_MIN_PRICE_COLUMN], title="выгрузку минимальных цен Wildberries"
+)
+# Отчет Ozon со штрихкодами — ВТОРОЙ лист, заголовок на второй строке
+LAYOUT_OZON_BARCODES = SheetLayout(sheet=1, header_row=1, required=['Штрихкод'], title="таблицу ШК Ozon")
+LAYOUT_OZON_PRICES = SheetLayout(sheet=0, header_row=1, required=['Штрихкод'], title="шаблон цен Ozon")
+LAYOUT_WB_SALES = SheetLayout(
+    required=[SALES_DATE_COLUMNS, SALES_BARCODE_COLUMNS], title="отчет о продажах Wildberries"
+)
+LAYOUT_OZON_SALES = SheetLayout(
+    required=[SALES_DATE_COLUMNS, SALES_BARCODE_COLUMNS], title="отчет о продажах Ozon"
+)
+
+
+def read_1c(file_path: str) -> pd.DataFrame:
+    return read_table(file_path, LAYOUT_1C)
+
+
+def parse_1c(df: pd.DataFrame, first_row: int = 2) -> ParsedFrame:
+    parsed = parse_frame(df, SPEC_1C, first_row=first_row)
+    data = parsed.data
+    data['stock_total'] = data['stock_esenina'] + data['stock_esenina_soft'] + data['stock_esenina_far']
+    return parsed
+
+
+def read_wb_barcodes(file_path: str) -> pd.DataFrame:
+    return read_table(file_path, LAYOUT_WB_BARCODES)
+
+
+def parse_wb_barcodes(df: pd.DataFrame) -> ParsedFrame:
+    # Заголовок в третьей строке, сразу за ним строка с описаниями колонок
+    parsed = parse_frame(df, SPEC_WB_BARCODES, first_row=4)
+    data = parsed.data
+    parsed.skip(pd.Series(range(len(data)), index=data.index) == 0)
+
+    no_barcode = data['barcode'] == ''
+    parsed.skip(no_barcode & (data['article'] == '') & (data['external_id'] == ''))
+    parsed.fail(no_barcode, "Баркод отсутствует, хотя другие данные присутствуют")
+    return parsed
+
+
+def read_wb_prices(file_path: str) -> pd.DataFrame:
+    return read_table(file_path, LAYOUT_WB_PRICES)
+
+
+def parse_wb_prices(df: pd.DataFrame) -> ParsedFrame:
+    parsed = parse_frame(df, SPEC_WB_PRICES)
+    data = parsed.data
+
+    no_keys = (data['external_id'] == '') & (data['barcode'] == '')
+    parsed.skip(no_keys & parsed.blank)
+    parsed.fail(no_keys, "Отсутствуют 'Артикул WB' и 'Последний баркод'")
+
+    # Цена со скидкой по формуле шаблона WB
+    base = data['price_before_discount']
+    discount = data['discount_percent']
+    data['current_price'] = (base * (1 - discount / 100)).round(2).where((base > 0) & (discount >= 0), base)
+    return parsed
+
+
+def read_wb_min_prices(file_path: str) -> pd.DataFrame:
+    return read_table(file_path, LAYOUT_WB_MIN_PRICES)
+
+
+def parse_wb_min_prices(df: pd.DataFrame) -> ParsedFrame:
+    parsed = parse_frame(df, SPEC_WB_MIN_PRICES)
+    no_article = parsed.data['external_id'] == ''
+    parsed.skip(no_article & parsed.blank)
+    parsed.fail(no_article, "Артикул WB отсутствует")
+    return parsed
+
+
+def read_ozon_barcodes(file_path: str) -> pd.DataFrame:
+    return read_table(file_path, LAYOUT_OZON_BARCODES)
+
+
+def parse_ozon_barcodes(df: pd.DataFrame) -> ParsedFrame:
+    parsed = parse_frame(df, SPEC_OZON_BARCODES, first_row=3)
+    data = parsed.data
+
+    # Строки с описаниями, которые Ozon вставляет после заголовка
+    parsed.skip(data['article'].str.contains('Уникальный идентификатор', regex=False))
+
+    no_keys = (data['barcode'] == '') & (data['article'] == '')
+    parsed.skip(no_keys & parsed.blank)
+    parsed.fail(no_keys, "Отсутствуют 'Штрихкод' и 'Артикул'")
+    return parsed
+
+
+def read_ozon_prices(file_path: str) -> pd.DataFrame:
+    return read_table(file_path, LAYOUT_OZON_PRICES)
+
+
+def parse_ozon_prices(df: pd.DataFrame) -> ParsedFrame:
+    parsed = parse_frame(df, SPEC_OZON_PRICES, first_row=3)
+    data = parsed.data
+
+    # Служебные строки шаблона и пустые строки
+    service = parsed.raw.apply(lambda col: col.str.strip().isin(OZON_PRICES_SERVICE_VALUES)).any(axis=1)
+    parsed.skip(service | parsed.blank)
+    parsed.fail(data['barcode'] == '', "Отсутствует 'Штрихкод'")
+
+    # Пересчёт скидки, если отсутствует
+    before = data['price_before_discount']
+    current = data['current_price']
+    recalc = data['discount_percent'].isna() & before.notna() & (before != 0) & current.notna() & (current != 0)
+    data['discount_percent'] = data['discount_percent'].where(~recalc, ((1 - current / before) * 100).round(2))
+    return parsed
+
+
+def read_wb_sales(file_path: str) -> pd.DataFrame:
+    return read_table(file_path, LAYOUT_WB_SALES)
+
+
+def read_ozon_sales(file_path: str) -> pd.DataFrame:
+    return read_table(file_path, LAYOUT_OZON_SALES)
+
+
+def parse_sales(df: pd.DataFrame) -> ParsedFrame:
+    parsed = parse_frame(df, SPEC_SALES)
+    parsed.skip(parsed.blank)
+    parsed.fail(parsed.data['quantity'] < 0, "Отрицательное количество продаж")
+    return parsed
+
+
+def aggregate_sales(parsed: ParsedFrame) -> pd.DataFrame:
     """
-    Читает указанный лист XLSX БЕЗ парсинга styles.xml (устойчиво к битым стилям).
-    sheet_index — 0-базовый индекс листа (1 = второй лист).
-    header_row_index — 0-базовый индекс строки заголовков (1 = вторая строка).
-    Возвращает pandas.DataFrame.
+    Корректные строки отчета, сложенные по (штрихкод, дата): в отчете может быть
+    несколько строк за день (заказы, склады). Остаток складывается, только если он указан.
+    source_row — последняя строка файла, вошедшая в день: день пишется вместе с ее пачкой
     """
-    with zipfile.ZipFile(xlsx_path) as z:
-        # 1) sharedStrings
-        shared = []
-        if "xl/sharedStrings.xml" in z.namelist():
-            root = ET.parse(z.open("xl/sharedStrings.xml")).getroot()
-            for si in root:
-                parts = []
-                for t in si.iter():
-                    if t.tag.endswith('t') and t.text is not None:
-                        parts.append(t.text)
-                shared.append("".join(parts))
-
-        # 2) определяем файл листа по индексу (обычно sheet{n}.xml)
-        sheet_path = f"xl/worksheets/sheet{sheet_index + 1}.xml"
-        if sheet_path not in z.namelist():
-            # Попробуем найти через workbook.xml (на случай нестандартного порядка)
-            wb_root = ET.parse(z.open("xl/workbook.xml")).getroot()
-            ns = wb_root.tag.split('}')[0].strip('{')
-            nsmap = {"ns": ns}
-            sheets = wb_root.find("ns:sheets", nsmap)
-            sheet_elems = list(sheets) if sheets is not None else []
-            if len(sheet_elems) <= sheet_index:
-                raise FileNotFoundError("Файл содержит меньше двух листов или не удалось определить sheet2.xml")
-            # В большинстве случаев файл всё равно sheet{n}.xml
-            if sheet_path not in z.namelist():
-                raise FileNotFoundError(f"Не найден {sheet_path} в архиве XLSX.")
-
-        root = ET.parse(z.open(sheet_path)).getroot()
-        ns = root.tag.split('}')[0].strip('{')
-        nsmap = {"ns": ns}
-        sheet_data = root.find("ns:sheetData", nsmap)
-        if sheet_data is None:
-            return pd.DataFrame()
-
-        def col_letters_to_idx(letters: str) -> int:
-            v = 0
-            for ch in letters:
-                if ch.isalpha():
-                    v = v * 26 + (ord(ch.upper()) - ord('A') + 1)
-            return v - 1
-
-        rows, max_col = [], -1
-        for r in sheet_data.findall("ns:row", nsmap):
-            cells = {}
-            for c in r.findall("ns:c", nsmap):
-                r_addr = c.attrib.get("r", "")
-                col_letters = "".join(ch for ch in r_addr if ch.isalpha())
-                col_idx = col_letters_to_idx(col_letters) if col_letters else None
-                v = c.find("ns:v", nsmap)
-                t = c.attrib.get("t")
-                text = ""
-                if t == "s" and v is not None and v.text:
-                    idx = int(v.text)
-                    text = shared[idx] if 0 <= idx < len(shared) else ""
-                elif t == "inlineStr":
-                    is_elem = c.find("ns:is", nsmap)
-                    if is_elem is not None:
-                        parts = []
-                        for n in is_elem.iter():
-                            if n.tag.endswith('t') and n.text is not None:
-                                parts.append(n.text)
-                        text = "".join(parts)
-                else:
-                    text = v.text if v is not None and v.text is not None else ""
-                if col_idx is not None:
-                    cells[col_idx] = text
-                    if col_idx > max_col:
-                        max_col = col_idx
-            row_vals = [cells.get(i, "") for i in range(max_col + 1)] if max_col >= 0 else []
-            rows.append(row_vals)
-
-        if not rows:
-            return pd.DataFrame()
-
-        # применяем header_row_index как в вашем коде (header=1 => заголовок во второй строке)
-        if len(rows) <= header_row_index:
-            return pd.DataFrame(rows)
-
-        header = [str(x).strip() for x in rows[header_row_index]]
-        data = rows[header_row_index + 1:]
-        # На случай, если строки короче заголовка
-        max_len = max((len(r) for r in data), default=0)
-        header = header[:max_len]
-        data = [r[:max_len] + [""] * (max_len - len(r)) for r in data]
-        df = pd.DataFrame(data, columns=header).fillna("")
-        return df
+    valid = parsed.valid().assign(source_row=parsed.source_rows[parsed.ok])
+    grouped = valid.groupby(['barcode', 'sale_date'], sort=False)
+    days = grouped.agg(
+        quantity=('quantity', 'sum'),
+        revenue=('revenue', 'sum'),
+        source_row=('source_row', 'max')
+    )
+    days['stock'] = grouped['stock'].sum(min_count=1).astype('Int64')
+    return days.reset_index()
+
+
+class MarketplaceLookup:
+    """
+    Ключи товаров и строк marketplace_data, загруженные один раз на файл.
+    Сопоставление строк выгрузки идет по словарям в памяти, а изменения
+    накапливаются и пишутся пачками в flush() вместо запросов на каждую строку.
+    """
+
+    def __init__(self, db: Session, marketplace: str):
+        self.db = db
+        self.marketplace = marketplace
+        self.product_barcodes = set()
+        self.by_barcode = {}  # (marketplace, barcode) -> строка marketplace_data
+        self.by_external_id = {}  # (marketplace, external_id) -> строка marketplace_data
+        self._updates = {}  # id -> изменяемые поля
+        self._inserts = []
+        self._changed_barcodes = set()  # товары, чьи строки изменены (для пересчета расчетных полей)
+
+        rows = self.db.query(
+            MarketplaceData.id,
+            MarketplaceData.barcode,
+            MarketplaceData.external_id
+        ).filter(
+            MarketplaceData.marketplace == marketplace
+        ).order_by(MarketplaceData.id).all()
+
+        for row in rows:
+            self._register({'id': row.id, 'barcode': row.barcode, 'external_id': row.external_id})
+
+    def _register(self, entry: Dict[str, Any]):
+        # setdefault: при дублях в базе, как и раньше с .first(), берется первая строка
+        if entry.get('barcode'):
+            self.by_barcode.setdefault((self.marketplace, entry['barcode']), entry)
+        if entry.get('external_id'):
+            self.by_external_id.setdefault((self.marketplace, entry['external_id']), entry)
+
+    def load_products(self, barcodes):
+        """Загружает множество существующих штрихкодов товаров среди переданных"""
+        wanted = sorted({b for b in barcodes if b})
+        for batch in iter_batches(wanted):
+            found = self.db.query(Product.barcode).filter(Product.barcode.in_(batch)).all()
+            self.product_barcodes.update(b for (b,) in found)
+
+    def find_by_barcode(self, barcode: str) -> Optional[Dict[str, Any]]:
+        return self.by_barcode.get((self.marketplace, barcode)) if barcode else None
+
+    def find_by_external_id(self, external_id: str) -> Optional[Dict[str, Any]]:
+        return self.by_external_id.get((self.marketplace, external_id)) if external_id else None
+
+    def update(self, entry: Dict[str, Any], **fields):
+        """Запоминает изменения существующей (или добавляемой в этом файле) строки"""
+        entry.update(fields)
+        self._changed_barcodes.add(entry.get('barcode'))
+        if 'id' in entry:
+            self._updates.setdefault(entry['id'], {'id': entry['id']}).update(fields)
+        self._register(entry)
+
+    def add(self, barcode: str, **fields) -> Dict[str, Any]:
+        """Добавляет новую строку marketplace_data; повтор штрихкода в файле обновит ее же"""
+        entry = {'barcode': barcode, 'marketplace': self.marketplace, **fields}
+        self._inserts.append(entry)
+        self._changed_barcodes.add(barcode)
+        self._register(entry)
+        return entry
+
+    def take_pending(self) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        """Забирает накопленные изменения: (обновления по id, новые строки)"""
+        updates, inserts = list(self._updates.values()), self._inserts
+        self._updates = {}
+        self._inserts = []
+        return updates, inserts
+
+    def take_changed_barcodes(self) -> List[str]:
+        """Забирает штрихкоды товаров, строки которых изменились с прошлого вызова"""
+        barcodes, self._changed_barcodes = self._changed_barcodes, set()
+        return [b for b in barcodes if b]
+
+    def flush(self):
+        """Пишет накопленные изменения пачками (executemany)"""
+        updates, inserts = self.take_pending()
+        for batch in iter_batches(updates):
+            self.db.execute(update(MarketplaceData), list(batch))
+
+        columns = [c.name for c in MarketplaceData.__table__.columns if c.name not in ('id', 'updated_at')]
+        rows = [{c: entry.get(c) for c in columns} for entry in inserts]
+        for batch in iter_batches(rows):
+            self.db.execute(insert(MarketplaceData), list(batch))
+
+        # id новых строк: повтор штрихкода в следующей пачке файла станет обновлением
+        inserted = {entry['barcode']: entry for entry in inserts if entry.get('barcode')}
+        for batch in iter_batches(list(inserted)):
+            found = self.db.query(MarketplaceData.id, MarketplaceData.barcode).filter(
+                MarketplaceData.marketplace == self.marketplace,
+                MarketplaceData.barcode.in_(batch)
+            ).all()
+            for row in found:
+                inserted[row.barcode].setdefault('id', row.id)
+
+
+def hash_rows(data: pd.DataFrame, columns: List[str]) -> List[str]:
+    """Стабильный 64-битный хэш нормализованных полей каждой строки (hex)"""
+    hashes = pd.util.hash_pandas_object(data[columns], index=False)
+    return [format(value, '016x') for value in hashes.tolist()]
+
+
+class RowHashes:
+    """
+    Хэши строк, записанных прошлыми импортами источника.
+    Строка, хэш которой не изменился, не перезаписывается: нет лишних UPDATE,
+    роста WAL и обновления updated_at для неизмененных товаров и цен.
+    key_column — колонка целевой таблицы: хэш учитывается, только пока строка существует.
+    """
+
+    def __init__(self, db: Session, source: str, key_column):
+        self.db = db
+        self.source = source
+        self._pending = {}
+
+        # Строковый ключ сравнивается без CAST — иначе индекс по ключу не используется
+        key = key_column if isinstance(key_column.type, String) else cast(key_column, String)
+        rows = self.db.query(ImportRowHash.key, ImportRowHash.row_hash).join(
+            key_column.class_, key == ImportRowHash.key
+        ).filter(ImportRowHash.source == source).all()
+        self.hashes = {row.key: row.row_hash for row in rows}
+
+    def changed(self, key, row_hash: str) -> bool:
+        """
+        True — строку нужно записать (и запомнить новый хэш).
+        key=None (строка еще не сохранена в базе) — всегда запись.
+        """
+        if key is None:
+            return True
+        key = str(key)
+        if self.hashes.get(key) == row_hash:
+            return False
+        self.hashes[key] = row_hash
+        self._pending[key] = row_hash
+        return True
+
+    def flush(self):
+        rows = [{'source': self.source, 'key': key, 'row_hash': row_hash} for key, row_hash in self._pending.items()]
+        bulk_upsert(self.db, ImportRowHash, rows)
+        self._pending = {}
+
+
+class StockSnapshots:
+    """
+    Снимки остатков при импорте 1С. В stock_snapshots дописываются только товары,
+    у которых изменился stock_total; их строка stock_state сдвигается на дни,
+    прошедшие с предыдущего изменения (остаток все это время был прежним).
+    Повторный импорт в тот же день заменяет снимок дня.
+    """
+
+    def __init__(self, db: Session, snapshot_date: Optional[date] = None):
+        self.db = db
+        self.snapshot_date = snapshot_date or date.today()
+        self._pending = {}  # barcode -> новая строка stock_state
+
+    def record(self, records: List[Dict[str, Any]]):
+        """Сравнивает остатки записей с последним снимком; изменения копятся до flush()"""
+        stocks = {record['barcode']: record['stock_total'] for record in records}
+
+        # Сначала только остатки: полные строки stock_state нужны лишь изменившимся товарам
+        current = {}
+        for batch in iter_batches([b for b in stocks if b not in self._pending]):
+            rows = self.db.execute(
+                select(StockState.barcode, StockState.stock_total).where(StockState.barcode.in_(batch))
+            )
+            current.update(rows.all())
+        changed = [
+            barcode for barcode, stock in stocks.items()
+            if (self._pending[barcode]['stock_total'] if barcode in self._pending else current.get(barcode)) != stock
+        ]
+
+        states = {b: state for b, state in self._pending.items() if b in stocks}
+        for batch in iter_batches([b for b in changed if b in current]):
+            rows = self.db.execute(select(*StockState.__table__.columns).where(StockState.barcode.in_(batch)))
+            states.update((row.barcode, dict(row._mapping)) for row in rows)
+
+        for barcode in changed:
+            stock = stocks[barcode]
+            state = states.get(barcode)
+            if state is None:
+                self._pending[barcode] = {
+                    'barcode': barcode, 'since_date': self.snapshot_date, 'stock_total': stock,
+                    'tracked_days': 0, 'days_in_stock': 0, 'stock_days': 0.0
+                }
+                continue
+            elapsed = max((self.snapshot_date - state['since_date']).days, 0)
+            self._pending[barcode] = {
+                'barcode': barcode,
+                'since_date': self.snapshot_date,
+                'stock_total': stock,
+                'tracked_days': state['tracked_days'] + elapsed,
+                'days_in_stock': state['days_in_stock'] + (elapsed if state['stock_total'] > 0 else 0),
+                'stock_days': state['stock_days'] + state['stock_total'] * elapsed
+            }
+
+    def flush(self):
+        if not self._pending:
+            return
+        # Новые товары небулкового импорта должны попасть в базу раньше stock_state
+        self.db.flush()
+        ensure_month_partitions(self.db, StockSnapshot.__table__, [self.snapshot_date])
+        bulk_upsert(self.db, StockSnapshot, [
+            {'barcode': barcode, 'snapshot_date': self.snapshot_date, 'stock_total': state['stock_total']}
+            for barcode, state in self._pending.items()
+        ])
+        bulk_upsert(self.db, StockState, list(self._pending.values()))
+        self._pending = {}
+
+
+def error_rows(error_details: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Строки отчета об ошибках -> поля import_errors (номер строки, ключ, причина, значения)"""
+    rows = []
+    for detail in error_details:
+        row_data = {k: v for k, v in detail.items() if k not in ('Строка в Excel', 'Причина ошибки')}
+        key = next(iter(row_data.values()), None)
+        rows.append({
+            'row_number': detail.get('Строка в Excel'),
+            'key': str(key) if key is not None else None,
+            'reason': detail.get('Причина ошибки'),
+            'row_data': row_data
+        })
+    return rows
+
+
+# Сколько ошибок и изменений показывать в результате пробного импорта
+DRY_RUN_SAMPLE_SIZE = 50
+
+
+def _plain(value):
+    # NaN не сериализуется в JSON
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    return value
+
+
+class DryRunReport:
+    """
+    Итог пробного импорта (dry_run): те же счетчики, что в ImportLog,
+    и примеры ошибок и изменений. В базу ничего не пишется.
+    Сопоставление с каталогом идет пачками, как и при настоящем импорте,
+    а текущие значения из базы читаются только для строк примера.
+    """
+
+    def __init__(self, source: str, sample_size: int = DRY_RUN_SAMPLE_SIZE):
+        self.source = source
+        self.sample_size = sample_size
+        self.file_name = None
+        self.status = None
+        self.records_processed = 0
+        self.records_added = 0
+        self.records_updated = 0
+        self.records_failed = 0
+        self.records_unchanged = 0
+        self.error_message = None
+        self.duplicate_of = None  # id ImportLog, если этот файл уже импортировался
+        self.errors = []
+        self.changes = []
+        self._new_barcodes = set()
+
+    @property
+    def _room(self) -> int:
+        return self.sample_size - len(self.changes)
+
+    def add_product_changes(self, db: Session, records: List[Dict[str, Any]]) -> int:
+        """
+        Сопоставляет записи 1С с товарами по штрихкоду (пачками IN).
+        Возвращает число товаров, которые были бы добавлены.
+        """
+        records = {record['barcode']: record for record in records}
+        existing = set()
+        for batch in iter_batches(list(records)):
+            found = db.query(Product.barcode).filter(Product.barcode.in_(batch)).all()
+            existing.update(b for (b,) in found)
+
+        new_barcodes = [b for b in records if b not in existing and b not in self._new_barcodes]
+        self._new_barcodes.update(new_barcodes)
+
+        sample = list(records.values())[:self._room]
+        previous = {}
+        sample_existing = [r['barcode'] for r in sample if r['barcode'] in existing]
+        if sample_existing:
+            for product in db.query(Product).filter(Product.barcode.in_(sample_existing)):
+                previous[product.barcode] = product
+        for record in sample:
+            fields = {k: _plain(v) for k, v in record.items() if k != 'barcode'}
+            product = previous.get(record['barcode'])
+            self.changes.append({
+                'action': 'update' if product is not None else 'add',
+                'key': record['barcode'],
+                'fields': fields,
+                'previous': {k: getattr(product, k) for k in fields} if product is not None else None
+            })
+        return len(new_barcodes)
+
+    def add_marketplace_changes(self, db: Session, lookup: MarketplaceLookup):
+        """Примеры изменений marketplace_data, накопленных в lookup (вместо записи)"""
+        updates, inserts = lookup.take_pending()
+
+        sample = updates[:self._room]
+        if sample:
+            rows = {
+                row.id: row for row in
+                db.query(MarketplaceData).filter(MarketplaceData.id.in_([u['id'] for u in sample]))
+            }
+            for fields in sample:
+                row = rows.get(fields['id'])
+                fields = {k: _plain(v) for k, v in fields.items() if k != 'id'}
+                self.changes.append({
+                    'action': 'update',
+                    'key': row.barcode if row is not None else None,
+                    'fields': fields,
+                    'previous': {k: getattr(row, k) for k in fields} if row is not None else None
+                })
+
+        for entry in inserts[:self._room]:
+            self.changes.append({
+                'action': 'add',
+                'key': entry['barcode'],
+                'fields': {k: _plain(v) for k, v in entry.items() if k not in ('barcode', 'marketplace')},
+                'previous': None
+            })
+
+    def add_errors(self, error_details: List[Dict[str, Any]]):
+        room = self.sample_size - len(self.errors)
+        self.errors.extend(
+            {**row, 'row_data': {k: _plain(v) for k, v in row['row_data'].items()}}
+            for row in error_rows(error_details[:max(room, 0)])
+        )
+
+    def finish(self, import_log: ImportLog):
+        """Переносит итоговые счетчики из (несохраняемого) ImportLog"""
+        for name in (
+            'file_name', 'status', 'records_processed', 'records_added', 'records_updated',
+            'records_failed', 'records_unchanged', 'error_message'
+        ):
+            setattr(self, name, getattr(import_log, name))
+        if self.status == 'failed':
+            self.changes = []
+
+
+# Источники импорта -> методы ImportService (значения совпадают с ImportLog.source)
+IMPORT_SOURCES = {
+    '1c': 'import_1c_data',
+    'wb_barcodes': 'import_wb_barcodes',
+    'wb_prices': 'import_wb_prices',
+    'wb_min_prices': 'import_wb_min_prices',
+    'ozon_barcodes': 'import_ozon_barcodes',
+    'ozon_prices': 'import_ozon_prices',
+    'wb_sales': 'import_wb_sales',
+    'ozon_sales': 'import_ozon_sales',
+}
+
+# Раскладка файла по источнику — для быстрой проверки заголовка до импорта
+LAYOUTS = {
+    '1c': LAYOUT_1C,
+    'wb_barcodes': LAYOUT_WB_BARCODES,
+    'wb_prices': LAYOUT_WB_PRICES,
+    'wb_min_prices': LAYOUT_WB_MIN_PRICES,
+    'ozon_barcodes': LAYOUT_OZON_BARCODES,
+    'ozon_prices': LAYOUT_OZON_PRICES,
+    'wb_sales': LAYOUT_WB_SALES,
+    'ozon_sales': LAYOUT_OZON_SALES,
+}
+
+# Чтение и разбор файла по источнику — без обращения к БД, поэтому может
+# выполняться в отдельном процессе; результат передается в import_*(parsed=...)
+PARSERS = {
+    '1c': (read_1c, parse_1c),
+    'wb_barcodes': (read_wb_barcodes, parse_wb_barcodes),
+    'wb_prices': (read_wb_prices, parse_wb_prices),
+    'wb_min_prices': (read_wb_min_prices, parse_wb_min_prices),
+    'ozon_barcodes': (read_ozon_barcodes, parse_ozon_barcodes),
+    'ozon_prices': (read_ozon_prices, parse_ozon_prices),
+    'wb_sales': (read_wb_sales, parse_sales),
+    'ozon_sales': (read_ozon_sales, parse_sales),
+}
+
+
+def parse_import_file(source: str, file_path: str) -> ParsedFrame:
+    """Читает и разбирает файл источника (без записи в БД)"""
+    read, parse = PARSERS[source]
+    return parse(read(file_path))
+
+
+def check_import_file(source: str, file_path: str):
+    """Проверяет по заголовку, что файл подходит источнику; иначе WrongFileError"""
+    check_columns(file_path, LAYOUTS[source])
+
+
+# Строк файла на одну транзакцию: после каждой пачки изменения фиксируются,
+# а в ImportLog.checkpoint_row записывается последняя обработанная строка файла
+IMPORT_COMMIT_BATCH = int(os.getenv("IMPORT_COMMIT_BATCH", "5000"))
+
+# ImportLog.id импортов, выполняющихся в этом процессе (их нельзя возобновлять)
+_active_logs = set()
+_active_logs_lock = threading.Lock()
+
+
+def is_import_active(import_log_id: int) -> bool:
+    with _active_logs_lock:
+        return import_log_id in _active_logs
 
 
 class ImportService:
-    def __init__(self, db: Session):
+    def __init__(
+        self,
+        db: Session,
+        progress: Optional[Callable[..., None]] = None,
+        file_hash: Optional[str] = None,
+        dry_run: bool = False,
+        resume: Optional[ImportLog] = None,
+        commit_size: Optional[int] = None
+    ):
         self.db = db
-    
-    def import_1c_data(self, file_path: str) -> ImportLog:
-        """Импорт данных из 1С с детальным логированием ошибок"""
-        try:
-            df = pd.read_excel(file_path, dtype=str).fillna('')  # Читаем все как строки
-            df.columns = df.columns.str.strip()
-            
-            records_processed = 0
-            records_added = 0
-            records_updated = 0
-            records_failed = 0
-            error_details = []  # Список для хранения деталей ошибок
-
-            for index, row in df.iterrows():
-                try:
-                    barcode = str(row.get('ШК', '')).strip()
-                    if not barcode:
-                        # Если штрихкода нет, это критическая ошибка для строки
-                        raise ValueError("Штрихкод (ШК) отсутствует или пуст")
-                    
-                    # Проверяем существование товара
-                    product = self.db.query(Product).filter(
-                        Product.barcode == barcode
-                    ).first()
-                    
-                    product_data = {
-                        'barcode': barcode,
-                        'article_1c': str(row.get('Артикул', '')).strip(),
-                        'name': str(row.get('Номенклатура', '')).strip(),
-                        'unit': str(row.get('Ед.', '')).strip(),
-                        'brand': str(row.get('Свойство: Фирма', '')).strip(),
-                        'product_type': str(row.get('Свойство: Вид товара', '')).strip(),
-                        'product_category': str(row.get('Свойство: Тип товара', '')).strip(),
-                        'collection': str(row.get('Свойство: Коллекция', '')).strip(),
-                        'season': str(row.get('Свойство: Сезон', '')).strip(),
-                        'size': str(row.get('Свойство: Размер', '')).strip(),
-                        'stock_esenina': int(row.get('Склад на Есенина', 0) or 0),
-                        'stock_esenina_soft': int(row.get('Склад на Есенина SOFT', 0) or 0),
-                        'stock_esenina_far': int(row.get('Склад на Есенина Дальний', 0) or 0),
-                        'purchase_price': float(row.get('Цена: Закупочная,руб.', 0) or 0)
-                    }
-                    
-                    product_data['stock_total'] = (
-                        product_data['stock_esenina'] +
-                        product_data['stock_esenina_soft'] +
-                        product_data['stock_esenina_far']
-                    )
-                    
-                    if product:
-                        for key, value in product_data.items():
-                            if key != 'barcode':
-                                setattr(product, key, value)
-                        records_updated += 1
-                    else:
-                        product = Product(**product_data)
-                        self.db.add(product)
-                        records_added += 1
-                    
-                    records_processed += 1
-                    
-                except Exception as e:
-                    records_failed += 1
-                    # Сохраняем детали ошибки
-                    error_details.append({
-                        'Строка в Excel': index + 2,  # +2 т.к. index с 0 и есть строка заголовков
-                        'Штрихкод': row.get('ШК', 'N/A'),
-                        'Номенклатура': row.get('Номенклатура', 'N/A'),
-                        'Причина ошибки': str(e)
-                    })
-                    continue
-            
-            self.db.commit()
+        # progress(stage, rows_parsed=..., rows_written=..., rows_total=...) — ход импорта для фоновых заданий
+        self.progress = progress
+        # SHA-256 импортируемого файла, сохраняется в ImportLog
+        self.file_hash = file_hash
+        self.last_log = None
+        # dry_run — пробный импорт: разбор, проверка и сопоставление с каталогом без записи в БД;
+        # итог (счетчики, примеры ошибок и изменений) — в self.dry_run_report
+        self.dry_run = dry_run
+        self.dry_run_report = None
+        # resume — прерванный или упавший импорт: строки до его checkpoint_row пропускаются,
+        # счетчики и ошибки дописываются в тот же ImportLog
+        self.resume = resume
+        self.commit_size = commit_size or IMPORT_COMMIT_BATCH
+
+    def _report_progress(self, stage: str, **counters):
+        if self.progress:
+            self.progress(stage, **counters)
 
-            # --- Создание отчета об ошибках ---
-            error_report_filename = None
-            if error_details:
-                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                error_report_filename = f"error_report_1c_{timestamp}.xlsx"
-                error_df = pd.DataFrame(error_details)
-                
-                # Убедимся, что папка exports существует
-                output_dir = "exports"
-                os.makedirs(output_dir, exist_ok=True)
-                
-                error_df.to_excel(os.path.join(output_dir, error_report_filename), index=False)
-
-            # Создаем лог импорта
+    def _dry_run_report(self, source: str) -> DryRunReport:
+        if self.dry_run_report is None:
+            self.dry_run_report = DryRunReport(source)
+        return self.dry_run_report
+
+    def _start_log(self, source: str, file_path: str) -> ImportLog:
+        """
+        ImportLog создается в начале импорта (status='running') и обновляется после каждой пачки.
+        При возобновлении продолжается прежний лог. Последний лог доступен в self.last_log
+        """
+        if self.resume is not None:
+            import_log = self.resume
+            import_log.status = 'running'
+            import_log.error_message = None
+        else:
             import_log = ImportLog(
-                source='1c',
+                source=source,
                 file_name=os.path.basename(file_path),
-                records_processed=records_processed,
-                records_added=records_added,
-                records_updated=records_updated,
-                records_failed=records_failed,
-                status='success' if records_failed == 0 else 'partial',
-                error_report_file=error_report_filename  # Сохраняем имя файла
-            )
-            self.db.add(import_log)
-            self.db.commit()
-            
-            return import_log
-            
-        except Exception as e:
-            self.db.rollback()
-            import_log = ImportLog(
-                source='1c',
-                file_name=file_path,
+                file_path=file_path,
+                file_hash=self.file_hash,
                 records_processed=0,
                 records_added=0,
                 records_updated=0,
                 records_failed=0,
-                status='failed',
-                error_message=str(e)
+                records_unchanged=0,
+                checkpoint_row=0,
+                status='running'
             )
+        self.last_log = import_log
+        if not self.dry_run:
             self.db.add(import_log)
             self.db.commit()
+            with _active_logs_lock:
+                _active_logs.add(import_log.id)
+        return import_log
+
+    def _commit_batch(
+        self,
+        import_log: ImportLog,
+        part: ParsedFrame,
+        report_columns: Dict[str, str],
+        lookup: Optional[MarketplaceLookup] = None,
+        row_hashes: Optional[RowHashes] = None,
+        **counters
+    ):
+        """
+        Фиксирует пачку строк одной короткой транзакцией: изменения marketplace_data,
+        хэши строк, ошибки пачки, счетчики (counters — приращения records_*) и checkpoint.
+        В пробном режиме вместо записи собираются примеры ошибок и изменений
+        """
+        for name, value in counters.items():
+            setattr(import_log, name, getattr(import_log, name) + value)
+        import_log.records_failed += part.failed_count
+        if len(part.source_rows):
+            import_log.checkpoint_row = int(part.source_rows.iloc[-1])
+        error_details = part.error_details(report_columns)
+
+        if self.dry_run:
+            report = self._dry_run_report(import_log.source)
+            report.add_errors(error_details)
+            if lookup is not None:
+                report.add_marketplace_changes(self.db, lookup)
+            return
+
+        if lookup is not None:
+            lookup.flush()
+            mark_dirty(self.db, lookup.take_changed_barcodes())
+        if row_hashes is not None:
+            row_hashes.flush()
+        if error_details:
+            self._save_errors(import_log.id, error_details)
+        self.db.commit()
+        self._report_progress('writing', rows_written=import_log.records_processed)
+
+    def _finish_log(self, import_log: ImportLog) -> ImportLog:
+        import_log.status = 'success' if import_log.records_failed == 0 else 'partial'
+        self._close_log(import_log)
+        return import_log
+
+    def _fail_log(self, import_log: ImportLog, error: Exception):
+        """
+        Незафиксированная пачка откатывается; записанные пачки, их счетчики
+        и checkpoint_row остаются — импорт можно возобновить с этого места
+        """
+        self.db.rollback()
+        import_log.status = 'failed'
+        import_log.error_message = str(error)
+        self._close_log(import_log)
+
+    def _close_log(self, import_log: ImportLog):
+        if self.dry_run:
+            self._dry_run_report(import_log.source).finish(import_log)
+            return
+        self.db.commit()
+        with _active_logs_lock:
+            _active_logs.discard(import_log.id)
+
+    def find_imported(self, source: str, file_hash: str) -> Optional[ImportLog]:
+        """Последний успешный (или частично успешный) импорт того же файла из того же источника"""
+        return self.db.query(ImportLog).filter(
+            ImportLog.source == source,
+            ImportLog.file_hash == file_hash,
+            ImportLog.status.in_(('success', 'partial'))
+        ).order_by(ImportLog.created_at.desc(), ImportLog.id.desc()).first()
+
+    def _save_errors(self, import_log_id: int, error_details: List[Dict[str, Any]]):
+        """Пачками пишет строки отчета об ошибках в import_errors"""
+        rows = [{'import_log_id': import_log_id, **row} for row in error_rows(error_details)]
+        for batch in iter_batches(rows):
+            self.db.execute(insert(ImportRowError), list(batch))
+
+    def import_1c_data(
+        self,
+        file_path: str,
+        bulk: bool = False,
+        chunk_size: Optional[int] = None,
+        parsed: Optional[ParsedFrame] = None
+    ) -> ImportLog:
+        """
+        Импорт данных из 1С с детальным логированием ошибок.
+        bulk=True — массовая загрузка: строки разбираются в памяти и пишутся
+        пачками через bulk_upsert вместо SELECT/INSERT на каждую строку.
+        chunk_size — потоковый режим: лист XLSX (или CSV) читается порциями по chunk_size
+        строк, каждая порция проверяется и записывается через bulk_upsert и
+        освобождается, так что память не зависит от размера файла.
+        Строки, не изменившиеся с прошлого импорта (по хэшу полей), не перезаписываются.
+        Изменившиеся остатки дописываются в историю снимков (StockSnapshots).
+        parsed — файл, уже разобранный заранее (пакетный импорт): чтение пропускается.
+        """
+        import_log = self._start_log('1c', file_path)
+        try:
+            self._report_progress('reading')
+            streaming = parsed is None and bool(chunk_size)
+            if parsed is not None:
+                parsed_chunks = [parsed]
+            elif streaming:
+                parsed_chunks = (parse_1c(df) for df in iter_table_chunks(file_path, LAYOUT_1C, chunk_size))
+                bulk = True
+            else:
+                parsed_chunks = [parse_1c(read_1c(file_path))]
+
+            row_hashes = RowHashes(self.db, '1c', Product.barcode)
+            snapshots = StockSnapshots(self.db)
+            rows_parsed = 0
+            for parsed in parsed_chunks:
+                rows_parsed += len(parsed.data)
+                # В потоковом режиме общее число строк заранее неизвестно
+                self._report_progress('writing', rows_parsed=rows_parsed, rows_total=None if streaming else len(parsed.data))
+
+                for part in parsed.batches(self.commit_size, import_log.checkpoint_row):
+                    records = part.records()
+                    valid = part.valid()
+                    changed = [
+                        record for record, row_hash in zip(records, hash_rows(valid, list(valid.columns)))
+                        if row_hashes.changed(record['barcode'], row_hash)
+                    ]
+
+                    if self.dry_run:
+                        added = self._dry_run_report('1c').add_product_changes(self.db, changed)
+                    elif bulk:
+                        added, _ = bulk_upsert(self.db, Product, changed)
+                    else:
+                        added = 0
+                        for product_data in changed:
+                            # Проверяем существование товара
+                            product = self.db.query(Product).filter(
+                                Product.barcode == product_data['barcode']
+                            ).first()
+
+                            if product:
+                                for key, value in product_data.items():
+                                    if key != 'barcode':
+                                        setattr(product, key, value)
+                            else:
+                                product = Product(**product_data)
+                                self.db.add(product)
+                                added += 1
+
+                    if not self.dry_run:
+                        mark_dirty(self.db, [record['barcode'] for record in changed])
+                        # Все строки, а не только измененные: так в историю попадают и товары,
+                        # импортированные до появления снимков
+                        snapshots.record(records)
+                        snapshots.flush()
+
+                    self._commit_batch(
+                        import_log, part, {'Штрихкод': 'ШК', 'Номенклатура': 'Номенклатура'},
+                        row_hashes=row_hashes,
+                        records_processed=len(records),
+                        records_added=added,
+                        # Повторы штрихкода в файле перезаписывают строку — считаем их обновлениями
+                        records_updated=len(changed) - added,
+                        records_unchanged=len(records) - len(changed)
+                    )
+                del parsed
+
+            self._report_progress('finishing')
+            return self._finish_log(import_log)
+
+        except Exception as e:
+            self._fail_log(import_log, e)
             raise e
         
-    def import_wb_barcodes(self, file_path: str) -> ImportLog:
+    def import_wb_barcodes(self, file_path: str, parsed: Optional[ParsedFrame] = None) -> ImportLog:
         """Импорт таблицы с ШК ВБ с детальным логированием ошибок"""
-        df = None
+        import_log = self._start_log('wb_barcodes', file_path)
         try:
-            df = pd.read_excel(file_path, sheet_name="Товары", header=2, dtype=str).fillna('')
-            df.columns = df.columns.str.strip()
-
-            # --- ФИНАЛЬНЫЙ ШТРИХ: Удаляем первую строку с описаниями ---
-            if not df.empty:
-                df = df.iloc[1:].reset_index(drop=True)
-
-            records_processed = 0
-            records_updated = 0
-            records_failed = 0
-            error_details = []
-
-            for index, row in df.iterrows():
-                try:
-                    barcode = str(row.get('Баркод', '')).strip()
-                    article_seller = str(row.get('Артикул продавца', '')).strip()
-                    article_wb = str(row.get('Артикул WB', '')).strip()
-                    
-                    if not barcode:
-                        if article_seller or article_wb:
-                           raise ValueError("Баркод отсутствует, хотя другие данные присутствуют")
-                        else: 
-                           continue
-
-                    product = self.db.query(Product).filter(Product.barcode == barcode).first()
-                    
-                    if not product:
-                        raise ValueError(f"Товар со штрихкодом {barcode} не найден в базе данных")
-                    
-                    mp_data = self.db.query(MarketplaceData).filter(
-                        MarketplaceData.barcode == barcode,
-                        MarketplaceData.marketplace == 'wb'
-                    ).first()
-                    
+            self._report_progress('reading')
+            if parsed is None:
+                parsed = parse_wb_barcodes(read_wb_barcodes(file_path))
+            total_rows = len(parsed.data)
+            self._report_progress('writing', rows_parsed=total_rows, rows_total=total_rows)
+            data = parsed.data
+
+            lookup = MarketplaceLookup(self.db, 'wb')
+            lookup.load_products(data.loc[parsed.ok, 'barcode'])
+            parsed.fail(
+                ~data['barcode'].isin(lookup.product_barcodes),
+                "Товар со штрихкодом " + data['barcode'] + " не найден в базе данных"
+            )
+
+            row_hashes = RowHashes(self.db, 'wb_barcodes', MarketplaceData.id)
+            for part in parsed.batches(self.commit_size, import_log.checkpoint_row):
+                records = part.records()
+                hashes = hash_rows(part.valid(), ['article', 'external_id'])
+                unchanged = 0
+                for record, row_hash in zip(records, hashes):
+                    mp_data = lookup.find_by_barcode(record['barcode'])
                     if mp_data:
-                        mp_data.article = article_seller
-                        mp_data.external_id = article_wb
+                        if not row_hashes.changed(mp_data.get('id'), row_hash):
+                            unchanged += 1
+                            continue
+                        lookup.update(mp_data, article=record['article'], external_id=record['external_id'])
                     else:
-                        mp_data = MarketplaceData(
-                            barcode=barcode,
-                            marketplace='wb',
-                            article=article_seller,
-                            external_id=article_wb
-                        )
-                        self.db.add(mp_data)
-                    
-                    records_processed += 1
-                    records_updated += 1
-                    
-                except Exception as e:
-                    records_failed += 1
-                    error_details.append({
-                        'Строка в Excel': index + 5,  # +5, т.к. 3 строки заголовка + 1 строка описания
-                        'Баркод': row.get('Баркод', 'N/A'),
-                        'Артикул продавца': row.get('Артикул продавца', 'N/A'),
-                        'Причина ошибки': str(e)
-                    })
-                    continue
-            
-            self.db.commit()
+                        lookup.add(record['barcode'], article=record['article'], external_id=record['external_id'])
 
-            error_report_filename = None
-            if error_details:
-                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                error_report_filename = f"error_report_wb_barcodes_{timestamp}.xlsx"
-                error_df = pd.DataFrame(error_details)
-                output_dir = "exports"
-                os.makedirs(output_dir, exist_ok=True)
-                error_df.to_excel(os.path.join(output_dir, error_report_filename), index=False)
-            
-            import_log = ImportLog(
-                source='wb_barcodes',
-                file_name=os.path.basename(file_path),
-                records_processed=records_processed,
-                records_added=0,
-                records_updated=records_updated,
-                records_failed=records_failed,
-                status='success' if records_failed == 0 else 'partial',
-                error_report_file=error_report_filename
-            )
-            self.db.add(import_log)
-            self.db.commit()
-            
-            return import_log
+                self._commit_batch(
+                    import_log, part, {'Баркод': 'Баркод', 'Артикул продавца': 'Артикул продавца'},
+                    lookup, row_hashes,
+                    records_processed=len(records),
+                    records_updated=len(records) - unchanged,
+                    records_unchanged=unchanged
+                )
+
+            self._report_progress('finishing')
+            return self._finish_log(import_log)
             
         except Exception as e:
             # traceback.print_exc()  # Можно закомментировать или удалить
-            self.db.rollback()
-            total_rows = df.shape[0] if df is not None else 0
-            import_log = ImportLog(
-                source='wb_barcodes',
-                file_name=os.path.basename(file_path),
-                records_processed=0,
-                records_added=0,
-                records_updated=0,
-                records_failed=total_rows,
-                status='failed',
-                error_message=str(e)
-            )
-            self.db.add(import_log)
-            self.db.commit()
+            self._fail_log(import_log, e)
             raise e
     
-    def import_wb_prices(self, file_path: str) -> ImportLog:
+    def import_wb_prices(self, file_path: str, parsed: Optional[ParsedFrame] = None) -> ImportLog:
         """Импорт цен ВБ с детальным логированием и корректным расчетом цены со скидкой"""
-        df = None
+        import_log = self._start_log('wb_prices', file_path)
         try:
-            df = pd.read_excel(file_path, dtype=str).fillna('')
-            df.columns = df.columns.str.strip()
-            
-            records_processed = 0
-            records_updated = 0
-            records_failed = 0
-            error_details = []
-
-            for index, row in df.iterrows():
-                try:
-                    article_wb = str(row.get('Артикул WB', '')).strip()
-                    barcode = str(row.get('Последний баркод', '')).strip()
-
-                    if not article_wb and not barcode:
-                        if any(row.values): 
-                            raise ValueError("Отсутствуют 'Артикул WB' и 'Последний баркод'")
-                        else: 
-                            continue
-
-                    mp_data = None
-                    if article_wb:
-                        mp_data = self.db.query(MarketplaceData).filter(
-                            MarketplaceData.marketplace == 'wb',
-                            MarketplaceData.external_id == article_wb
-                        ).first()
-                    
-                    if not mp_data and barcode:
-                        mp_data = self.db.query(MarketplaceData).filter(
-                            MarketplaceData.marketplace == 'wb',
-                            MarketplaceData.barcode == barcode
-                        ).first()
-
-                    if not mp_data:
-                        raise ValueError(f"Товар с Артикулом WB '{article_wb}' или Баркодом '{barcode}' не найден")
-
-                    # --- НАЧАЛО НОВОЙ ЛОГИКИ РАСЧЕТА СОГЛАСНО ФОРМУЛЕ EXCEL ---
-                    current_price_raw = row.get('Текущая цена', '0')
-                    new_price_raw = row.get('Новая цена', '')
-                    current_discount_raw = row.get('Текущая скидка', '0')
-                    new_discount_raw = row.get('Новая скидка', '')
-
-                    base_price_for_calc = float(new_price_raw or current_price_raw or 0)
-                    discount_for_calc = float(new_discount_raw or current_discount_raw or 0)
-                    
-                    if base_price_for_calc > 0 and discount_for_calc >= 0:
-                        final_price = round(base_price_for_calc * (1 - (discount_for_calc / 100)), 2)
-                    else:
-                        final_price = base_price_for_calc
-
-                    mp_data.price_before_discount = base_price_for_calc
-                    mp_data.discount_percent = discount_for_calc
-                    mp_data.current_price = final_price
-                    # --- КОНЕЦ НОВОЙ ЛОГИКИ РАСЧЕТА ---
-                    
-                    records_processed += 1
-                    records_updated += 1
-
-                except Exception as e:
-                    records_failed += 1
-                    error_details.append({
-                        'Строка в Excel': index + 2,
-                        'Артикул WB': row.get('Артикул WB', 'N/A'),
-                        'Последний баркод': row.get('Последний баркод', 'N/A'),
-                        'Причина ошибки': str(e)
-                    })
-                    continue
-            
-            self.db.commit()
+            self._report_progress('reading')
+            if parsed is None:
+                parsed = parse_wb_prices(read_wb_prices(file_path))
+            total_rows = len(parsed.data)
+            self._report_progress('writing', rows_parsed=total_rows, rows_total=total_rows)
+            data = parsed.data
 
-            error_report_filename = None
-            if error_details:
-                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                error_report_filename = f"error_report_wb_prices_{timestamp}.xlsx"
-                error_df = pd.DataFrame(error_details)
-                output_dir = "exports"
-                os.makedirs(output_dir, exist_ok=True)
-                error_df.to_excel(os.path.join(output_dir, error_report_filename), index=False)
-            
-            import_log = ImportLog(
-                source='wb_prices',
-                file_name=os.path.basename(file_path),
-                records_processed=records_processed,
-                records_added=0,
-                records_updated=records_updated,
-                records_failed=records_failed,
-                status='success' if records_failed == 0 else 'partial',
-                error_report_file=error_report_filename
+            lookup = MarketplaceLookup(self.db, 'wb')
+            candidates = data[parsed.ok]
+            matched = {}
+            for index, external_id, barcode in zip(
+                candidates.index, candidates['external_id'].tolist(), candidates['barcode'].tolist()
+            ):
+                mp_data = lookup.find_by_external_id(external_id) or lookup.find_by_barcode(barcode)
+                if mp_data:
+                    matched[index] = mp_data
+            parsed.fail(
+                ~data.index.to_series().isin(matched.keys()),
+                "Товар с Артикулом WB '" + data['external_id'] + "' или Баркодом '" + data['barcode'] + "' не найден"
             )
-            self.db.add(import_log)
-            self.db.commit()
-            
-            return import_log
+
+            price_columns = ['price_before_discount', 'discount_percent', 'current_price']
+            row_hashes = RowHashes(self.db, 'wb_prices', MarketplaceData.id)
+            for part in parsed.batches(self.commit_size, import_log.checkpoint_row):
+                valid = part.valid()
+                unchanged = 0
+                for index, base_price, discount, final_price, row_hash in zip(
+                    valid.index,
+                    valid['price_before_discount'].tolist(),
+                    valid['discount_percent'].tolist(),
+                    valid['current_price'].tolist(),
+                    hash_rows(valid, price_columns)
+                ):
+                    if not row_hashes.changed(matched[index].get('id'), row_hash):
+                        unchanged += 1
+                        continue
+                    lookup.update(
+                        matched[index],
+                        price_before_discount=base_price,
+                        discount_percent=discount,
+                        current_price=final_price
+                    )
+
+                self._commit_batch(
+                    import_log, part, {'Артикул WB': 'Артикул WB', 'Последний баркод': 'Последний баркод'},
+                    lookup, row_hashes,
+                    records_processed=len(valid),
+                    records_updated=len(valid) - unchanged,
+                    records_unchanged=unchanged
+                )
+
+            self._report_progress('finishing')
+            return self._finish_log(import_log)
             
         except Exception as e:
             # traceback.print_exc()
-            self.db.rollback()
-            total_rows = df.shape[0] if df is not None else 0
-            import_log = ImportLog(
-                source='wb_prices',
-                file_name=os.path.basename(file_path),
-                records_processed=0,
-                records_added=0,
-                records_updated=0,
-                records_failed=total_rows,
-                status='failed',
-                error_message=str(e)
-            )
-            self.db.add(import_log)
-            self.db.commit()
+            self._fail_log(import_log, e)
             raise e
     
-    def import_wb_min_prices(self, file_path: str) -> ImportLog:
-        """Imports WB minimum prices with detailed error logging"""
-        df = None
+    def import_wb_min_prices(self, file_path: str, parsed: Optional[ParsedFrame] = None) -> ImportLog:
+        """Импорт минимальных цен ВБ с детальным логированием ошибок"""
+        import_log = self._start_log('wb_min_prices', file_path)
         try:
-            df = pd.read_excel(file_path, dtype=str).fillna('')
-            df.columns = df.columns.str.strip()
-            
-            records_processed = 0
-            records_updated = 0
-            records_failed = 0
-            error_details = []
-            min_price_col = 'Текущая минимальная цена для применения скидки по автоакции'
-
-            for index, row in df.iterrows():
-                try:
-                    article_wb = str(row.get('Артикул WB', '')).strip()
-                    
-                    if not article_wb:
-                        if any(row.values):
-                           raise ValueError("Артикул WB отсутствует")
-                        else:
-                           continue
-
-                    mp_data = self.db.query(MarketplaceData).filter(
-                        MarketplaceData.marketplace == 'wb',
-                        MarketplaceData.external_id == article_wb
-                    ).first()
-                    
-                    if not mp_data:
-                        raise ValueError(f"Товар с Артикулом WB '{article_wb}' не найден в базе данных")
-                    
-                    min_price_text = str(row.get(min_price_col, '0')).strip()
-                    min_price = 0.0
-                    
-                    match = re.match(r'^\s*([\d\.]+)', min_price_text)
-                    if match:
-                        min_price = float(match.group(1))
-                        
-                    mp_data.min_price = min_price
-                    records_processed += 1
-                    records_updated += 1
-
-                except Exception as e:
-                    records_failed += 1
-                    error_details.append({
-                        'Строка в Excel': index + 2,
-                        'Артикул WB': row.get('Артикул WB', 'N/A'),
-                        'Значение в ячейке': row.get(min_price_col, 'N/A'),
-                        'Причина ошибки': str(e)
-                    })
-                    continue
-            
-            self.db.commit()
+            self._report_progress('reading')
+            if parsed is None:
+                parsed = parse_wb_min_prices(read_wb_min_prices(file_path))
+            total_rows = len(parsed.data)
+            self._report_progress('writing', rows_parsed=total_rows, rows_total=total_rows)
+            data = parsed.data
 
-            error_report_filename = None
-            if error_details:
-                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                error_report_filename = f"error_report_wb_min_prices_{timestamp}.xlsx"
-                error_df = pd.DataFrame(error_details)
-                output_dir = "exports"
-                os.makedirs(output_dir, exist_ok=True)
-                error_df.to_excel(os.path.join(output_dir, error_report_filename), index=False)
-            
-            import_log = ImportLog(
-                source='wb_min_prices',
-                file_name=os.path.basename(file_path),
-                records_processed=records_processed,
-                records_added=0,
-                records_updated=records_updated,
-                records_failed=records_failed,
-                status='success' if records_failed == 0 else 'partial',
-                error_report_file=error_report_filename
+            lookup = MarketplaceLookup(self.db, 'wb')
+            parsed.fail(
+                ~data['external_id'].map(lambda value: lookup.find_by_external_id(value) is not None),
+                "Товар с Артикулом WB '" + data['external_id'] + "' не найден в базе данных"
             )
-            self.db.add(import_log)
-            self.db.commit()
-            
-            return import_log
+
+            row_hashes = RowHashes(self.db, 'wb_min_prices', MarketplaceData.id)
+            for part in parsed.batches(self.commit_size, import_log.checkpoint_row):
+                valid = part.valid()
+                unchanged = 0
+                for external_id, min_price, row_hash in zip(
+                    valid['external_id'].tolist(),
+                    valid['min_price'].tolist(),
+                    hash_rows(valid, ['min_price'])
+                ):
+                    mp_data = lookup.find_by_external_id(external_id)
+                    if not row_hashes.changed(mp_data.get('id'), row_hash):
+                        unchanged += 1
+                        continue
+                    lookup.update(mp_data, min_price=min_price)
+
+                self._commit_batch(
+                    import_log, part, {'Артикул WB': 'Артикул WB', 'Значение в ячейке': WB_MIN_PRICE_COLUMN},
+                    lookup, row_hashes,
+                    records_processed=len(valid),
+                    records_updated=len(valid) - unchanged,
+                    records_unchanged=unchanged
+                )
+
+            self._report_progress('finishing')
+            return self._finish_log(import_log)
             
         except Exception as e:
             # traceback.print_exc()
-            self.db.rollback()
-            total_rows = df.shape[0] if df is not None else 0
-            import_log = ImportLog(
-                source='wb_min_prices',
-                file_name=os.path.basename(file_path),
-                records_processed=0,
-                records_added=0,
-                records_updated=0,
-                records_failed=total_rows,
-                status='failed',
-                error_message=str(e)
-            )
-            self.db.add(import_log)
-            self.db.commit()
+            self._fail_log(import_log, e)
             raise e
     
-    def import_ozon_barcodes(self, file_path: str) -> ImportLog:
+    def import_ozon_barcodes(self, file_path: str, parsed: Optional[ParsedFrame] = None) -> ImportLog:
         """Импорт таблицы с ШК Озон с устойчивым чтением XLSX: calamine -> безопасный парсер без стилей"""
-        df = None
+        import_log = self._start_log('ozon_barcodes', file_path)
         try:
-            # --- ГЛАВНОЕ: читаем ВТОРОЙ лист (sheet_name=1) и заголовок на второй строке (header=1) ---
-            try:
-                # 1) Пробуем через calamine (устойчиво к битым стилям, быстро, без зависимостей от openpyxl)
-                df = pd.read_excel(file_path, sheet_name=1, header=1, dtype=str, engine="calamine").fillna('')
-            except Exception:
-                # 2) Fallback: безопасный парсер без чтения styles.xml
-                df = safe_read_xlsx_sheet_as_dataframe(file_path, sheet_index=1, header_row_index=1)
-
-            # Нормализуем колонки
-            df.columns = df.columns.str.strip()
-
-            # Валидация обязательных колонок (по желанию можно убрать)
-            required_cols = {'Штрихкод', 'Артикул', 'Ozon Product ID'}
-            missing = [c for c in required_cols if c not in df.columns]
-            if missing:
-                # Не падаем насмерть — это данные от Озона периодически меняют подписи.
-                # Но сообщим через частичный статус и error_details.
-                pass
-
-            # Удаляем строки с описаниями, которые Ozon вставляет после заголовка
-            if 'Артикул' in df.columns:
-                df = df[~df['Артикул'].astype(str).str.contains('Уникальный идентификатор', na=False)]
-            df = df.reset_index(drop=True)
-
-            records_processed = 0
-            records_updated = 0
-            records_failed = 0
-            error_details = []
-
-            for index, row in df.iterrows():
-                try:
-                    barcode = str(row.get('Штрихкод', '')).strip()
-                    article = str(row.get('Артикул', '')).strip()
-                    ozon_product_id = str(row.get('Ozon Product ID', '')).strip()
-                    
-                    if not barcode and not article:
-                        if any(row.values):
-                            raise ValueError("Отсутствуют 'Штрихкод' и 'Артикул'")
-                        else:
-                            continue
+            self._report_progress('reading')
+            if parsed is None:
+                parsed = parse_ozon_barcodes(read_ozon_barcodes(file_path))
+            total_rows = len(parsed.data)
+            self._report_progress('writing', rows_parsed=total_rows, rows_total=total_rows)
+            data = parsed.data
 
-                    product = self.db.query(Product).filter(Product.barcode == barcode).first()
-                    
-                    # Если товар не найден в нашей базе, пропускаем его (тихая обработка)
-                    if not product:
-                        continue
-                    
-                    mp_data = self.db.query(MarketplaceData).filter(
-                        MarketplaceData.barcode == barcode,
-                        MarketplaceData.marketplace == 'ozon'
-                    ).first()
-                    
-                    sku = article
-                    
+            lookup = MarketplaceLookup(self.db, 'ozon')
+            lookup.load_products(data.loc[parsed.ok, 'barcode'])
+            # Если товар не найден в нашей базе, пропускаем его (тихая обработка)
+            parsed.skip(~data['barcode'].isin(lookup.product_barcodes))
+
+            row_hashes = RowHashes(self.db, 'ozon_barcodes', MarketplaceData.id)
+            for part in parsed.batches(self.commit_size, import_log.checkpoint_row):
+                records = part.records()
+                hashes = hash_rows(part.valid(), ['article', 'external_id'])
+                unchanged = 0
+                for record, row_hash in zip(records, hashes):
+                    mp_data = lookup.find_by_barcode(record['barcode'])
+                    sku = record['article']
                     if mp_data:
-                        mp_data.article = article
-                        mp_data.sku = sku
-                        mp_data.external_id = ozon_product_id
+                        if not row_hashes.changed(mp_data.get('id'), row_hash):
+                            unchanged += 1
+                            continue
+                        lookup.update(mp_data, article=record['article'], sku=sku, external_id=record['external_id'])
                     else:
-                        mp_data = MarketplaceData(
-                            barcode=barcode,
-                            marketplace='ozon',
-                            article=article,
-                            sku=sku,
-                            external_id=ozon_product_id
-                        )
-                        self.db.add(mp_data)
-                    
-                    records_processed += 1
-                    records_updated += 1
-                    
-                except Exception as e:
-                    records_failed += 1
-                    error_details.append({
-                        'Строка в Excel': index + 5,  # +5: шапка/служебные строки у отчёта Озона
-                        'Штрихкод': row.get('Штрихкод', 'N/A'),
-                        'Артикул': row.get('Артикул', 'N/A'),
-                        'Причина ошибки': str(e)
-                    })
-                    continue
-            
-            self.db.commit()
+                        lookup.add(record['barcode'], article=record['article'], sku=sku, external_id=record['external_id'])
 
-            error_report_filename = None
-            if error_details:
-                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                error_report_filename = f"error_report_ozon_barcodes_{timestamp}.xlsx"
-                error_df = pd.DataFrame(error_details)
-                output_dir = "exports"
-                os.makedirs(output_dir, exist_ok=True)
-                error_df.to_excel(os.path.join(output_dir, error_report_filename), index=False)
-            
-            import_log = ImportLog(
-                source='ozon_barcodes',
-                file_name=os.path.basename(file_path),
-                records_processed=records_processed,
-                records_added=0,
-                records_updated=records_updated,
-                records_failed=records_failed,
-                status='success' if records_failed == 0 else 'partial',
-                error_report_file=error_report_filename
-            )
-            self.db.add(import_log)
-            self.db.commit()
-            
-            return import_log
+                self._commit_batch(
+                    import_log, part, {'Штрихкод': 'Штрихкод', 'Артикул': 'Артикул'},
+                    lookup, row_hashes,
+                    records_processed=len(records),
+                    records_updated=len(records) - unchanged,
+                    records_unchanged=unchanged
+                )
+
+            self._report_progress('finishing')
+            return self._finish_log(import_log)
             
         except Exception as e:
             # traceback.print_exc()
-            self.db.rollback()
-            total_rows = df.shape[0] if df is not None else 0
-            import_log = ImportLog(
-                source='ozon_barcodes',
-                file_name=os.path.basename(file_path),
-                records_processed=0,
-                records_added=0,
-                records_updated=0,
-                records_failed=total_rows,
-                status='failed',
-                error_message=str(e)
-            )
-            self.db.add(import_log)
-            self.db.commit()
+            self._fail_log(import_log, e)
             raise e
     
-    def import_ozon_prices(self, file_path: str) -> ImportLog:
+    def import_ozon_prices(self, file_path: str, parsed: Optional[ParsedFrame] = None) -> ImportLog:
         """Импорт цен Ozon из шаблона XLSX (игнорирует строки 'Нередактируемое' и т.п.)"""
-        def _to_float(x):
-            if x is None:
-                return None
-            s = str(x).strip()
-            if not s:
-                return None
-            s = s.replace(" ", "").replace("\u00A0", "").replace(",", ".")
-            import re
-            m = re.match(r"^[+-]?\d+(?:\.\d+)?", s)
-            if not m:
-                return None
-            try:
-                return float(m.group(0))
-            except Exception:
-                return None
-
-        df = None
+        import_log = self._start_log('ozon_prices', file_path)
         try:
             # --- Чтение таблицы устойчивым способом ---
-            try:
-                df = pd.read_excel(file_path, sheet_name=0, header=1, dtype=str, engine="calamine").fillna('')
-            except Exception:
-                df = safe_read_xlsx_sheet_as_dataframe(file_path, sheet_index=0, header_row_index=1)
-
-            df.columns = df.columns.str.strip()
-
-            # Определяем колонки (из шаблона)
-            col_barcode = 'Штрихкод'
-            col_before  = 'Цена до скидки, руб.'
-            col_curr    = 'Текущая цена (со скидкой), руб.'
-            col_disc    = 'Скидка, %'
-            col_min     = 'Минимальная цена, руб.'
-
-            # --- Убираем служебные строки и описания ---
-            bad_values = ['Нередактируемое', 'Редактируемое', 'Основные характеристики товара']
-            df = df[~df.apply(lambda r: any(str(v).strip() in bad_values for v in r.values), axis=1)]
-            df = df[~df.astype(str).apply(lambda r: ''.join(r.values).strip() == '', axis=1)]
-            df = df.reset_index(drop=True)
-
-            records_processed = 0
-            records_updated = 0
-            records_failed = 0
-            error_details = []
-
-            for index, row in df.iterrows():
-                try:
-                    barcode = str(row.get(col_barcode, '')).strip()
-                    if not barcode:
-                        if any(str(v).strip() for v in row.values):
-                            raise ValueError("Отсутствует 'Штрихкод'")
-                        else:
-                            continue
+            self._report_progress('reading')
+            if parsed is None:
+                parsed = parse_ozon_prices(read_ozon_prices(file_path))
+            total_rows = len(parsed.data)
+            self._report_progress('writing', rows_parsed=total_rows, rows_total=total_rows)
+            data = parsed.data
 
-                    mp_data = self.db.query(MarketplaceData).filter(
-                        MarketplaceData.barcode == barcode,
-                        MarketplaceData.marketplace == 'ozon'
-                    ).first()
-
-                    if not mp_data:
-                        raise ValueError(f"Товар с ШК {barcode} (marketplace=ozon) не найден")
-
-                    price_before = _to_float(row.get(col_before, ''))
-                    current_price = _to_float(row.get(col_curr, ''))
-                    discount_percent = _to_float(row.get(col_disc, ''))
-                    new_min_price = _to_float(row.get(col_min, ''))
-
-                    # --- Пересчёт скидки, если отсутствует ---
-                    if discount_percent is None and price_before not in (None, 0) and current_price not in (None, 0):
-                        try:
-                            discount_percent = round((1 - (current_price / price_before)) * 100, 2)
-                        except Exception:
-                            pass
-
-                    changed = False
-
-                    if price_before is not None:
-                        mp_data.price_before_discount = price_before
-                        changed = True
-
-                    if current_price is not None:
-                        mp_data.current_price = current_price
-                        changed = True
-
-                    if discount_percent is not None:
-                        mp_data.discount_percent = discount_percent
-                        changed = True
-
-                    if new_min_price is not None:
-                        mp_data.min_price = new_min_price
-                        changed = True
-
-                    records_processed += 1
-                    if changed:
-                        records_updated += 1
-
-                except Exception as e:
-                    records_failed += 1
-                    error_details.append({
-                        'Строка в Excel': index + 2,
-                        'Штрихкод': row.get(col_barcode, 'N/A'),
-                        'Причина ошибки': str(e)
-                    })
-                    continue
+            lookup = MarketplaceLookup(self.db, 'ozon')
+            parsed.fail(
+                ~data['barcode'].map(lambda value: lookup.find_by_barcode(value) is not None),
+                "Товар с ШК " + data['barcode'] + " (marketplace=ozon) не найден"
+            )
 
-            self.db.commit()
+            row_hashes = RowHashes(self.db, 'ozon_prices', MarketplaceData.id)
+            for part in parsed.batches(self.commit_size, import_log.checkpoint_row):
+                records = part.records()
+                valid = part.valid()
+                updated = 0
+                unchanged = 0
+                for record, row_hash in zip(records, hash_rows(valid, [c for c in valid.columns if c != 'barcode'])):
+                    mp_data = lookup.find_by_barcode(record['barcode'])
+                    if not row_hashes.changed(mp_data.get('id'), row_hash):
+                        unchanged += 1
+                        continue
+                    fields = {k: v for k, v in record.items() if k != 'barcode' and v is not None}
+                    if fields:
+                        lookup.update(mp_data, **fields)
+                        updated += 1
 
-            error_report_filename = None
-            if error_details:
-                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                error_report_filename = f"error_report_ozon_prices_{timestamp}.xlsx"
-                error_df = pd.DataFrame(error_details)
-                output_dir = "exports"
-                os.makedirs(output_dir, exist_ok=True)
-                error_df.to_excel(os.path.join(output_dir, error_report_filename), index=False)
+                self._commit_batch(
+                    import_log, part, {'Штрихкод': 'Штрихкод'},
+                    lookup, row_hashes,
+                    records_processed=len(records),
+                    records_updated=updated,
+                    records_unchanged=unchanged
+                )
 
-            import_log = ImportLog(
-                source='ozon_prices',
-                file_name=os.path.basename(file_path),
-                records_processed=records_processed,
-                records_added=0,
-                records_updated=records_updated,
-                records_failed=records_failed,
-                status='success' if records_failed == 0 else 'partial',
-                error_report_file=error_report_filename
+            self._report_progress('finishing')
+            return self._finish_log(import_log)
+
+        except Exception as e:
+            self._fail_log(import_log, e)
+            raise
+
+    def import_wb_sales(self, file_path: str, parsed: Optional[ParsedFrame] = None) -> ImportLog:
+        """Импорт отчета о продажах WB по дням в историю продаж"""
+        return self._import_sales('wb_sales', 'wb', file_path, parsed)
+
+    def import_ozon_sales(self, file_path: str, parsed: Optional[ParsedFrame] = None) -> ImportLog:
+        """Импорт отчета о продажах Ozon по дням в историю продаж"""
+        return self._import_sales('ozon_sales', 'ozon', file_path, parsed)
+
+    def _import_sales(
+        self, source: str, marketplace: str, file_path: str, parsed: Optional[ParsedFrame]
+    ) -> ImportLog:
+        """
+        Строки отчета складываются по (штрихкод, дата) и пишутся в sales_history через bulk_upsert:
+        повторная загрузка того же дня заменяет его значения.
+        records_processed — строки файла, records_added/records_updated — дни товаров
+        """
+        import_log = self._start_log(source, file_path)
+        try:
+            self._report_progress('reading')
+            if parsed is None:
+                parsed = parse_import_file(source, file_path)
+            total_rows = len(parsed.data)
+            self._report_progress('writing', rows_parsed=total_rows, rows_total=total_rows)
+            data = parsed.data
+
+            lookup = MarketplaceLookup(self.db, marketplace)
+            lookup.load_products(data.loc[parsed.ok, 'barcode'])
+            parsed.fail(
+                ~data['barcode'].isin(lookup.product_barcodes),
+                "Товар со штрихкодом " + data['barcode'] + " не найден в базе данных"
             )
-            self.db.add(import_log)
-            self.db.commit()
 
-            return import_log
+            days = aggregate_sales(parsed).assign(marketplace=marketplace)
+            days = days.astype(object).where(days.notna(), None)
+            columns = ['barcode', 'sale_date', 'marketplace', 'quantity', 'revenue', 'stock']
+            # В отчете ошибок — те колонки даты и штрихкода, что есть в файле
+            report_columns = {
+                label: next((c for c in names if c in parsed.raw.columns), names[0])
+                for label, names in (('Штрихкод', SALES_BARCODE_COLUMNS), ('Дата', SALES_DATE_COLUMNS))
+            }
+
+            for part in parsed.batches(self.commit_size, import_log.checkpoint_row):
+                rows = days.loc[days['source_row'].isin(part.source_rows), columns].to_dict('records')
+                if self.dry_run:
+                    added, updated = len(rows), 0
+                else:
+                    ensure_month_partitions(self.db, SalesHistory.__table__, {row['sale_date'] for row in rows})
+                    added, updated = bulk_upsert(self.db, SalesHistory, rows)
+
+                self._commit_batch(
+                    import_log, part, report_columns,
+                    records_processed=int(part.ok.sum()),
+                    records_added=added,
+                    records_updated=updated
+                )
+
+            self._report_progress('finishing')
+            return self._finish_log(import_log)
 
         except Exception as e:
-            self.db.rollback()
-            total_rows = df.shape[0] if df is not None else 0
-            import_log = ImportLog(
-                source='ozon_prices',
-                file_name=os.path.basename(file_path),
-                records_processed=0,
-                records_added=0,
-                records_updated=0,
-                records_failed=total_rows,
-                status='failed',
-                error_message=str(e)
-            )
-            self.db.add(import_log)
-            self.db.commit()
+            self._fail_log(import_log, e)
             raise
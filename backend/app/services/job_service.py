@@ -0,0 +1,144 @@
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy.orm import Session
+from app.database import SessionLocal
+from app.models.product import ImportJob, ImportLog
+from app.services.import_service import ImportService, IMPORT_SOURCES
+from typing import Any, Dict, Optional
+from datetime import datetime, timezone
+import os
+import time
+import uuid
+
+# Пул потоков для импортов: тяжелый разбор и запись идут вне event loop
+IMPORT_WORKERS = int(os.getenv("IMPORT_WORKERS", "2"))
+_executor = ThreadPoolExecutor(max_workers=IMPORT_WORKERS, thread_name_prefix="import-job")
+
+# Не чаще одного обновления прогресса в секунду (смена стадии пишется сразу)
+PROGRESS_INTERVAL = 1.0
+
+
+class JobProgress:
+    """Пишет ход импорта в import_jobs отдельной сессией, независимо от транзакции импорта"""
+
+    def __init__(self, job_id: str):
+        self.job_id = job_id
+        self.stage = None
+        self.counters = {}
+        self._last_write = 0.0
+
+    def __call__(self, stage: str, **counters):
+        self.counters.update({k: v for k, v in counters.items() if v is not None or k == 'rows_total'})
+        if stage == self.stage and time.monotonic() - self._last_write < PROGRESS_INTERVAL:
+            return
+        self.stage = stage
+        self._write(stage=stage, **self.counters)
+
+    def _write(self, **fields):
+        db = SessionLocal()
+        try:
+            db.query(ImportJob).filter(ImportJob.id == self.job_id).update(fields)
+            db.commit()
+        finally:
+            db.close()
+        self._last_write = time.monotonic()
+
+
+class JobService:
+    def __init__(self, db: Session):
+        self.db = db
+
+    def submit(
+        self,
+        source: str,
+        file_path: str,
+        options: Optional[Dict[str, Any]] = None,
+        file_hash: Optional[str] = None,
+        resume_log_id: Optional[int] = None
+    ) -> ImportJob:
+        """
+        Ставит импорт в очередь пула и сразу возвращает задание.
+        resume_log_id — продолжить прерванный импорт с его checkpoint_row
+        """
+        if source not in IMPORT_SOURCES:
+            raise ValueError(f"Неизвестный источник импорта: {source}")
+
+        job = ImportJob(
+            id=uuid.uuid4().hex,
+            source=source,
+            file_name=os.path.basename(file_path),
+            options=options or {},
+            status='queued',
+            rows_parsed=0,
+            rows_written=0
+        )
+        self.db.add(job)
+        self.db.commit()
+        self.db.refresh(job)
+
+        _executor.submit(run_import_job, job.id, source, file_path, options or {}, file_hash, resume_log_id)
+        return job
+
+    def record_duplicate(self, source: str, file_name: str, import_log: ImportLog) -> ImportJob:
+        """Завершенное задание для повторной загрузки уже импортированного файла — без повторного импорта"""
+        now = datetime.now(timezone.utc)
+        job = ImportJob(
+            id=uuid.uuid4().hex,
+            source=source,
+            file_name=file_name,
+            options={},
+            status=import_log.status,
+            stage='duplicate',
+            rows_total=import_log.records_processed,
+            rows_parsed=import_log.records_processed,
+            rows_written=import_log.records_processed,
+            import_log_id=import_log.id,
+            started_at=now,
+            finished_at=now
+        )
+        self.db.add(job)
+        self.db.commit()
+        self.db.refresh(job)
+        return job
+
+    def get(self, job_id: str) -> Optional[ImportJob]:
+        return self.db.query(ImportJob).filter(ImportJob.id == job_id).first()
+
+    def list(self, limit: int = 50):
+        return self.db.query(ImportJob).order_by(ImportJob.created_at.desc()).limit(limit).all()
+
+
+def run_import_job(
+    job_id: str,
+    source: str,
+    file_path: str,
+    options: Dict[str, Any],
+    file_hash: Optional[str] = None,
+    resume_log_id: Optional[int] = None
+):
+    """Выполняет импорт в рабочем потоке со своей сессией БД"""
+    progress = JobProgress(job_id)
+    progress._write(status='running', started_at=datetime.now(timezone.utc))
+
+    db = SessionLocal()
+    resume = db.query(ImportLog).filter(ImportLog.id == resume_log_id).first() if resume_log_id else None
+    import_service = ImportService(db, progress=progress, file_hash=file_hash, resume=resume)
+    try:
+        import_log = getattr(import_service, IMPORT_SOURCES[source])(file_path, **options)
+        progress._write(
+            status=import_log.status,
+            stage='done',
+            import_log_id=import_log.id,
+            rows_written=import_log.records_processed,
+            finished_at=datetime.now(timezone.utc)
+        )
+    except Exception as e:
+        # ImportService уже записал ImportLog со статусом 'failed' (и checkpoint_row) — связываем его с заданием
+        failed_log = import_service.last_log
+        progress._write(
+            status='failed',
+            error_message=str(e),
+            import_log_id=failed_log.id if failed_log is not None else None,
+            finished_at=datetime.now(timezone.utc)
+        )
+    finally:
+        db.close()
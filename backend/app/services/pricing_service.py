@@ -0,0 +1,228 @@
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from app.models.product import Product, MarketplaceData, CalculatedData
+from typing import Any, Dict, List, Optional
+import numpy as np
+import pandas as pd
+import os
+import threading
+import time
+
+# Сколько секунд симуляции переиспользуют загруженные цены (refresh=true — загрузить заново)
+PRICING_CACHE_SECONDS = float(os.getenv("PRICING_CACHE_SECONDS", "60"))
+
+# Поля фильтров правил: колонки со словарным кодированием
+RULE_FILTERS = ('marketplace', 'brand', 'product_category', 'product_type', 'abc_category')
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+class PricingFrame:
+    """
+    Цены каталога в массивах NumPy: строка — запись marketplace_data, отсортированы по штрихкоду
+    (товар — непрерывный отрезок). Строковые поля фильтров закодированы словарем
+    """
+
+    def __init__(self, df: pd.DataFrame, load_seconds: float):
+        self.loaded_at = time.monotonic()
+        self.load_seconds = load_seconds
+        self.barcode = df['barcode'].to_numpy()
+        self.price_before_discount = df['price_before_discount'].to_numpy(dtype=float, na_value=np.nan)
+        self.current_price = df['current_price'].to_numpy(dtype=float, na_value=np.nan)
+        self.min_price = df['min_price'].to_numpy(dtype=float, na_value=np.nan)
+        self.codes = {}
+        self.values = {}
+        for column in RULE_FILTERS:
+            codes, uniques = pd.factorize(df[column])
+            self.codes[column] = codes
+            self.values[column] = {value: code for code, value in enumerate(uniques)}
+
+        # Начала отрезков товаров и поля товара (по первой строке отрезка)
+        if len(df):
+            self.starts = np.flatnonzero(np.r_[True, self.barcode[1:] != self.barcode[:-1]])
+        else:
+            self.starts = np.array([], dtype=np.intp)
+        first = df.iloc[self.starts]
+        self.sku_barcode = first['barcode'].to_numpy()
+        self.sku_brand = first['brand'].to_numpy()
+        self.sku_category = first['product_category'].to_numpy()
+        self.purchase_price = first['purchase_price'].to_numpy(dtype=float, na_value=np.nan)
+        self.stock_total = first['stock_total'].fillna(0).to_numpy(dtype=float)
+
+    @classmethod
+    def load(cls, db: Session) -> 'PricingFrame':
+        """Один запрос по marketplace_data с полями товара"""
+        started = time.perf_counter()
+        query = select(
+            MarketplaceData.barcode,
+            MarketplaceData.marketplace,
+            MarketplaceData.price_before_discount,
+            MarketplaceData.current_price,
+            MarketplaceData.min_price,
+            Product.brand,
+            Product.product_category,
+            Product.product_type,
+            Product.purchase_price,
+            Product.stock_total,
+            CalculatedData.abc_category
+        ).join(
+            Product, Product.barcode == MarketplaceData.barcode
+        ).outerjoin(
+            CalculatedData, CalculatedData.barcode == MarketplaceData.barcode
+        ).order_by(MarketplaceData.barcode)
+        # Через соединение, без ORM-обработки строк результата (в разы быстрее на всем каталоге)
+        df = pd.DataFrame(db.connection().execute(query).all(), columns=[
+            'barcode', 'marketplace', 'price_before_discount', 'current_price', 'min_price',
+            'brand', 'product_category', 'product_type', 'purchase_price', 'stock_total', 'abc_category'
+        ])
+        return cls(df, time.perf_counter() - started)
+
+    def mask(self, rule: Dict[str, Any]) -> np.ndarray:
+        """Строки, попадающие под фильтры правила"""
+        mask = np.ones(len(self.barcode), dtype=bool)
+        for column in RULE_FILTERS:
+            value = rule.get(column)
+            if value is None:
+                continue
+            code = self.values[column].get(value)
+            if code is None:
+                return np.zeros(len(self.barcode), dtype=bool)
+            mask &= self.codes[column] == code
+        if rule.get('barcodes') is not None:
+            mask &= np.isin(self.barcode, rule['barcodes'])
+        return mask
+
+    def sku_margins(self, prices: np.ndarray):
+        """
+        Наценка товара как в CalculationService: максимальная цена > 0 среди маркетплейсов
+        против закупочной. NaN — наценка не считается (нет цен или закупочной цены)
+        """
+        positive = np.where(prices > 0, prices, np.nan)
+        if len(positive):
+            with np.errstate(all='ignore'):
+                max_price = np.fmax.reduceat(positive, self.starts)
+        else:
+            max_price = np.array([], dtype=float)
+        purchase = np.where(self.purchase_price != 0, self.purchase_price, np.nan)
+        margin = max_price - purchase
+        with np.errstate(all='ignore'):
+            margin_percent = np.where(purchase > 0, margin / purchase * 100, np.where(np.isnan(margin), np.nan, 0.0))
+        return max_price, margin, margin_percent
+
+
+def get_pricing_frame(db: Session, refresh: bool = False) -> PricingFrame:
+    """Загруженные цены; перечитываются раз в PRICING_CACHE_SECONDS или по refresh"""
+    global _cache
+    with _cache_lock:
+        if refresh or _cache is None or time.monotonic() - _cache.loaded_at > PRICING_CACHE_SECONDS:
+            _cache = PricingFrame.load(db)
+        return _cache
+
+
+def _round(values: np.ndarray) -> List[Optional[float]]:
+    return [None if np.isnan(value) else round(float(value), 2) for value in values]
+
+
+def _mean(values: np.ndarray) -> Optional[float]:
+    values = values[~np.isnan(values)]
+    return round(float(values.mean()), 2) if len(values) else None
+
+
+class PricingSimulator:
+    """
+    Что будет, если поменять цены: правила применяются к массивам цен,
+    результат — сводка и изменившиеся товары. В базу ничего не пишется
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def simulate(self, rules: List[Dict[str, Any]], limit: int = 100, refresh: bool = False) -> Dict[str, Any]:
+        """
+        rules — по порядку, каждое: фильтры (RULE_FILTERS, barcodes) и ровно одно изменение:
+        discount_percent — цена = цена до скидки * (1 - X/100) (строки без цены до скидки не меняются;
+        заменяет цену, полученную предыдущими правилами),
+        price_change_percent — цена = цена после предыдущих правил * (1 + X/100) (изменения складываются:
+        +10% и затем -10% дают 99% исходной цены)
+        """
+        for rule in rules:
+            actions = [rule.get('discount_percent'), rule.get('price_change_percent')]
+            if sum(action is not None for action in actions) != 1:
+                raise ValueError("Правило: нужно ровно одно из discount_percent, price_change_percent")
+
+        frame = get_pricing_frame(self.db, refresh=refresh)
+        started = time.perf_counter()
+
+        before = frame.current_price
+        after = before.copy()
+        for rule in rules:
+            mask = frame.mask(rule)
+            if rule.get('discount_percent') is not None:
+                mask &= ~np.isnan(frame.price_before_discount)
+                after[mask] = np.round(frame.price_before_discount[mask] * (1 - rule['discount_percent'] / 100), 2)
+            else:
+                after[mask] = np.round(after[mask] * (1 + rule['price_change_percent'] / 100), 2)
+
+        changed_rows = ~np.isclose(after, before, equal_nan=True)
+        below_before = before < frame.min_price
+        below_after = after < frame.min_price
+
+        price_before, margin_before, percent_before = frame.sku_margins(before)
+        price_after, margin_after, percent_after = frame.sku_margins(after)
+        if len(frame.starts):
+            sku_changed = np.logical_or.reduceat(changed_rows, frame.starts)
+            sku_below = np.logical_or.reduceat(below_after, frame.starts)
+            sku_below_before = np.logical_or.reduceat(below_before, frame.starts)
+        else:
+            sku_changed = sku_below = sku_below_before = np.array([], dtype=bool)
+
+        summary = {
+            'rows_total': int(len(before)),
+            'rows_changed': int(changed_rows.sum()),
+            'skus_total': int(len(frame.starts)),
+            'skus_changed': int(sku_changed.sum()),
+            'below_min_price_before': int(sku_below_before.sum()),
+            'below_min_price_after': int(sku_below.sum()),
+            'negative_margin_before': int((margin_before < 0).sum()),
+            'negative_margin_after': int((margin_after < 0).sum()),
+            'avg_margin_percent_before': _mean(percent_before),
+            'avg_margin_percent_after': _mean(percent_after),
+            # Наценка на весь остаток: сумма наценки товара * остаток
+            'stock_margin_before': round(float(np.nansum(margin_before * frame.stock_total)), 2),
+            'stock_margin_after': round(float(np.nansum(margin_after * frame.stock_total)), 2),
+        }
+
+        # Изменившиеся товары: сначала ушедшие ниже минимальной цены, затем по падению наценки
+        changed = np.flatnonzero(sku_changed)
+        delta = np.nan_to_num(percent_after[changed] - percent_before[changed], nan=0.0)
+        order = changed[np.lexsort((delta, ~sku_below[changed]))][:limit]
+        items = [
+            {
+                'barcode': barcode,
+                'brand': brand,
+                'product_category': category,
+                'price_before': price_b,
+                'price_after': price_a,
+                'margin_before': margin_b,
+                'margin_after': margin_a,
+                'margin_percent_before': percent_b,
+                'margin_percent_after': percent_a,
+                'below_min_price': bool(below)
+            }
+            for barcode, brand, category, price_b, price_a, margin_b, margin_a, percent_b, percent_a, below in zip(
+                frame.sku_barcode[order], frame.sku_brand[order], frame.sku_category[order],
+                _round(price_before[order]), _round(price_after[order]),
+                _round(margin_before[order]), _round(margin_after[order]),
+                _round(percent_before[order]), _round(percent_after[order]),
+                sku_below[order]
+            )
+        ]
+
+        return {
+            'summary': summary,
+            'items': items,
+            'load_seconds': round(frame.load_seconds, 3),
+            'simulate_seconds': round(time.perf_counter() - started, 3),
+            'prices_age_seconds': round(time.monotonic() - frame.loaded_at, 1)
+        }
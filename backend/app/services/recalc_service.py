@@ -0,0 +1,89 @@
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from app.database import SessionLocal
+from app.models.product import DirtyBarcode
+from app.services.calculation_service import CalculationService
+from app.utils.bulk import bulk_upsert
+from typing import Iterable, Optional
+from datetime import datetime, timezone
+import os
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Как часто фоновый пересчет проверяет отмеченные товары (секунды) и сколько берет за транзакцию
+RECALC_INTERVAL = float(os.getenv("RECALC_INTERVAL", "2"))
+RECALC_BATCH = int(os.getenv("RECALC_BATCH", "5000"))
+# Наибольшая пауза между попытками при повторяющихся ошибках пересчета (секунды)
+RECALC_MAX_BACKOFF = float(os.getenv("RECALC_MAX_BACKOFF", "60"))
+
+
+def mark_dirty(db: Session, barcodes: Iterable[str]):
+    """
+    Отмечает товары для фонового пересчета расчетных полей.
+    Пишется в транзакции вызывающего кода и фиксируется вместе с изменением
+    """
+    marked_at = datetime.now(timezone.utc)
+    rows = [{'barcode': barcode, 'marked_at': marked_at} for barcode in dict.fromkeys(barcodes) if barcode]
+    bulk_upsert(db, DirtyBarcode, rows)
+
+
+def dirty_count(db: Session) -> int:
+    return db.query(func.count(DirtyBarcode.barcode)).scalar()
+
+
+def process_dirty(db: Session, batch_size: int = RECALC_BATCH) -> int:
+    """Пересчитывает отмеченные товары пачками, пока они есть; возвращает число товаров"""
+    calc_service = CalculationService(db)
+    processed = 0
+    while True:
+        count = calc_service.recalculate_dirty(batch_size)
+        processed += count
+        if count < batch_size:
+            return processed
+
+
+class DirtyRecalculator:
+    """
+    Фоновый поток пересчета: раз в interval секунд обрабатывает dirty_barcodes
+    своей сессией БД, так что наценка обновляется через секунды после импорта
+    без полного пересчета каталога
+    """
+
+    def __init__(self, interval: float = RECALC_INTERVAL, batch_size: int = RECALC_BATCH):
+        self.interval = interval
+        self.batch_size = batch_size
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="dirty-recalc", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self):
+        delay = self.interval
+        while not self._stop.wait(delay):
+            db = SessionLocal()
+            try:
+                process_dirty(db, self.batch_size)
+                delay = self.interval
+            except Exception:
+                # Отметки остаются — пачка будет пересчитана на следующем проходе.
+                # Пока ошибка повторяется (например, БД недоступна), пауза удваивается до RECALC_MAX_BACKOFF
+                db.rollback()
+                delay = min(delay * 2, RECALC_MAX_BACKOFF)
+                logger.exception("Ошибка фонового пересчета, повтор через %.0f с", delay)
+            finally:
+                db.close()
+
+
+recalculator = DirtyRecalculator()
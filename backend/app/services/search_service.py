@@ -0,0 +1,88 @@
+from sqlalchemy import Numeric, select, or_, case, cast, func
+from sqlalchemy.orm import Session
+from app.models.product import Product, pg_trgm_installed
+from typing import Any, Optional, Tuple
+import re
+
+SEARCH_MODES = ('substring', 'similarity')
+
+# Похоже на штрихкод или артикул: одно «слово» с цифрами (буквы, цифры, - . /)
+CODE_PATTERN = re.compile(r'^[\w\-./]*\d[\w\-./]*$')
+
+# Экранирующий символ LIKE: не обратная косая черта — ее запись в литерале зависит от настроек СУБД
+LIKE_ESCAPE = '!'
+
+# Установлено ли pg_trgm: проверяется один раз на процесс (расширение ставит upgrade_schema при старте)
+_pg_trgm = None
+
+
+def looks_like_code(term: str) -> bool:
+    return len(term) >= 4 and CODE_PATTERN.match(term) is not None
+
+
+def _like_escape(term: str) -> str:
+    """Символы шаблона LIKE в строке поиска ищутся как есть"""
+    return term.replace('!', '!!').replace('%', '!%').replace('_', '!_')
+
+
+class ProductSearch:
+    """
+    Условия поиска товаров по названию, штрихкоду и артикулу 1С.
+    PostgreSQL: ILIKE по подстроке и похожесть (pg_trgm) идут по триграммным GIN-индексам;
+    без pg_trgm поиск по похожести заменяется подстрокой.
+    Другие СУБД: ILIKE без индекса, ранжирование — совпадение с начала строки выше
+    """
+
+    def __init__(self, db: Session):
+        global _pg_trgm
+        self.db = db
+        self.postgresql = db.get_bind().dialect.name == 'postgresql'
+        if self.postgresql and _pg_trgm is None:
+            _pg_trgm = pg_trgm_installed(db)
+        self.trigram = self.postgresql and _pg_trgm
+
+    def exact(self, term: str) -> Optional[Any]:
+        """
+        Быстрый путь: строка — штрихкод или артикул 1С целиком. Проверяется одним
+        запросом по B-tree индексам; условие возвращается, только если совпадение есть
+        """
+        if not looks_like_code(term):
+            return None
+        condition = or_(Product.barcode == term, Product.article_1c == term)
+        if self.db.execute(select(Product.barcode).where(condition).limit(1)).first() is None:
+            return None
+        return condition
+
+    def build(self, search: str, mode: str = 'substring') -> Tuple[Any, Optional[Any], str]:
+        """
+        (условие, выражение ранга или None, примененный режим: 'exact', 'substring', 'similarity').
+        similarity — подстрока или похожая строка (опечатки), ранг — наибольшая похожесть по полям
+        """
+        if mode not in SEARCH_MODES:
+            raise ValueError(f"Режим поиска: один из {', '.join(SEARCH_MODES)}")
+        term = search.strip()
+        exact = self.exact(term)
+        if exact is not None:
+            return exact, None, 'exact'
+
+        columns = (Product.name, Product.barcode, Product.article_1c)
+        pattern = f"%{_like_escape(term)}%"
+        condition = or_(*[column.ilike(pattern, escape=LIKE_ESCAPE) for column in columns])
+        if mode == 'substring' or (self.postgresql and not self.trigram):
+            return condition, None, 'substring'
+
+        if self.postgresql:
+            condition = or_(condition, *[column.op('%')(term) for column in columns])
+            # similarity — float4: ранг фиксированной точности, чтобы значение из курсора
+            # совпадало с пересчитанным в запросе (порядок и курсор — по одному выражению)
+            rank = cast(
+                func.greatest(*[func.similarity(column, term) for column in columns]),
+                Numeric(5, 4, asdecimal=False)
+            )
+        else:
+            prefix = f"{_like_escape(term)}%"
+            rank = case(
+                (or_(*[column.ilike(prefix, escape=LIKE_ESCAPE) for column in columns]), 1.0),
+                else_=0.0
+            )
+        return condition, rank, mode
@@ -0,0 +1,116 @@
+from concurrent.futures import ProcessPoolExecutor
+from sqlalchemy import select, func
+from sqlalchemy.orm import Session
+from app.database import SessionLocal
+from app.models.product import Product
+from app.services.calculation_service import CalculationService
+from app.services.snapshot_service import catalog_snapshot
+from typing import Any, Dict, List, Optional, Tuple
+import multiprocessing
+import os
+import threading
+import time
+
+# Процессов для параллельного пересчета: расчеты по товарам упираются в CPU (pandas/numpy, разбор строк)
+RECALC_WORKERS = int(os.getenv("RECALC_WORKERS", str(os.cpu_count() or 1)))
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    """Пул процессов создается один раз; spawn — родитель многопоточный (uvicorn, фоновые потоки)"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=RECALC_WORKERS,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return _pool
+
+
+def shard_ranges(db: Session, shards: int) -> List[Tuple[Optional[str], Optional[str]]]:
+    """
+    Делит каталог на shards диапазонов штрихкодов [от, до) с примерно равным числом товаров.
+    Границы — первые штрихкоды групп ntile за один проход по индексу первичного ключа
+    (без OFFSET на каждую границу); крайние диапазоны открыты
+    """
+    tiles = select(
+        Product.barcode,
+        func.ntile(shards).over(order_by=Product.barcode).label('tile')
+    ).subquery()
+    bounds = db.execute(
+        select(func.min(tiles.c.barcode)).group_by(tiles.c.tile).order_by(tiles.c.tile)
+    ).scalars().all()[1:]
+    edges = [None] + bounds + [None]
+    return list(zip(edges[:-1], edges[1:]))
+
+
+def recalculate_shard(shard: Tuple[Optional[str], Optional[str]]) -> Dict[str, Any]:
+    """
+    Пересчет поштучных полей (наценка, оборачиваемость и XYZ, остатки) для диапазона штрихкодов.
+    Выполняется в процессе пула со своим подключением к БД; каждая часть пишется и фиксируется отдельно
+    """
+    db = SessionLocal()
+    try:
+        calc_service = CalculationService(db, shard=shard)
+        result = {'shard': list(shard), 'pid': os.getpid(), 'seconds': {}}
+        for name, calculate in (
+            ('margins', calc_service.calculate_all_margins),
+            ('sales_metrics', calc_service.calculate_sales_metrics),
+            ('stock_metrics', calc_service.calculate_stock_metrics),
+        ):
+            started = time.perf_counter()
+            result[name] = calculate()
+            result['seconds'][name] = round(time.perf_counter() - started, 3)
+        result['seconds']['total'] = round(sum(result['seconds'].values()), 3)
+        return result
+    finally:
+        db.close()
+
+
+def _merge(results: List[Dict[str, Any]], name: str, summed: Tuple[str, ...]) -> Dict[str, Any]:
+    """Итог расчета name по частям: счетчики summed складываются, остальные поля — из первой части"""
+    merged = dict(results[0][name])
+    for field in summed:
+        merged[field] = sum(result[name][field] for result in results)
+    return merged
+
+
+class ShardedRecalculation:
+    """
+    Параллельный recalculate_all: каталог делится на диапазоны штрихкодов, поштучные поля
+    считаются в пуле процессов, затем в этом процессе — ABC (зависит от всего каталога) и сводки
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def run(self, shards: int) -> Dict[str, Any]:
+        started = time.perf_counter()
+        ranges = shard_ranges(self.db, shards)
+
+        pool = _get_pool()
+        futures = [pool.submit(recalculate_shard, shard) for shard in ranges]
+        results = [future.result() for future in futures]
+        sharded_at = time.perf_counter()
+        # Процессы пула пишут в БД мимо снимка этого процесса — сбрасывается один раз, после всех частей
+        catalog_snapshot.invalidate()
+
+        abc_result = CalculationService(self.db).calculate_abc_category()
+        finished = time.perf_counter()
+
+        return {
+            'margins': _merge(results, 'margins', ('total', 'success', 'failed')),
+            'abc_categories': abc_result,
+            'sales_metrics': _merge(results, 'sales_metrics', ('total', 'success')),
+            'stock_metrics': _merge(results, 'stock_metrics', ('total', 'in_stock')),
+            'shards': [
+                {'range': result['shard'], 'pid': result['pid'], 'seconds': result['seconds']}
+                for result in results
+            ],
+            'sharded_seconds': round(sharded_at - started, 3),
+            'abc_seconds': round(finished - sharded_at, 3),
+            'total_seconds': round(finished - started, 3)
+        }
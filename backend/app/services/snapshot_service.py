@@ -0,0 +1,377 @@
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from app.database import SessionLocal
+from app.models.product import Product, CalculatedData, DirtyBarcode
+from app.utils.bulk import iter_batches
+from app.utils.pagination import encode_cursor, decode_cursor
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+import numpy as np
+import pandas as pd
+import os
+import sys
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Колоночный снимок каталога в памяти процесса для аналитических выборок (0 — всегда SQL)
+CATALOG_SNAPSHOT = os.getenv("CATALOG_SNAPSHOT", "1") == "1"
+# Снимок старше (секунды) не используется: изменения из других процессов приложения в него не попадают
+SNAPSHOT_MAX_AGE = float(os.getenv("SNAPSHOT_MAX_AGE", "300"))
+
+SNAPSHOT_COLUMNS = [
+    'barcode', 'name', 'brand', 'product_category', 'stock_total',
+    'purchase_price', 'margin', 'margin_percent', 'abc_category'
+]
+
+# Строковые поля со словарным кодированием: код -1 — NULL
+DICTIONARY_COLUMNS = ('brand', 'product_category', 'abc_category')
+
+
+def _select(barcodes: Optional[Sequence[str]] = None):
+    query = select(
+        Product.barcode,
+        Product.name,
+        Product.brand,
+        Product.product_category,
+        Product.stock_total,
+        Product.purchase_price,
+        CalculatedData.margin,
+        CalculatedData.margin_percent,
+        CalculatedData.abc_category
+    ).outerjoin(CalculatedData, CalculatedData.barcode == Product.barcode)
+    if barcodes is not None:
+        query = query.where(Product.barcode.in_(barcodes))
+    return query
+
+
+def _load(db: Session, barcodes: Optional[Sequence[str]] = None) -> pd.DataFrame:
+    """Строки снимка из БД по штрихкоду (через соединение, без ORM-обработки строк)"""
+    if barcodes is None:
+        rows = db.connection().execute(_select()).all()
+    else:
+        rows = []
+        for batch in iter_batches(sorted(set(barcodes))):
+            rows.extend(db.connection().execute(_select(batch)).all())
+    return pd.DataFrame(rows, columns=SNAPSHOT_COLUMNS)
+
+
+def _encode(values: pd.Series, dictionary: List[str]) -> np.ndarray:
+    """Коды значений по словарю; новые значения дописываются в его конец"""
+    index = {value: code for code, value in enumerate(dictionary)}
+    for value in values.dropna().unique():
+        if value not in index:
+            index[value] = len(dictionary)
+            dictionary.append(value)
+    return values.map(index).fillna(-1).to_numpy(dtype=np.int32)
+
+
+class CatalogSnapshot:
+    """
+    Неизменяемый колоночный снимок каталога: массивы NumPy, по элементу на товар,
+    в порядке штрихкода (позиция — ранг штрихкода). Бренд, категория и ABC закодированы словарем.
+    Обновление (patched) возвращает новый снимок — читатели старого не блокируются
+    """
+
+    def __init__(
+        self, arrays: Dict[str, np.ndarray], dictionaries: Dict[str, List[str]], build_seconds: float,
+        built_at: Optional[float] = None
+    ):
+        self.arrays = arrays
+        self.dictionaries = dictionaries
+        self.build_seconds = build_seconds
+        # Время полной сборки: точечные обновления его не сдвигают, снимок устаревает по SNAPSHOT_MAX_AGE
+        self.built_at = time.time() if built_at is None else built_at
+        self.rows = len(arrays['barcode'])
+
+    @classmethod
+    def from_frame(
+        cls, df: pd.DataFrame, build_seconds: float, dictionaries: Optional[Dict[str, List[str]]] = None
+    ) -> 'CatalogSnapshot':
+        dictionaries = {column: list((dictionaries or {}).get(column, [])) for column in DICTIONARY_COLUMNS}
+        # Порядок штрихкода — сравнением строк Python (как в searchsorted), а не по правилам сортировки СУБД
+        df = df.sort_values('barcode', kind='stable', ignore_index=True)
+        arrays = {
+            'barcode': df['barcode'].to_numpy(dtype=object),
+            'name': df['name'].to_numpy(dtype=object),
+            # NULL остатка — 0: такие товары не попадают в выборки с остатком > 0, как и в SQL
+            'stock_total': df['stock_total'].fillna(0).to_numpy(dtype=np.int64),
+        }
+        for column in ('purchase_price', 'margin', 'margin_percent'):
+            arrays[column] = df[column].to_numpy(dtype=float, na_value=np.nan)
+        for column in DICTIONARY_COLUMNS:
+            arrays[column] = _encode(df[column], dictionaries[column])
+        return cls(arrays, dictionaries, build_seconds)
+
+    @classmethod
+    def build(cls, db: Session) -> 'CatalogSnapshot':
+        started = time.perf_counter()
+        df = _load(db)
+        return cls.from_frame(df, time.perf_counter() - started)
+
+    def patched(self, db: Session, barcodes: Iterable[str]) -> 'CatalogSnapshot':
+        """Новый снимок с перечитанными товарами barcodes (удаленные из каталога убираются)"""
+        barcodes = np.array(sorted(set(barcodes)), dtype=object)
+        fresh = CatalogSnapshot.from_frame(_load(db, barcodes), 0, self.dictionaries)
+
+        current = self.arrays['barcode']
+        positions = np.searchsorted(current, barcodes)
+        found = positions < len(current)
+        found[found] = current[positions[found]] == barcodes[found]
+        keep = np.ones(len(current), dtype=bool)
+        keep[positions[found]] = False
+
+        kept_barcodes = current[keep]
+        inserts = np.searchsorted(kept_barcodes, fresh.arrays['barcode'])
+        arrays = {
+            column: np.insert(values[keep], inserts, fresh.arrays[column])
+            for column, values in self.arrays.items()
+        }
+        return CatalogSnapshot(arrays, fresh.dictionaries, self.build_seconds, self.built_at)
+
+    def memory_bytes(self) -> int:
+        """Объем массивов и строк снимка"""
+        total = 0
+        for values in self.arrays.values():
+            total += values.nbytes
+            if values.dtype == object:
+                total += sum(sys.getsizeof(value) for value in values if value is not None)
+        for dictionary in self.dictionaries.values():
+            total += sum(sys.getsizeof(value) for value in dictionary)
+        return total
+
+    def _matches(self, column: str, value: Optional[str]) -> Optional[np.ndarray]:
+        """Маска по значению словарного поля (None — без фильтра)"""
+        if not value:
+            return None
+        dictionary = self.dictionaries[column]
+        code = dictionary.index(value) if value in dictionary else -2
+        return self.arrays[column] == code
+
+    def _filtered(self, mask: np.ndarray, brand: Optional[str], product_category: Optional[str]) -> np.ndarray:
+        for column, value in (('brand', brand), ('product_category', product_category)):
+            matches = self._matches(column, value)
+            if matches is not None:
+                mask &= matches
+        return mask
+
+    def _page(
+        self,
+        mask: np.ndarray,
+        key: Optional[str],
+        limit: int,
+        cursor: Optional[str],
+        descending: bool
+    ) -> tuple:
+        """
+        Страница как у keyset_page: строки маски в порядке (key, barcode) после курсора.
+        Курсоры совместимы с SQL-выборкой — страницы можно листать при переходе между ними
+        """
+        rank = np.flatnonzero(mask)
+        values = self.arrays[key][rank] if key else None
+        if cursor is not None:
+            cursor_values = decode_cursor(cursor)
+            if len(cursor_values) != (2 if key else 1) or not isinstance(cursor_values[-1], str):
+                raise ValueError("Некорректный курсор")
+            barcodes = self.arrays['barcode']
+            # Позиция в снимке — ранг штрихкода: сравнение с курсором по рангу
+            if descending:
+                barcode_after = rank < np.searchsorted(barcodes, cursor_values[-1], side='left')
+            else:
+                barcode_after = rank >= np.searchsorted(barcodes, cursor_values[-1], side='right')
+            if key:
+                try:
+                    cursor_key = float(cursor_values[0])
+                except (TypeError, ValueError):
+                    raise ValueError("Некорректный курсор")
+                beyond = values < cursor_key if descending else values > cursor_key
+                after = beyond | ((values == cursor_key) & barcode_after)
+            else:
+                after = barcode_after
+            rank, values = rank[after], (values[after] if key else None)
+
+        order = np.lexsort((rank, values)) if key else np.arange(len(rank))
+        if descending:
+            order = order[::-1]
+        page = rank[order[:limit + 1]]
+
+        next_cursor = None
+        if len(page) > limit:
+            page = page[:limit]
+            last = page[-1]
+            key_values = [self._value(key, last)] if key else []
+            next_cursor = encode_cursor(key_values + [self.arrays['barcode'][last]])
+        return page, next_cursor
+
+    def _value(self, column: str, position: int) -> Any:
+        value = self.arrays[column][position]
+        if column in DICTIONARY_COLUMNS:
+            return self.dictionaries[column][value] if value >= 0 else None
+        if column == 'stock_total':
+            return int(value)
+        if isinstance(value, float) or isinstance(value, np.floating):
+            return None if np.isnan(value) else float(value)
+        return value
+
+    def _items(self, positions: np.ndarray, columns: Sequence[str]) -> List[Dict[str, Any]]:
+        return [{column: self._value(column, position) for column in columns} for position in positions]
+
+    def low_stock(
+        self, threshold: int, limit: int, cursor: Optional[str], sort: str, descending: bool,
+        brand: Optional[str], product_category: Optional[str]
+    ) -> dict:
+        """То же, что CalculationService.get_low_stock_products"""
+        stock = self.arrays['stock_total']
+        mask = self._filtered((stock <= threshold) & (stock > 0), brand, product_category)
+        page, next_cursor = self._page(mask, None if sort == 'barcode' else 'stock_total', limit, cursor, descending)
+        items = self._items(page, ('barcode', 'name', 'brand', 'product_category', 'stock_total'))
+        return {'items': items, 'next_cursor': next_cursor}
+
+    def high_margin(
+        self, min_margin_percent: float, limit: int, cursor: Optional[str], sort: str, descending: bool,
+        brand: Optional[str], product_category: Optional[str]
+    ) -> dict:
+        """То же, что CalculationService.get_high_margin_products"""
+        with np.errstate(invalid='ignore'):
+            mask = self.arrays['margin_percent'] >= min_margin_percent
+        mask = self._filtered(mask, brand, product_category)
+        page, next_cursor = self._page(mask, None if sort == 'barcode' else 'margin_percent', limit, cursor, descending)
+        items = self._items(page, ('barcode', 'name', 'brand', 'product_category', 'margin_percent', 'margin'))
+        return {'items': items, 'next_cursor': next_cursor}
+
+    def distinct(self, column: str) -> List[str]:
+        """Значения словарного поля, которые есть у товаров (для фильтров)"""
+        codes = np.unique(self.arrays[column])
+        return [self.dictionaries[column][code] for code in codes if code >= 0]
+
+
+class SnapshotCache:
+    """
+    Текущий снимок процесса. Полная пересборка идет в фоновом потоке своей сессией БД;
+    пересчет отмеченных товаров (recalculate_dirty) патчит снимок по их штрихкодам.
+    get() отдает снимок, только если он актуален — иначе None, и чтение идет в SQL
+    """
+
+    def __init__(self):
+        self._snapshot = None
+        # invalidate() увеличивает поколение; снимок актуален, если собран не раньше последнего
+        self._generation = 0
+        self._built_generation = 0
+        self._building = False
+        # Товары, пропатченные во время пересборки: перечитываются в новый снимок
+        self._pending = set()
+        self._lock = threading.Lock()
+        self.last_error = None
+
+    def _stale_reason(self, db: Session) -> Optional[str]:
+        if not CATALOG_SNAPSHOT:
+            return 'disabled'
+        if self._snapshot is None:
+            return 'not_built'
+        if self._built_generation != self._generation:
+            return 'invalidated'
+        if time.time() - self._snapshot.built_at > SNAPSHOT_MAX_AGE:
+            return 'expired'
+        # Отмеченные, но еще не пересчитанные товары (импорт, правка) — в снимок они пока не попали
+        if db.execute(select(DirtyBarcode.barcode).limit(1)).first() is not None:
+            return 'pending_changes'
+        return None
+
+    def get(self, db: Session) -> Optional[CatalogSnapshot]:
+        reason = self._stale_reason(db)
+        if reason in ('not_built', 'invalidated', 'expired'):
+            self.schedule_rebuild()
+        return None if reason else self._snapshot
+
+    def status(self, db: Session) -> Dict[str, Any]:
+        snapshot = self._snapshot
+        result = {
+            'enabled': CATALOG_SNAPSHOT,
+            'stale_reason': self._stale_reason(db),
+            'building': self._building,
+            'last_error': self.last_error
+        }
+        if snapshot is not None:
+            result.update({
+                'rows': snapshot.rows,
+                'memory_bytes': snapshot.memory_bytes(),
+                'build_seconds': round(snapshot.build_seconds, 3),
+                'age_seconds': round(time.time() - snapshot.built_at, 1),
+                'dictionaries': {column: len(values) for column, values in snapshot.dictionaries.items()}
+            })
+        return result
+
+    def rebuild(self, db: Session) -> CatalogSnapshot:
+        """Собирает снимок заново (в вызывающем потоке)"""
+        with self._lock:
+            self._building = True
+            self._pending.clear()
+            generation = self._generation
+        try:
+            snapshot = CatalogSnapshot.build(db)
+            while True:
+                with self._lock:
+                    pending, self._pending = self._pending, set()
+                    if not pending:
+                        # Замена снимка и конец сборки — под одной блокировкой: патчи после нее идут в новый снимок
+                        self._snapshot = snapshot
+                        self._built_generation = generation
+                        self._building = False
+                        break
+                snapshot = snapshot.patched(db, pending)
+            self.last_error = None
+            return snapshot
+        finally:
+            with self._lock:
+                self._building = False
+
+    def schedule_rebuild(self):
+        """Пересборка в фоновом потоке (если уже не идет)"""
+        if not CATALOG_SNAPSHOT:
+            return
+        with self._lock:
+            if self._building:
+                return
+            self._building = True
+        threading.Thread(target=self._rebuild_in_background, name="catalog-snapshot", daemon=True).start()
+
+    def _rebuild_in_background(self):
+        db = SessionLocal()
+        try:
+            self.rebuild(db)
+        except Exception as e:
+            self.last_error = str(e)
+            logger.exception("Не удалось собрать снимок каталога")
+        finally:
+            db.close()
+            with self._lock:
+                self._building = False
+
+    def invalidate(self):
+        """Данные изменились по всему каталогу (полный пересчет): снимок пересобирается"""
+        with self._lock:
+            self._generation += 1
+            active = self._snapshot is not None or self._building
+        if active:
+            self.schedule_rebuild()
+
+    def patch(self, db: Session, barcodes: Iterable[str]):
+        """Перечитывает товары barcodes после их изменения (данные должны быть зафиксированы)"""
+        barcodes = set(barcodes)
+        if not barcodes:
+            return
+        with self._lock:
+            if self._building:
+                self._pending |= barcodes
+            snapshot = self._snapshot
+        if snapshot is None:
+            return
+        patched = snapshot.patched(db, barcodes)
+        with self._lock:
+            # Снимок могла заменить пересборка — тогда товары перечитаны ею (через _pending)
+            if self._snapshot is snapshot:
+                self._snapshot = patched
+
+
+catalog_snapshot = SnapshotCache()
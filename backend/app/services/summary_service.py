@@ -0,0 +1,187 @@
+from sqlalchemy import select, insert, update, delete, bindparam
+from sqlalchemy.orm import Session
+from app.models.product import Product, MarketplaceData, CalculatedData, SummaryContribution, AnalyticsSummary
+from app.utils.bulk import bulk_upsert, iter_batches
+from typing import Dict, List, Optional, Sequence
+import pandas as pd
+
+# Сводки: измерение -> поле вклада товара
+SUMMARY_DIMENSIONS = {
+    'abc': 'abc_category',
+    'brand': 'brand',
+    'category': 'product_category',
+    'marketplace': 'marketplaces',
+}
+
+CONTRIBUTION_COLUMNS = [
+    'barcode', 'abc_category', 'brand', 'product_category', 'marketplaces', 'stock_total', 'stock_value'
+]
+
+SUMMARY_VALUES = ['product_count', 'stock_total', 'stock_value']
+
+
+class SummaryService:
+    """
+    Материализованные сводки analytics_summary. Полное обновление пересобирает их
+    по каталогу; частичное (refresh(barcodes)) вычитает прежний вклад изменившихся
+    товаров и прибавляет новый — объем работы не зависит от размера каталога.
+    Изменения пишутся в транзакции вызывающего кода
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def _current(self, barcodes: Optional[Sequence[str]] = None) -> pd.DataFrame:
+        """Текущий вклад товаров (все или barcodes) по данным каталога"""
+        query = select(
+            Product.barcode,
+            CalculatedData.abc_category,
+            Product.brand,
+            Product.product_category,
+            Product.stock_total,
+            Product.purchase_price
+        ).outerjoin(CalculatedData, CalculatedData.barcode == Product.barcode)
+        links = select(MarketplaceData.barcode, MarketplaceData.marketplace).distinct()
+        if barcodes is not None:
+            query = query.where(Product.barcode.in_(barcodes))
+            links = links.where(MarketplaceData.barcode.in_(barcodes))
+
+        df = pd.DataFrame(
+            self.db.execute(query).all(),
+            columns=['barcode', 'abc_category', 'brand', 'product_category', 'stock_total', 'purchase_price']
+        )
+        links = pd.DataFrame(self.db.execute(links).all(), columns=['barcode', 'marketplace'])
+
+        stock = df['stock_total'].fillna(0).astype('int64')
+        for column in ('abc_category', 'brand', 'product_category'):
+            df[column] = df[column].fillna('')
+        # 'ozon,wb': по колонке на маркетплейс (их единицы) вместо склейки строк по каждому товару
+        marketplaces = pd.Series('', index=df.index, dtype=object)
+        for name in sorted(links['marketplace'].dropna().unique()):
+            listed = df['barcode'].isin(links.loc[links['marketplace'] == name, 'barcode'])
+            marketplaces = marketplaces.where(~listed, marketplaces + ',' + name)
+        df['marketplaces'] = marketplaces.str.lstrip(',')
+        df['stock_total'] = stock
+        df['stock_value'] = (df['purchase_price'].fillna(0) * stock).round(2)
+        return df[CONTRIBUTION_COLUMNS]
+
+    def _previous(self, barcodes: Sequence[str]) -> pd.DataFrame:
+        rows = []
+        for batch in iter_batches(list(barcodes)):
+            rows.extend(self.db.execute(
+                select(*[getattr(SummaryContribution, c) for c in CONTRIBUTION_COLUMNS])
+                .where(SummaryContribution.barcode.in_(batch))
+            ).all())
+        return pd.DataFrame(rows, columns=CONTRIBUTION_COLUMNS)
+
+    @staticmethod
+    def _totals(contributions: pd.DataFrame) -> pd.DataFrame:
+        """Вклады товаров -> строки сводок (dimension, key, product_count, stock_total, stock_value)"""
+        if contributions.empty:
+            return pd.DataFrame(columns=['dimension', 'key'] + SUMMARY_VALUES)
+        parts = []
+        for dimension, field in SUMMARY_DIMENSIONS.items():
+            keys = contributions[field]
+            frame = contributions[['stock_total', 'stock_value']].assign(dimension=dimension, key=keys, product_count=1)
+            if field == 'marketplaces':
+                # Товар на нескольких маркетплейсах входит в сводку каждого; без маркетплейса — в key=''
+                frame = frame.assign(key=keys.str.split(',')).explode('key')
+            parts.append(frame)
+        return pd.concat(parts).groupby(['dimension', 'key'], as_index=False)[SUMMARY_VALUES].sum()
+
+    def refresh(self, barcodes: Optional[Sequence[str]] = None) -> int:
+        """
+        Обновляет сводки: полностью (barcodes=None) или по изменившимся товарам,
+        включая удаленные. Возвращает число обновленных строк сводок
+        """
+        if barcodes is None:
+            return self._rebuild()
+
+        barcodes = list(dict.fromkeys(barcodes))
+        if not barcodes:
+            return 0
+        previous = self._previous(barcodes)
+        current = self._current(barcodes)
+
+        removed_totals = self._totals(previous)
+        removed_totals[SUMMARY_VALUES] = -removed_totals[SUMMARY_VALUES]
+        parts = [totals for totals in (self._totals(current), removed_totals) if not totals.empty]
+        changed = 0
+        if parts:
+            delta = pd.concat(parts).groupby(['dimension', 'key'], as_index=False)[SUMMARY_VALUES].sum()
+            delta = delta[(delta[SUMMARY_VALUES] != 0).any(axis=1)]
+            self._apply(delta)
+            changed = len(delta)
+
+        bulk_upsert(self.db, SummaryContribution, current.to_dict('records'))
+        removed = set(previous['barcode']) - set(current['barcode'])
+        for batch in iter_batches(sorted(removed)):
+            self.db.execute(delete(SummaryContribution).where(SummaryContribution.barcode.in_(batch)))
+        return changed
+
+    def _apply(self, delta: pd.DataFrame):
+        """Прибавляет приращения к строкам сводок; опустевшие строки удаляются"""
+        if delta.empty:
+            return
+        existing = set(self.db.execute(select(AnalyticsSummary.dimension, AnalyticsSummary.key)).tuples())
+        rows = [
+            {'d': d, 'k': k, 'count': int(count), 'stock': int(stock), 'value': float(value)}
+            for d, k, count, stock, value in delta[['dimension', 'key'] + SUMMARY_VALUES].itertuples(index=False)
+        ]
+        updates = [row for row in rows if (row['d'], row['k']) in existing]
+        inserts = [
+            {'dimension': row['d'], 'key': row['k'], 'product_count': row['count'],
+             'stock_total': row['stock'], 'stock_value': row['value']}
+            for row in rows if (row['d'], row['k']) not in existing
+        ]
+
+        if updates:
+            self.db.execute(
+                update(AnalyticsSummary.__table__)
+                .where(
+                    AnalyticsSummary.__table__.c.dimension == bindparam('d'),
+                    AnalyticsSummary.__table__.c.key == bindparam('k')
+                )
+                .values(
+                    product_count=AnalyticsSummary.__table__.c.product_count + bindparam('count'),
+                    stock_total=AnalyticsSummary.__table__.c.stock_total + bindparam('stock'),
+                    stock_value=AnalyticsSummary.__table__.c.stock_value + bindparam('value')
+                ),
+                updates
+            )
+        if inserts:
+            self.db.execute(insert(AnalyticsSummary), inserts)
+        self.db.execute(delete(AnalyticsSummary).where(AnalyticsSummary.product_count <= 0))
+
+    def _rebuild(self) -> int:
+        current = self._current()
+        totals = self._totals(current)
+        self.db.execute(delete(SummaryContribution))
+        self.db.execute(delete(AnalyticsSummary))
+        for batch in iter_batches(current.to_dict('records')):
+            self.db.execute(insert(SummaryContribution), list(batch))
+        if not totals.empty:
+            self.db.execute(insert(AnalyticsSummary), [
+                {**row, 'product_count': int(row['product_count']), 'stock_total': int(row['stock_total']),
+                 'stock_value': round(float(row['stock_value']), 2)}
+                for row in totals.to_dict('records')
+            ])
+        return len(totals)
+
+    def get(self, dimension: str) -> List[Dict]:
+        """Строки сводки по измерению — чтение небольшой таблицы, без агрегации по каталогу"""
+        if dimension not in SUMMARY_DIMENSIONS:
+            raise ValueError(f"Неизвестная сводка: {dimension}")
+        rows = self.db.query(AnalyticsSummary).filter(
+            AnalyticsSummary.dimension == dimension
+        ).order_by(AnalyticsSummary.stock_value.desc(), AnalyticsSummary.key).all()
+        return [
+            {
+                'key': row.key or None,
+                'product_count': row.product_count,
+                'stock_total': row.stock_total,
+                'stock_value': round(row.stock_value, 2),
+                'updated_at': row.updated_at
+            }
+            for row in rows
+        ]
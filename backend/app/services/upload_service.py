@@ -0,0 +1,140 @@
+from fastapi import UploadFile
+from starlette.concurrency import run_in_threadpool
+from typing import AsyncIterator, Optional, Tuple
+from datetime import datetime
+import hashlib
+import json
+import os
+import re
+import shutil
+import uuid
+
+UPLOAD_DIR = "uploads"
+# Недокачанные файлы возобновляемых загрузок: <upload_id>.part + <upload_id>.json
+PARTIAL_DIR = os.path.join(UPLOAD_DIR, "partial")
+
+# Размер порции при записи загрузки на диск
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+_UPLOAD_ID_RE = re.compile(r'^[0-9a-f]{32}$')
+
+
+def upload_path(prefix: str, filename: str) -> str:
+    """Путь для сохранения загрузки: uploads/<prefix>_<timestamp>_<имя файла>"""
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    return os.path.join(UPLOAD_DIR, f"{prefix}_{timestamp}_{os.path.basename(filename)}")
+
+
+def _write_chunk(buffer, hasher, chunk: bytes):
+    hasher.update(chunk)
+    buffer.write(chunk)
+
+
+async def save_upload(file: UploadFile, file_path: str) -> str:
+    """
+    Потоково сохраняет загрузку на диск порциями, считая SHA-256 на лету.
+    Запись и хэширование выполняются в пуле потоков, event loop не блокируется.
+    Возвращает SHA-256 в hex.
+    """
+    hasher = hashlib.sha256()
+    buffer = await run_in_threadpool(open, file_path, "wb")
+    try:
+        while True:
+            chunk = await file.read(UPLOAD_CHUNK_SIZE)
+            if not chunk:
+                break
+            await run_in_threadpool(_write_chunk, buffer, hasher, chunk)
+    finally:
+        await run_in_threadpool(buffer.close)
+    return hasher.hexdigest()
+
+
+def file_sha256(file_path: str) -> str:
+    """SHA-256 файла на диске (читается порциями)"""
+    hasher = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(UPLOAD_CHUNK_SIZE), b""):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+class ResumableUploads:
+    """
+    Возобновляемая загрузка больших файлов порциями.
+    Клиент создает загрузку, отправляет порции с указанием смещения
+    и после обрыва узнает, с какого байта продолжить (size).
+    """
+
+    def __init__(self, directory: str = PARTIAL_DIR):
+        self.directory = directory
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _paths(self, upload_id: str) -> Tuple[str, str]:
+        if not _UPLOAD_ID_RE.match(upload_id):
+            raise KeyError(upload_id)
+        base = os.path.join(self.directory, upload_id)
+        return base + ".part", base + ".json"
+
+    def create(self, filename: str) -> dict:
+        upload_id = uuid.uuid4().hex
+        part_path, meta_path = self._paths(upload_id)
+        open(part_path, "wb").close()
+        with open(meta_path, "w", encoding="utf-8") as f:
+            json.dump({"file_name": os.path.basename(filename)}, f)
+        return self.info(upload_id)
+
+    def info(self, upload_id: str) -> Optional[dict]:
+        """Имя файла и число уже принятых байт; None — загрузка не найдена"""
+        try:
+            part_path, meta_path = self._paths(upload_id)
+        except KeyError:
+            return None
+        if not os.path.exists(meta_path):
+            return None
+        with open(meta_path, encoding="utf-8") as f:
+            meta = json.load(f)
+        return {
+            "upload_id": upload_id,
+            "file_name": meta["file_name"],
+            "size": os.path.getsize(part_path)
+        }
+
+    async def append(self, upload_id: str, offset: int, chunks: AsyncIterator[bytes]) -> dict:
+        """
+        Дописывает порцию, начиная со смещения offset.
+        offset должен совпадать с текущим размером, иначе ValueError —
+        клиент запрашивает info() и продолжает с нужного байта.
+        """
+        info = self.info(upload_id)
+        if info is None:
+            raise KeyError(upload_id)
+        if offset != info["size"]:
+            raise ValueError(f"Ожидалось смещение {info['size']}, получено {offset}")
+
+        part_path, _ = self._paths(upload_id)
+        buffer = await run_in_threadpool(open, part_path, "ab")
+        try:
+            async for chunk in chunks:
+                if chunk:
+                    await run_in_threadpool(buffer.write, chunk)
+        finally:
+            await run_in_threadpool(buffer.close)
+        return self.info(upload_id)
+
+    def complete(self, upload_id: str, prefix: str) -> Tuple[str, str]:
+        """Переносит собранный файл в uploads/ и возвращает (путь, SHA-256)"""
+        info = self.info(upload_id)
+        if info is None:
+            raise KeyError(upload_id)
+        part_path, meta_path = self._paths(upload_id)
+        file_hash = file_sha256(part_path)
+        file_path = upload_path(prefix, info["file_name"])
+        shutil.move(part_path, file_path)
+        os.remove(meta_path)
+        return file_path, file_hash
+
+    def abort(self, upload_id: str):
+        part_path, meta_path = self._paths(upload_id)
+        for path in (part_path, meta_path):
+            if os.path.exists(path):
+                os.remove(path)
@@ -1,4 +1,26 @@
 # Utility functions and helpers
 # This module contains utility functions used across the application
+from app.utils.bulk import bulk_upsert, iter_batches, DEFAULT_BATCH_SIZE
+from app.utils.readers import SheetLayout, WrongFileError, read_table, iter_table_chunks, check_columns
+from app.utils.partitions import ensure_month_partitions
+from app.utils.pagination import (
+    encode_cursor, decode_cursor, keyset_filter, keyset_page, estimate_count, CountCache
+)
 
-__all__ = []
+__all__ = [
+    "bulk_upsert",
+    "iter_batches",
+    "DEFAULT_BATCH_SIZE",
+    "SheetLayout",
+    "WrongFileError",
+    "read_table",
+    "iter_table_chunks",
+    "check_columns",
+    "ensure_month_partitions",
+    "encode_cursor",
+    "decode_cursor",
+    "keyset_filter",
+    "keyset_page",
+    "estimate_count",
+    "CountCache"
+]
@@ -0,0 +1,136 @@
+from sqlalchemy import Table, Column, MetaData, Boolean, select, insert, update, func, tuple_, literal_column, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+import os
+
+# Размер пачки для массовых операций: достаточно крупный, чтобы
+# экономить round-trip'ы, и с запасом укладывается в лимиты параметров драйверов
+DEFAULT_BATCH_SIZE = 5000
+
+# PostgreSQL: с какого числа строк staging-таблица (один INSERT ... SELECT на все строки)
+# окупает свои CREATE/DROP; меньше — прямой INSERT ... ON CONFLICT пачками VALUES
+STAGING_MIN_ROWS = int(os.getenv("BULK_STAGING_MIN_ROWS", "2000"))
+
+# xmax = 0 только у строк, вставленных этой командой
+_INSERTED = literal_column("xmax = 0", Boolean).label('inserted')
+
+
+def iter_batches(items: Sequence[Any], batch_size: int = DEFAULT_BATCH_SIZE) -> Iterator[Sequence[Any]]:
+    """Разбивает последовательность на пачки фиксированного размера"""
+    for start in range(0, len(items), batch_size):
+        yield items[start:start + batch_size]
+
+
+def bulk_upsert(
+    db: Session,
+    model,
+    rows: List[Dict[str, Any]],
+    index_elements: Optional[Sequence[str]] = None,
+    batch_size: int = DEFAULT_BATCH_SIZE
+) -> Tuple[int, int]:
+    """
+    Массово вставляет или обновляет строки модели за один проход.
+    index_elements — ключевые колонки (по умолчанию первичный ключ).
+    PostgreSQL: INSERT ... ON CONFLICT DO UPDATE; от STAGING_MIN_ROWS строк — через staging-таблицу.
+    Остальные СУБД: пачки executemany (INSERT для новых ключей, UPDATE для существующих).
+    Дубликаты ключей схлопываются, побеждает последняя строка.
+    Возвращает кортеж (добавлено, обновлено) по уникальным ключам.
+    """
+    table = model.__table__
+    keys = list(index_elements or [c.name for c in table.primary_key.columns])
+
+    unique_rows = {tuple(row[k] for k in keys): row for row in rows}
+    rows = list(unique_rows.values())
+    if not rows:
+        return 0, 0
+
+    if db.get_bind().dialect.name == 'postgresql':
+        return _postgresql_upsert(db, table, rows, keys, batch_size)
+    return _generic_upsert(db, model, rows, keys, batch_size)
+
+
+def _postgresql_upsert(
+    db: Session,
+    table: Table,
+    rows: List[Dict[str, Any]],
+    keys: List[str],
+    batch_size: int
+) -> Tuple[int, int]:
+    columns = list(rows[0].keys())
+    if len(rows) < STAGING_MIN_ROWS:
+        # Немного строк: INSERT ... ON CONFLICT пачками VALUES, без DDL staging-таблицы
+        stmt = _on_conflict(pg_insert(table), table, columns, keys)
+        inserted = db.execute(stmt.returning(_INSERTED), rows).scalars().all()
+        added = sum(inserted)
+        return added, len(inserted) - added
+
+    staging = Table(
+        f"tmp_{table.name}_upsert",
+        MetaData(),
+        *[Column(name, table.c[name].type) for name in columns],
+        prefixes=["TEMPORARY"],
+        postgresql_on_commit="DROP"
+    )
+    # Таблица живет до конца транзакции; пересоздаем на случай повторного вызова в той же транзакции
+    db.execute(text(f"DROP TABLE IF EXISTS {staging.name}"))
+    staging.create(db.connection())
+
+    for batch in iter_batches(rows, batch_size):
+        db.execute(staging.insert(), list(batch))
+
+    stmt = _on_conflict(pg_insert(table).from_select(columns, select(*staging.c)), table, columns, keys)
+    upserted = stmt.returning(_INSERTED).cte('upserted')
+    added, total = db.execute(
+        select(
+            func.count().filter(upserted.c.inserted),
+            func.count()
+        ).select_from(upserted)
+    ).one()
+
+    db.execute(text(f"DROP TABLE IF EXISTS {staging.name}"))
+    return added, total - added
+
+
+def _on_conflict(stmt, table: Table, columns: List[str], keys: List[str]):
+    set_ = {name: stmt.excluded[name] for name in columns if name not in keys}
+    if 'updated_at' in table.c and 'updated_at' not in columns:
+        set_['updated_at'] = func.now()
+
+    if set_:
+        return stmt.on_conflict_do_update(index_elements=keys, set_=set_)
+    return stmt.on_conflict_do_nothing(index_elements=keys)
+
+
+def _generic_upsert(
+    db: Session,
+    model,
+    rows: List[Dict[str, Any]],
+    keys: List[str],
+    batch_size: int
+) -> Tuple[int, int]:
+    key_columns = [model.__table__.c[k] for k in keys]
+    added = 0
+    updated = 0
+
+    for batch in iter_batches(rows, batch_size):
+        batch_keys = [tuple(row[k] for k in keys) for row in batch]
+        if len(key_columns) == 1:
+            condition = key_columns[0].in_([k[0] for k in batch_keys])
+        else:
+            condition = tuple_(*key_columns).in_(batch_keys)
+        existing = {tuple(r) for r in db.execute(select(*key_columns).where(condition))}
+
+        new_rows = [row for row, k in zip(batch, batch_keys) if k not in existing]
+        old_rows = [row for row, k in zip(batch, batch_keys) if k in existing]
+
+        # ORM bulk INSERT / bulk UPDATE по первичному ключу (executemany)
+        if new_rows:
+            db.execute(insert(model), new_rows)
+        if old_rows:
+            db.execute(update(model), old_rows)
+
+        added += len(new_rows)
+        updated += len(old_rows)
+
+    return added, updated
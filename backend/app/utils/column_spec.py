@@ -0,0 +1,229 @@
+import numpy as np
+import pandas as pd
+from typing import Any, Dict, Iterator, List, Sequence, Union
+
+# Поддерживаемые типы колонок:
+#   'str'            — строка без пробелов по краям
+#   'int'            — целое число, пустое значение -> default
+#   'float'          — число с точкой, пустое значение -> default
+#   'number'         — «мягкое» число из отчетов маркетплейсов: пробелы и NBSP
+#                      удаляются, запятая -> точка, берется ведущее число;
+#                      нераспознанное значение -> default (без ошибки)
+#   'leading_number' — ведущее число вида '123.45 руб', нет числа -> default
+#   'date'           — дата (datetime.date): '2024-05-31', '31.05.2024' (с временем или без)
+#                      или серийный номер Excel; пустое значение -> default
+COLUMN_TYPES = ('str', 'int', 'float', 'number', 'leading_number', 'date')
+
+# Серийные номера дат Excel (дни от 1899-12-30), которые считаются датой
+_EXCEL_SERIAL_RANGE = (1, 109574)  # до 9999-12-31
+
+
+class ColumnSpec:
+    """
+    Описание одной колонки выгрузки.
+    column — имя колонки в файле или кортеж имен (берется первое непустое значение).
+    field — имя поля в результирующем DataFrame.
+    """
+
+    def __init__(
+        self,
+        column: Union[str, Sequence[str]],
+        field: str,
+        type: str = 'str',
+        required: bool = False,
+        default: Any = None
+    ):
+        if type not in COLUMN_TYPES:
+            raise ValueError(f"Неизвестный тип колонки: {type}")
+        self.columns = (column,) if isinstance(column, str) else tuple(column)
+        self.field = field
+        self.type = type
+        self.required = required
+        self.default = '' if default is None and type == 'str' else default
+
+    @property
+    def label(self) -> str:
+        return self.columns[0]
+
+
+class ParsedFrame:
+    """
+    Результат разбора выгрузки по спецификации колонок.
+    data — типизированный DataFrame (колонки = ColumnSpec.field).
+    raw — исходные строки (для отчета об ошибках).
+    error_mask / reasons — строки с ошибками и причина по каждой.
+    skip_mask — строки, которые молча пропускаются (пустые, служебные).
+    source_rows — номер строки в исходном файле.
+    """
+
+    def __init__(self, data: pd.DataFrame, raw: pd.DataFrame, source_rows: pd.Series, blank: pd.Series):
+        self.data = data
+        self.raw = raw
+        self.source_rows = source_rows
+        self.blank = blank
+        self.error_mask = pd.Series(False, index=data.index)
+        self.skip_mask = pd.Series(False, index=data.index)
+        self.reasons = pd.Series('', index=data.index, dtype=object)
+
+    @property
+    def ok(self) -> pd.Series:
+        return ~(self.error_mask | self.skip_mask)
+
+    @property
+    def failed_count(self) -> int:
+        return int(self.error_mask.sum())
+
+    def fail(self, mask: pd.Series, reason: Union[str, pd.Series]):
+        """Помечает строки ошибочными; у строки сохраняется первая найденная причина"""
+        mask = mask & self.ok
+        if not mask.any():
+            return
+        self.error_mask |= mask
+        if isinstance(reason, pd.Series):
+            self.reasons[mask] = reason[mask]
+        else:
+            self.reasons[mask] = reason
+
+    def skip(self, mask: pd.Series):
+        self.skip_mask |= mask & ~self.error_mask
+
+    def valid(self) -> pd.DataFrame:
+        return self.data[self.ok]
+
+    def records(self) -> List[Dict[str, Any]]:
+        """Корректные строки как список словарей (NaN -> None)"""
+        valid = self.valid()
+        columns = []
+        for name in valid.columns:
+            values = valid[name]
+            if values.hasnans:
+                values = values.astype(object).where(values.notna(), None)
+            columns.append(values.tolist())
+        names = list(valid.columns)
+        return [dict(zip(names, row)) for row in zip(*columns)]
+
+    def take(self, start: int, stop: int) -> 'ParsedFrame':
+        """Строки с позициями [start, stop) вместе с найденными ошибками и пропусками"""
+        rows = slice(start, stop)
+        part = ParsedFrame(self.data.iloc[rows], self.raw.iloc[rows], self.source_rows.iloc[rows], self.blank.iloc[rows])
+        part.error_mask = self.error_mask.iloc[rows]
+        part.skip_mask = self.skip_mask.iloc[rows]
+        part.reasons = self.reasons.iloc[rows]
+        return part
+
+    def batches(self, batch_size: int, after_row: int = 0) -> Iterator['ParsedFrame']:
+        """
+        Порции по batch_size строк для записи с фиксацией после каждой.
+        after_row — строка файла, до которой (включительно) все уже записано: такие строки пропускаются.
+        """
+        start = int(np.searchsorted(self.source_rows.to_numpy(), after_row, side='right'))
+        for position in range(start, len(self.data), batch_size):
+            yield self.take(position, position + batch_size)
+
+    def error_details(self, report_columns: Dict[str, str]) -> List[Dict[str, Any]]:
+        """
+        Строки для отчета об ошибках.
+        report_columns — {подпись в отчете: колонка исходного файла}.
+        """
+        mask = self.error_mask
+        if not mask.any():
+            return []
+        report = pd.DataFrame({'Строка в Excel': self.source_rows[mask]})
+        for label, column in report_columns.items():
+            report[label] = self.raw.loc[mask, column] if column in self.raw.columns else 'N/A'
+        report['Причина ошибки'] = self.reasons[mask]
+        return report.to_dict('records')
+
+
+def _column(df: pd.DataFrame, column: str) -> pd.Series:
+    if column not in df.columns:
+        return pd.Series('', index=df.index, dtype=object)
+    col = df[column]
+    if isinstance(col, pd.DataFrame):
+        # Повтор имени колонки в шапке — как и row.get(), берем первую
+        col = col.iloc[:, 0]
+    return col
+
+
+def _strip(col: pd.Series) -> pd.Series:
+    # str.strip по списку заметно быстрее, чем .str.strip() с обработкой NA внутри pandas
+    return pd.Series([v.strip() for v in col.tolist()], index=col.index, dtype=object)
+
+
+def _coalesce(df: pd.DataFrame, columns: Sequence[str]) -> pd.Series:
+    result = _column(df, columns[0])
+    for column in columns[1:]:
+        result = result.where(result != '', _column(df, column))
+    return result
+
+
+def _convert(values: pd.Series, spec: ColumnSpec):
+    """Возвращает (типизированные значения, маска некорректных значений)"""
+    empty = values == ''
+    no_errors = pd.Series(False, index=values.index)
+
+    if spec.type == 'str':
+        return values.where(~empty, spec.default), no_errors
+
+    if spec.type in ('int', 'float'):
+        numeric = pd.to_numeric(values.where(~empty), errors='coerce')
+        bad = ~empty & numeric.isna()
+        if spec.type == 'int':
+            bad |= numeric.notna() & (np.floor(numeric) != numeric)
+        result = numeric.where(~empty & ~bad, spec.default)
+        if spec.type == 'int' and spec.default is not None:
+            result = result.astype('int64')
+        return result, bad
+
+    if spec.type == 'number':
+        cleaned = values.str.replace('[ \u00A0]', '', regex=True).str.replace(',', '.', regex=False)
+        extracted = cleaned.str.extract(r'^([+-]?\d+(?:\.\d+)?)', expand=False)
+        numeric = pd.to_numeric(extracted, errors='coerce')
+        return numeric.where(numeric.notna(), spec.default), no_errors
+
+    if spec.type == 'date':
+        serial = pd.to_numeric(values.where(~empty), errors='coerce')
+        serial = serial.where(serial.between(*_EXCEL_SERIAL_RANGE))
+        text = ~empty & serial.isna()
+        dates = pd.to_datetime(values.where(text), format='ISO8601', errors='coerce')
+        rest = text & dates.isna()
+        if rest.any():
+            dates[rest] = pd.to_datetime(values[rest], format='mixed', dayfirst=True, errors='coerce')
+        if serial.notna().any():
+            dates = dates.where(serial.isna(), pd.to_datetime(serial, unit='D', origin='1899-12-30'))
+        bad = ~empty & dates.isna()
+        return dates.dt.normalize().dt.date.where(~empty & ~bad, spec.default), bad
+
+    # leading_number
+    extracted = values.str.extract(r'^\s*([\d\.]+)', expand=False)
+    numeric = pd.to_numeric(extracted, errors='coerce')
+    bad = extracted.notna() & numeric.isna()
+    return numeric.where(numeric.notna(), spec.default), bad
+
+
+def parse_frame(df: pd.DataFrame, spec: Sequence[ColumnSpec], first_row: int = 2) -> ParsedFrame:
+    """
+    Применяет спецификацию колонок к выгрузке целыми колонками (без цикла по строкам).
+    first_row — номер строки файла, соответствующей индексу 0 в df.
+    """
+    raw = df.fillna('').astype(str)
+    # Нужные колонки очищаются от пробелов один раз
+    used = [c for c in dict.fromkeys(c for s in spec for c in s.columns) if c in raw.columns]
+    stripped = pd.DataFrame({c: _strip(_column(raw, c)) for c in used}, index=raw.index)
+    unused = [c for c in raw.columns if c not in stripped.columns]
+    blank = (stripped == '').all(axis=1) & (raw[unused] == '').all(axis=1)
+
+    data = pd.DataFrame(index=raw.index)
+    parsed = ParsedFrame(data, raw, pd.Series(raw.index + first_row, index=raw.index), blank)
+
+    for column_spec in spec:
+        values = _coalesce(stripped, column_spec.columns)
+        converted, bad = _convert(values, column_spec)
+        data[column_spec.field] = converted
+
+        if column_spec.required:
+            parsed.fail(values == '', f"Отсутствует '{column_spec.label}'")
+        if bad.any():
+            parsed.fail(bad, f"Некорректное значение в колонке '{column_spec.label}': " + values)
+
+    return parsed
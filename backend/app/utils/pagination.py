@@ -0,0 +1,108 @@
+from sqlalchemy import Select, tuple_
+from sqlalchemy.orm import Session
+from typing import Any, Dict, Hashable, List, Optional, Sequence, Tuple
+import base64
+import json
+import os
+import threading
+import time
+
+# Сколько секунд точный подсчет строк выборки переиспользуется вместо нового COUNT
+COUNT_CACHE_SECONDS = float(os.getenv("COUNT_CACHE_SECONDS", "60"))
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    """Непрозрачный курсор страницы: значения ключа сортировки последней строки"""
+    return base64.urlsafe_b64encode(json.dumps(list(values)).encode()).decode()
+
+
+def decode_cursor(cursor: str) -> List[Any]:
+    """Разбирает курсор; ValueError, если курсор поврежден"""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except Exception:
+        raise ValueError("Некорректный курсор")
+    if not isinstance(values, list):
+        raise ValueError("Некорректный курсор")
+    return values
+
+
+def keyset_filter(
+    query: Select,
+    order_columns: Sequence[Any],
+    cursor: Optional[str] = None,
+    descending: bool = False
+) -> Select:
+    """Строки после курсора в порядке order_columns (последняя колонка — уникальный ключ)"""
+    if cursor is not None:
+        values = decode_cursor(cursor)
+        if len(values) != len(order_columns):
+            raise ValueError("Некорректный курсор")
+        row_key, cursor_key = tuple_(*order_columns), tuple_(*values)
+        query = query.where(row_key < cursor_key if descending else row_key > cursor_key)
+
+    return query.order_by(*[column.desc() if descending else column.asc() for column in order_columns])
+
+
+def keyset_page(
+    db: Session,
+    query: Select,
+    order_columns: Sequence[Any],
+    limit: int,
+    cursor: Optional[str] = None,
+    descending: bool = False
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """
+    Страница выборки по ключу (keyset) вместо OFFSET: строки после курсора
+    в порядке order_columns (последняя колонка — уникальный ключ, например штрихкод).
+    При индексе по order_columns время страницы не зависит от ее номера и размера выборки.
+    Колонки order_columns должны быть в query и не содержать NULL.
+    Возвращает (строки, курсор следующей страницы или None)
+    """
+    query = keyset_filter(query, order_columns, cursor, descending)
+    rows = db.execute(query.limit(limit + 1)).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor([rows[-1]._mapping[column] for column in order_columns])
+    return [dict(row._mapping) for row in rows], next_cursor
+
+
+def estimate_count(db: Session, query: Select) -> Optional[int]:
+    """
+    Оценка числа строк выборки планировщиком PostgreSQL (EXPLAIN, запрос не выполняется).
+    На других СУБД — None
+    """
+    bind = db.get_bind()
+    if bind.dialect.name != 'postgresql':
+        return None
+    compiled = query.compile(dialect=bind.dialect)
+    plan = db.connection().exec_driver_sql("EXPLAIN (FORMAT JSON) " + str(compiled), compiled.params).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+class CountCache:
+    """Точные COUNT по ключу фильтров, живут ttl секунд (в памяти процесса)"""
+
+    def __init__(self, ttl: float = COUNT_CACHE_SECONDS):
+        self.ttl = ttl
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[int]:
+        with self._lock:
+            entry = self._counts.get(key)
+        if entry is None or time.monotonic() - entry[1] > self.ttl:
+            return None
+        return entry[0]
+
+    def set(self, key: Hashable, count: int):
+        with self._lock:
+            self._counts[key] = (count, time.monotonic())
+
+    def clear(self):
+        with self._lock:
+            self._counts.clear()
@@ -0,0 +1,41 @@
+from sqlalchemy import Table, text
+from sqlalchemy.orm import Session
+from datetime import date
+from typing import Iterable
+
+
+def _month_start(value: date) -> date:
+    return date(value.year, value.month, 1)
+
+
+def _next_month(value: date) -> date:
+    return date(value.year + value.month // 12, value.month % 12 + 1, 1)
+
+
+def ensure_month_partitions(db: Session, table: Table, dates: Iterable[date]):
+    """
+    Создает недостающие месячные секции RANGE-секционированной таблицы PostgreSQL
+    (<таблица>_YYYY_MM) для переданных дат. На других СУБД ничего не делает.
+    Секции создаются в текущей транзакции и откатываются вместе с ней.
+    """
+    if db.get_bind().dialect.name != 'postgresql':
+        return
+
+    months = {_month_start(value) for value in dates if value is not None}
+    if not months:
+        return
+
+    existing = {
+        name for (name,) in db.execute(text(
+            "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = CAST(:table AS regclass)"
+        ), {'table': table.name})
+    }
+    for month in sorted(months):
+        name = f"{table.name}_{month:%Y_%m}"
+        if name in existing:
+            continue
+        db.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {table.name} "
+            f"FOR VALUES FROM ('{month.isoformat()}') TO ('{_next_month(month).isoformat()}')"
+        ))
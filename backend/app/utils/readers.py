@@ -0,0 +1,391 @@
+import csv
+import sys
+import zipfile
+import xml.etree.ElementTree as ET
+from functools import lru_cache
+from itertools import islice
+from typing import Iterator, List, Sequence, Tuple, Union
+
+import pandas as pd
+
+try:
+    from python_calamine import CalamineWorkbook
+except ImportError:  # Необязательная зависимость — без нее XLSX читается безопасным парсером
+    CalamineWorkbook = None
+
+# Единый слой чтения выгрузок: формат определяется по содержимому файла, а не по расширению.
+#   XLSX — calamine (быстро, не читает стили), при ошибке — безопасный потоковый парсер XML;
+#          потоковое чтение порциями — всегда безопасным парсером (память не зависит от размера)
+#   XLS  — calamine, затем xlrd
+# calamine используется напрямую (python-calamine): движок 'calamine' есть только в pandas >= 2.2
+#   CSV/TSV — модуль csv, кодировка (UTF-8 / cp1251) и разделитель определяются автоматически
+# Все значения читаются как строки, пустые ячейки — ''.
+
+SUPPORTED_EXTENSIONS = ('.xlsx', '.xls', '.csv', '.tsv', '.txt')
+
+# Размер порции строк для потокового импорта
+STREAM_CHUNK_SIZE = 5000
+
+_XLSX_MAGIC = b'PK\x03\x04'
+_XLS_MAGIC = b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1'
+_REL_NS = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+
+
+class WrongFileError(ValueError):
+    """Файл не похож на ожидаемую выгрузку (нет нужных колонок в заголовке)"""
+
+
+class SheetLayout:
+    """
+    Расположение таблицы в выгрузке.
+    sheet — индекс (0 — первый лист) или имя листа; для CSV не используется.
+    header_row — 0-базовый номер строки заголовка.
+    required — колонки, без которых файл отклоняется; кортеж имен — достаточно одной из них.
+    title — название выгрузки для сообщения об ошибке ("Файл не похож на <title>").
+    """
+
+    def __init__(
+        self,
+        sheet: Union[int, str] = 0,
+        header_row: int = 0,
+        required: Sequence[Union[str, Sequence[str]]] = (),
+        title: str = "выгрузку"
+    ):
+        self.sheet = sheet
+        self.header_row = header_row
+        self.required = [(c,) if isinstance(c, str) else tuple(c) for c in required]
+        self.title = title
+
+
+def detect_format(file_path: str) -> str:
+    """'xlsx', 'xls' или 'csv' — по сигнатуре файла"""
+    with open(file_path, 'rb') as f:
+        head = f.read(8)
+    if head.startswith(_XLSX_MAGIC):
+        return 'xlsx'
+    if head.startswith(_XLS_MAGIC):
+        return 'xls'
+    return 'csv'
+
+
+# --- Безопасный парсер XLSX без чтения styles.xml ---
+
+@lru_cache(maxsize=None)
+def _column_index(letters: str) -> int:
+    """'A' -> 0, 'AB' -> 27; кэшируется, т.к. различных колонок на листе немного"""
+    v = 0
+    for ch in letters.upper():
+        v = v * 26 + (ord(ch) - ord('A') + 1)
+    return v - 1
+
+
+class _SharedStrings:
+    """
+    Таблица общих строк, читаемая потоково (iterparse) и только до нужного индекса:
+    для заголовка достаточно начала sharedStrings.xml, а не всего файла
+    """
+
+    def __init__(self, z: zipfile.ZipFile):
+        self.values = []
+        self._events = None
+        if "xl/sharedStrings.xml" in z.namelist():
+            self._events = ET.iterparse(z.open("xl/sharedStrings.xml"), events=("end",))
+
+    def get(self, idx: int) -> str:
+        while idx >= len(self.values) and self._events is not None:
+            try:
+                _, elem = next(self._events)
+            except StopIteration:
+                self._events = None
+                break
+            if elem.tag.endswith('}si') or elem.tag == 'si':
+                self.values.append("".join(
+                    t.text for t in elem.iter() if t.tag.endswith('t') and t.text is not None
+                ))
+                elem.clear()
+        return self.values[idx] if 0 <= idx < len(self.values) else ""
+
+
+def _sheet_paths(z: zipfile.ZipFile) -> List[Tuple[str, str]]:
+    """Листы книги в порядке workbook.xml: (имя, путь в архиве)"""
+    wb_root = ET.parse(z.open("xl/workbook.xml")).getroot()
+    rels_root = ET.parse(z.open("xl/_rels/workbook.xml.rels")).getroot()
+    targets = {rel.attrib.get('Id'): rel.attrib.get('Target', '') for rel in rels_root}
+
+    sheets = []
+    for elem in wb_root.iter():
+        if not elem.tag.endswith('}sheet'):
+            continue
+        target = targets.get(elem.attrib.get(f'{{{_REL_NS}}}id'), '')
+        path = target.lstrip('/') if target.startswith('/') else 'xl/' + target
+        sheets.append((elem.attrib.get('name'), path))
+    return sheets
+
+
+def _resolve_sheet_path(z: zipfile.ZipFile, sheet: Union[int, str]) -> str:
+    try:
+        sheets = _sheet_paths(z)
+    except (KeyError, ET.ParseError):
+        sheets = []
+
+    if isinstance(sheet, str):
+        for name, path in sheets:
+            if name == sheet:
+                return path
+        raise FileNotFoundError(f"В файле нет листа '{sheet}'")
+
+    if sheet < len(sheets) and sheets[sheet][1] in z.namelist():
+        return sheets[sheet][1]
+    # Книга без связей листов — обычно это sheet{n}.xml
+    sheet_path = f"xl/worksheets/sheet{sheet + 1}.xml"
+    if sheet_path not in z.namelist():
+        raise FileNotFoundError(f"В файле нет листа №{sheet + 1}")
+    return sheet_path
+
+
+def iter_safe_xlsx_rows(xlsx_path: str, sheet: Union[int, str] = 1) -> Iterator[List[str]]:
+    """
+    Потоково отдает строки листа XLSX как списки строк БЕЗ парсинга styles.xml
+    (устойчиво к битым стилям). Элементы XML очищаются сразу после обработки,
+    пропущенные в файле строки отдаются пустыми, чтобы нумерация совпадала с листом.
+    """
+    with zipfile.ZipFile(xlsx_path) as z:
+        shared = _SharedStrings(z)
+        strings = shared.values
+        sheet_path = _resolve_sheet_path(z, sheet)
+
+        ns = ''
+        sheet_data = None
+        next_row = 1
+        for event, elem in ET.iterparse(z.open(sheet_path), events=("start", "end")):
+            if event == "start":
+                if not ns and elem.tag.startswith('{'):
+                    ns = elem.tag.split('}')[0] + '}'
+                if elem.tag == f"{ns}sheetData":
+                    sheet_data = elem
+                continue
+            if elem.tag != f"{ns}row":
+                continue
+
+            row_number = int(elem.attrib.get("r", next_row))
+            while next_row < row_number:
+                yield []
+                next_row += 1
+            next_row = row_number + 1
+
+            values = []
+            col_idx = -1
+            for c in elem:
+                r_addr = c.attrib.get("r")
+                col_idx = _column_index(r_addr.rstrip("0123456789")) if r_addr else col_idx + 1
+                t = c.attrib.get("t")
+                text = ""
+                if t == "inlineStr":
+                    text = "".join(
+                        n.text for n in c.iter() if n.tag.endswith('t') and n.text is not None
+                    )
+                else:
+                    v = c.find(f"{ns}v")
+                    if v is not None and v.text:
+                        if t == "s":
+                            idx = int(v.text)
+                            text = strings[idx] if idx < len(strings) else shared.get(idx)
+                        else:
+                            text = v.text
+                if col_idx >= len(values):
+                    values.extend([""] * (col_idx - len(values) + 1))
+                values[col_idx] = text
+            yield values
+
+            # Освобождаем обработанные строки, чтобы дерево не росло
+            elem.clear()
+            if sheet_data is not None:
+                sheet_data.clear()
+
+
+def iter_safe_xlsx_chunks(xlsx_path: str, chunk_size: int, sheet: Union[int, str] = 1,
+                          header_row_index: int = 1) -> Iterator[pd.DataFrame]:
+    """Безопасный потоковый парсер порциями — для конвейера потокового импорта"""
+    return iter_row_chunks(iter_safe_xlsx_rows(xlsx_path, sheet), chunk_size, header_row_index)
+
+
+def safe_read_xlsx_sheet_as_dataframe(xlsx_path: str, sheet: Union[int, str] = 1,
+                                      header_row_index: int = 1) -> pd.DataFrame:
+    """
+    Читает указанный лист XLSX БЕЗ парсинга styles.xml (устойчиво к битым стилям).
+    sheet — 0-базовый индекс листа (1 = второй лист) или имя листа.
+    header_row_index — 0-базовый индекс строки заголовков (1 = вторая строка).
+    Возвращает pandas.DataFrame.
+    """
+    chunks = list(iter_safe_xlsx_chunks(xlsx_path, sys.maxsize, sheet, header_row_index))
+    return chunks[0] if chunks else pd.DataFrame()
+
+
+# --- CSV / TSV ---
+
+def _csv_dialect(file_path: str) -> Tuple[str, str]:
+    """(кодировка, разделитель) по первым 64 КБ файла"""
+    with open(file_path, 'rb') as f:
+        sample = f.read(65536)
+    try:
+        sample.decode('utf-8')
+        encoding = 'utf-8-sig'
+    except UnicodeDecodeError as e:
+        # Обрезанный на границе буфера многобайтовый символ — все равно UTF-8
+        encoding = 'utf-8-sig' if e.start >= len(sample) - 3 else 'cp1251'
+
+    text = sample.decode(encoding, errors='ignore')
+    try:
+        delimiter = csv.Sniffer().sniff(text, delimiters=';,\t|').delimiter
+    except csv.Error:
+        delimiter = '\t' if file_path.lower().endswith('.tsv') else ','
+    return encoding, delimiter
+
+
+def iter_csv_rows(file_path: str) -> Iterator[List[str]]:
+    encoding, delimiter = _csv_dialect(file_path)
+    with open(file_path, encoding=encoding, newline='') as f:
+        yield from csv.reader(f, delimiter=delimiter)
+
+
+# --- Сборка строк в DataFrame ---
+
+def _cell_to_str(value) -> str:
+    """Значение ячейки как строка — так же, как pd.read_excel(dtype=str)"""
+    if value is None:
+        return ''
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+def iter_row_chunks(rows: Iterator[List[str]], chunk_size: int = STREAM_CHUNK_SIZE,
+                    header_row_index: int = 0) -> Iterator[pd.DataFrame]:
+    """
+    Собирает поток строк листа (списки строк) в DataFrame'ы по chunk_size строк.
+    Индекс сквозной: 0 — первая строка после заголовка, как у pd.read_excel.
+    Пустые строки в конце листа отбрасываются.
+    """
+    header = None
+    width = 0
+    start = 0
+    chunk = []
+    pending_blank = []
+
+    for position, row in enumerate(rows):
+        if position < header_row_index:
+            continue
+        if header is None:
+            header = [str(v).strip() if v else f"Unnamed: {i}" for i, v in enumerate(row)]
+            width = len(header)
+            continue
+
+        row = (list(row) + [''] * (width - len(row)))[:width]
+        if not any(v.strip() for v in row):
+            pending_blank.append(row)
+            continue
+        chunk.extend(pending_blank)
+        pending_blank = []
+        chunk.append(row)
+
+        if len(chunk) >= chunk_size:
+            yield pd.DataFrame(chunk, columns=header, index=pd.RangeIndex(start, start + len(chunk)))
+            start += len(chunk)
+            chunk = []
+
+    if chunk:
+        yield pd.DataFrame(chunk, columns=header, index=pd.RangeIndex(start, start + len(chunk)))
+    elif header is not None and start == 0:
+        # Только заголовок — пустая таблица с нужными колонками
+        yield pd.DataFrame(columns=header, dtype=object)
+
+
+def _iter_calamine_rows(file_path: str, sheet: Union[int, str]) -> Iterator[List[str]]:
+    """Строки листа XLSX/XLS через python-calamine (Rust): в разы быстрее openpyxl и не читает стили"""
+    if CalamineWorkbook is None:
+        raise ImportError("python-calamine не установлен")
+    wb = CalamineWorkbook.from_path(file_path)
+    ws = wb.get_sheet_by_name(sheet) if isinstance(sheet, str) else wb.get_sheet_by_index(sheet)
+    # skip_empty_area=False — нумерация строк совпадает с листом (важно для header_row)
+    for row in ws.to_python(skip_empty_area=False):
+        yield [v if isinstance(v, str) else _cell_to_str(v) for v in row]
+
+
+def _iter_xlrd_rows(file_path: str, sheet: Union[int, str]) -> Iterator[List[str]]:
+    df = pd.read_excel(file_path, sheet_name=sheet, header=None, dtype=str, engine='xlrd').fillna('')
+    yield from df.values.tolist()
+
+
+def _iter_rows(file_path: str, layout: SheetLayout, file_format: str) -> Iterator[List[str]]:
+    """Потоковый (для XLSX и CSV) источник строк файла"""
+    if file_format == 'csv':
+        return iter_csv_rows(file_path)
+    if file_format == 'xlsx':
+        return iter_safe_xlsx_rows(file_path, layout.sheet)
+    return _iter_xls_rows(file_path, layout.sheet)
+
+
+def _iter_xls_rows(file_path: str, sheet: Union[int, str]) -> Iterator[List[str]]:
+    try:
+        rows = list(_iter_calamine_rows(file_path, sheet))
+    except Exception:
+        rows = _iter_xlrd_rows(file_path, sheet)
+    yield from rows
+
+
+def _frame(rows: Iterator[List[str]], header_row: int) -> pd.DataFrame:
+    chunks = list(iter_row_chunks(rows, sys.maxsize, header_row))
+    return chunks[0] if chunks else pd.DataFrame()
+
+
+# --- Публичный интерфейс ---
+
+def read_header(file_path: str, layout: SheetLayout) -> List[str]:
+    """
+    Заголовок таблицы без разбора остального файла: для XLSX/CSV читаются
+    только первые строки листа (и начало таблицы общих строк)
+    """
+    file_format = detect_format(file_path)
+    rows = list(islice(_iter_rows(file_path, layout, file_format), layout.header_row + 1))
+    if len(rows) <= layout.header_row:
+        return []
+    return [str(v).strip() if v else f"Unnamed: {i}" for i, v in enumerate(rows[layout.header_row])]
+
+
+def check_columns(file_path: str, layout: SheetLayout):
+    """Отклоняет файл без обязательных колонок за миллисекунды — до полного разбора"""
+    header = read_header(file_path, layout)
+    columns = set(header)
+    missing = [alternatives for alternatives in layout.required if not columns & set(alternatives)]
+    if missing:
+        names = ', '.join(' или '.join(f"'{c}'" for c in alternatives) for alternatives in missing)
+        found = ', '.join(f"'{c}'" for c in header[:10] if not c.startswith('Unnamed: '))
+        raise WrongFileError(
+            f"Файл не похож на {layout.title}: нет колонок {names} в строке {layout.header_row + 1}"
+            + (f". Найдены: {found}" if found else "")
+        )
+
+
+def read_table(file_path: str, layout: SheetLayout) -> pd.DataFrame:
+    """Проверяет заголовок и читает таблицу целиком самым быстрым доступным движком"""
+    check_columns(file_path, layout)
+    file_format = detect_format(file_path)
+
+    if file_format == 'xlsx':
+        try:
+            return _frame(_iter_calamine_rows(file_path, layout.sheet), layout.header_row)
+        except Exception:
+            # Fallback: безопасный парсер без чтения styles.xml
+            return _frame(iter_safe_xlsx_rows(file_path, layout.sheet), layout.header_row)
+    return _frame(_iter_rows(file_path, layout, file_format), layout.header_row)
+
+
+def iter_table_chunks(file_path: str, layout: SheetLayout,
+                      chunk_size: int = STREAM_CHUNK_SIZE) -> Iterator[pd.DataFrame]:
+    """
+    Потоковое чтение таблицы порциями по chunk_size строк.
+    XLSX и CSV читаются с ограниченной памятью; XLS целиком, но отдается так же порциями.
+    """
+    check_columns(file_path, layout)
+    file_format = detect_format(file_path)
+    yield from iter_row_chunks(_iter_rows(file_path, layout, file_format), chunk_size, layout.header_row)
@@ -0,0 +1,61 @@
+import os
+import tempfile
+
+import pandas as pd
+import pytest
+
+# Движок приложения создается при импорте app.database, поэтому адрес задается до импорта.
+# По умолчанию — временная SQLite; TEST_DATABASE_URL — прогон на PostgreSQL (таблицы пересоздаются!)
+os.environ["DATABASE_URL"] = os.getenv(
+    "TEST_DATABASE_URL", "sqlite:///" + os.path.join(tempfile.mkdtemp(), "test.db")
+)
+# Снимок каталога собирается фоновым потоком — в тестах чтения идут в БД
+os.environ["CATALOG_SNAPSHOT"] = "0"
+
+from app.database import Base, SessionLocal, engine  # noqa: E402
+import app.models  # noqa: E402,F401
+
+
+@pytest.fixture
+def db():
+    """Сессия на чистой схеме: таблицы создаются перед тестом и удаляются после"""
+    Base.metadata.create_all(bind=engine)
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+        Base.metadata.drop_all(bind=engine)
+
+
+@pytest.fixture
+def postgresql(db):
+    if db.get_bind().dialect.name != 'postgresql':
+        pytest.skip("нужен PostgreSQL (TEST_DATABASE_URL)")
+    return db
+
+
+@pytest.fixture
+def write_1c(tmp_path):
+    """Пишет выгрузку 1С из строк (штрихкод, название); возвращает путь к новому файлу"""
+    files = iter(range(1000))
+
+    def write(rows):
+        path = tmp_path / f"1c_{next(files)}.xlsx"
+        pd.DataFrame([
+            {
+                'ШК': barcode,
+                'Артикул': f'art{barcode}',
+                'Номенклатура': name,
+                'Свойство: Фирма': 'Бренд',
+                'Свойство: Тип товара': 'Тип',
+                'Склад на Есенина': '1',
+                'Склад на Есенина SOFT': '0',
+                'Склад на Есенина Дальний': '0',
+                'Цена: Закупочная,руб.': '100.5',
+            }
+            for barcode, name in rows
+        ]).to_excel(path, index=False)
+        return str(path)
+
+    return write
@@ -0,0 +1,49 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from app.models import ImportLog, Product
+from app.services import batch_service
+from app.services.batch_service import BatchImportService
+from app.services.import_service import ImportService
+
+
+@pytest.fixture(autouse=True)
+def thread_pool(monkeypatch):
+    # Разбор в потоках вместо процессов spawn: тесту нужна та же временная база
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        monkeypatch.setattr(batch_service, '_get_pool', lambda: pool)
+        yield
+
+
+def test_file_failing_before_log_is_reported(db, write_1c, tmp_path, monkeypatch):
+    start_log = ImportService._start_log
+
+    def failing(self, source, file_path):
+        if source == 'wb_prices':
+            raise RuntimeError('БД недоступна')
+        return start_log(self, source, file_path)
+
+    monkeypatch.setattr(ImportService, '_start_log', failing)
+    missing = str(tmp_path / 'wb_prices.xlsx')  # разбор тоже падает — ошибка только логируется
+
+    result = BatchImportService(db).run({
+        '1c': (write_1c([('1000', 'Товар')]), None),
+        'wb_prices': (missing, None),
+    })
+
+    assert result['status'] == 'partial'
+    assert [(log.source, log.status) for log in result['logs']] == [('1c', 'success'), ('wb_prices', 'failed')]
+    assert result['logs'][1].error_message == 'БД недоступна'
+    assert db.query(ImportLog).filter(ImportLog.status == 'failed').count() == 1
+    assert db.get(Product, '1000') is not None
+
+
+def test_dry_run_failure_before_report(db, tmp_path, monkeypatch):
+    monkeypatch.setattr(ImportService, '_start_log', lambda self, source, file_path: 1 / 0)
+
+    result = BatchImportService(db).run({'wb_prices': (str(tmp_path / 'wb_prices.xlsx'), None)}, dry_run=True)
+
+    assert result['status'] == 'failed'
+    assert result['logs'][0].status == 'failed'
+    assert db.query(ImportLog).count() == 0
@@ -0,0 +1,68 @@
+import pytest
+
+from app.models import ImportRowHash, Product
+from app.utils import bulk
+from app.utils.bulk import bulk_upsert, iter_batches
+
+
+def _names(db):
+    return dict(db.query(Product.barcode, Product.name).order_by(Product.barcode).all())
+
+
+def test_iter_batches():
+    assert [list(batch) for batch in iter_batches(list(range(5)), 2)] == [[0, 1], [2, 3], [4]]
+
+
+def test_inserts_new_and_updates_existing(db):
+    db.add(Product(barcode='1', name='old'))
+    db.commit()
+
+    added, updated = bulk_upsert(db, Product, [
+        {'barcode': '1', 'name': 'new'},
+        {'barcode': '2', 'name': 'added'},
+    ])
+    db.commit()
+
+    assert (added, updated) == (1, 1)
+    assert _names(db) == {'1': 'new', '2': 'added'}
+
+
+def test_duplicate_keys_last_row_wins(db):
+    added, updated = bulk_upsert(db, Product, [
+        {'barcode': '1', 'name': 'first'},
+        {'barcode': '1', 'name': 'last'},
+    ])
+    db.commit()
+
+    assert (added, updated) == (1, 0)
+    assert _names(db) == {'1': 'last'}
+
+
+def test_empty_rows(db):
+    assert bulk_upsert(db, Product, []) == (0, 0)
+
+
+def test_batches_and_composite_key(db):
+    rows = [{'source': source, 'key': str(i), 'row_hash': 'a'} for source in ('1c', 'wb') for i in range(5)]
+    assert bulk_upsert(db, ImportRowHash, rows, batch_size=3) == (10, 0)
+    db.commit()
+
+    rows[0]['row_hash'] = 'b'
+    assert bulk_upsert(db, ImportRowHash, rows, batch_size=3) == (0, 10)
+    db.commit()
+    assert db.get(ImportRowHash, ('1c', '0')).row_hash == 'b'
+
+
+@pytest.mark.parametrize('staging_min_rows', [0, 10 ** 6], ids=['staging', 'direct'])
+def test_postgresql_paths(postgresql, monkeypatch, staging_min_rows):
+    monkeypatch.setattr(bulk, 'STAGING_MIN_ROWS', staging_min_rows)
+    db = postgresql
+    db.add(Product(barcode='1', name='old'))
+    db.commit()
+
+    rows = [{'barcode': str(i), 'name': f'n{i}'} for i in range(1, 6)]
+    assert bulk_upsert(db, Product, rows, batch_size=2) == (4, 1)
+    # Повторный вызов в той же транзакции (staging-таблица пересоздается)
+    assert bulk_upsert(db, Product, rows[:2]) == (0, 2)
+    db.commit()
+    assert _names(db) == {str(i): f'n{i}' for i in range(1, 6)}
@@ -0,0 +1,81 @@
+from datetime import date
+
+import pandas as pd
+import pytest
+
+from app.utils.column_spec import ColumnSpec, parse_frame
+
+
+def _frame(rows):
+    return pd.DataFrame(rows, dtype=object)
+
+
+def test_types_and_errors():
+    df = _frame([
+        {'ШК': ' 100 ', 'Остаток': '3', 'Цена': '1 500,50', 'Мин': '99.5 руб', 'Дата': '31.05.2024'},
+        {'ШК': '101', 'Остаток': '2.5', 'Цена': 'нет', 'Мин': '', 'Дата': '45443'},
+        {'ШК': '', 'Остаток': '', 'Цена': '', 'Мин': '', 'Дата': 'когда-то'},
+    ])
+    parsed = parse_frame(df, [
+        ColumnSpec('ШК', 'barcode', required=True),
+        ColumnSpec('Остаток', 'stock', 'int', default=0),
+        ColumnSpec('Цена', 'price', 'number'),
+        ColumnSpec('Мин', 'min_price', 'leading_number'),
+        ColumnSpec('Дата', 'day', 'date'),
+    ])
+
+    assert parsed.data['barcode'].tolist() == ['100', '101', '']
+    assert parsed.data.loc[0, 'stock'] == 3
+    assert parsed.data.loc[0, 'price'] == 1500.5
+    assert parsed.data.loc[0, 'min_price'] == 99.5
+    assert parsed.data.loc[0, 'day'] == date(2024, 5, 31)
+    # Серийный номер даты Excel
+    assert parsed.data.loc[1, 'day'] == date(2024, 5, 31)
+    # 'number' не дает ошибки — нераспознанное значение становится default
+    assert pd.isna(parsed.data.loc[1, 'price'])
+
+    assert parsed.error_mask.tolist() == [False, True, True]
+    assert parsed.reasons[1] == "Некорректное значение в колонке 'Остаток': 2.5"
+    # У строки сохраняется первая причина
+    assert parsed.reasons[2] == "Отсутствует 'ШК'"
+    assert parsed.source_rows.tolist() == [2, 3, 4]
+    assert parsed.records() == [
+        {'barcode': '100', 'stock': 3, 'price': 1500.5, 'min_price': 99.5, 'day': date(2024, 5, 31)}
+    ]
+
+
+def test_alternative_columns_and_missing_column():
+    df = _frame([
+        {'Баркод': '', 'Последний баркод': '200'},
+        {'Баркод': '201', 'Последний баркод': '999'},
+    ])
+    parsed = parse_frame(df, [
+        ColumnSpec(('Баркод', 'Последний баркод'), 'barcode'),
+        ColumnSpec('Нет такой', 'missing', 'float', default=1.0),
+    ])
+    assert parsed.data['barcode'].tolist() == ['200', '201']
+    assert parsed.data['missing'].tolist() == [1.0, 1.0]
+    assert parsed.failed_count == 0
+
+
+def test_blank_rows_and_skip():
+    df = _frame([{'ШК': '1', 'Прочее': ''}, {'ШК': ' ', 'Прочее': None}, {'ШК': '', 'Прочее': 'x'}])
+    parsed = parse_frame(df, [ColumnSpec('ШК', 'barcode')], first_row=5)
+    assert parsed.blank.tolist() == [False, True, False]
+
+    parsed.skip(parsed.blank)
+    assert parsed.valid()['barcode'].tolist() == ['1', '']
+
+
+def test_batches_resume_after_row():
+    df = _frame([{'ШК': str(i)} for i in range(7)])
+    parsed = parse_frame(df, [ColumnSpec('ШК', 'barcode')])  # строки файла 2..8
+
+    assert [part.data['barcode'].tolist() for part in parsed.batches(3)] == [['0', '1', '2'], ['3', '4', '5'], ['6']]
+    # Строки до 4-й включительно уже записаны
+    assert [part.source_rows.tolist() for part in parsed.batches(3, after_row=4)] == [[5, 6, 7], [8]]
+
+
+def test_unknown_type():
+    with pytest.raises(ValueError):
+        ColumnSpec('ШК', 'barcode', 'decimal')
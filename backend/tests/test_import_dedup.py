@@ -0,0 +1,41 @@
+import pytest
+
+from app.api.products import update_product
+from app.models import ImportRowHash, Product
+from app.schemas.product import ProductUpdate
+from app.services.import_service import ImportService
+
+
+def counters(import_log):
+    return (
+        import_log.status, import_log.records_added, import_log.records_updated,
+        import_log.records_unchanged, import_log.records_failed
+    )
+
+
+@pytest.mark.parametrize('options', [{}, {'bulk': True}, {'chunk_size': 2}], ids=['rows', 'bulk', 'stream'])
+def test_unchanged_rows_are_skipped(db, write_1c, options):
+    rows = [(str(1000 + i), f'Товар {i}') for i in range(5)]
+    path = write_1c(rows)
+
+    assert counters(ImportService(db).import_1c_data(path, **options)) == ('success', 5, 0, 0, 0)
+    assert db.query(ImportRowHash).filter(ImportRowHash.source == '1c').count() == 5
+
+    # Тот же файл: ни одна строка не перезаписывается
+    assert counters(ImportService(db).import_1c_data(path, **options)) == ('success', 0, 0, 5, 0)
+
+    rows[0] = (rows[0][0], 'Новое название')
+    path = write_1c(rows)
+    assert counters(ImportService(db).import_1c_data(path, **options)) == ('success', 0, 1, 4, 0)
+    assert db.get(Product, '1000').name == 'Новое название'
+
+
+def test_manual_change_resets_row_hash(db, write_1c):
+    """Товар, измененный через API, перезаписывается следующим импортом того же файла"""
+    path = write_1c([('1000', 'Товар')])
+    ImportService(db).import_1c_data(path)
+
+    update_product('1000', ProductUpdate(name='Правка вручную'), db)
+
+    assert counters(ImportService(db).import_1c_data(path)) == ('success', 0, 1, 0, 0)
+    assert db.get(Product, '1000').name == 'Товар'
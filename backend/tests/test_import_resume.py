@@ -0,0 +1,50 @@
+import pytest
+
+from app.models import ImportLog, Product
+from app.services.import_service import ImportService
+
+
+class Interrupted(Exception):
+    pass
+
+
+def fail_on_commit(monkeypatch, number):
+    """Импорт падает на фиксации пачки с номером number (с 1)"""
+    commit_batch = ImportService._commit_batch
+    calls = []
+
+    def failing(self, *args, **kwargs):
+        calls.append(1)
+        if len(calls) == number:
+            raise Interrupted()
+        return commit_batch(self, *args, **kwargs)
+
+    monkeypatch.setattr(ImportService, '_commit_batch', failing)
+
+
+def counters(import_log):
+    return (
+        import_log.status, import_log.records_processed, import_log.records_added,
+        import_log.records_failed, import_log.checkpoint_row
+    )
+
+
+@pytest.mark.parametrize('options', [{'bulk': True}, {'chunk_size': 4}], ids=['bulk', 'stream'])
+def test_resume_from_checkpoint(db, write_1c, monkeypatch, options):
+    path = write_1c([(str(1000 + i), f'Товар {i}') for i in range(10)])
+
+    with monkeypatch.context() as patch:
+        fail_on_commit(patch, 3)
+        with pytest.raises(Interrupted):
+            ImportService(db, commit_size=2).import_1c_data(path, **options)
+
+    import_log = db.query(ImportLog).one()
+    # Зафиксированы две пачки по 2 строки: строки файла 2..5
+    assert counters(import_log) == ('failed', 4, 4, 0, 5)
+    assert db.query(Product).count() == 4
+
+    resumed = ImportService(db, resume=import_log, commit_size=2).import_1c_data(path, **options)
+
+    assert resumed.id == import_log.id
+    assert counters(resumed) == ('success', 10, 10, 0, 11)
+    assert sorted(barcode for barcode, in db.query(Product.barcode)) == [str(1000 + i) for i in range(10)]
@@ -0,0 +1,75 @@
+import pytest
+from sqlalchemy import select
+
+from app.models import Product
+from app.utils.pagination import CountCache, decode_cursor, encode_cursor, estimate_count, keyset_page
+
+
+def test_cursor_roundtrip():
+    values = [12.5, None, 'штрихкод', 3]
+    assert decode_cursor(encode_cursor(values)) == values
+
+
+@pytest.mark.parametrize('cursor', ['not base64!', encode_cursor([])[:-2] + '!!', 'eyJhIjogMX0='])
+def test_broken_cursor(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
+
+
+@pytest.fixture
+def products(db):
+    # Повторяющиеся остатки: порядок внутри равных значений задает штрихкод
+    db.add_all([Product(barcode=f'{i:03d}', name=f'n{i}', stock_total=i % 3) for i in range(10)])
+    db.commit()
+    return db
+
+
+def walk(db, limit, descending=False):
+    query = select(Product.barcode, Product.stock_total)
+    order = [Product.stock_total, Product.barcode]
+    pages, cursor = [], None
+    while True:
+        rows, cursor = keyset_page(db, query, order, limit, cursor, descending)
+        pages.append([row['barcode'] for row in rows])
+        if cursor is None:
+            return pages
+
+
+@pytest.mark.parametrize('descending', [False, True])
+def test_keyset_page_walks_all_rows_once(products, descending):
+    expected = sorted(
+        (f'{i:03d}' for i in range(10)), key=lambda barcode: (int(barcode) % 3, barcode), reverse=descending
+    )
+    pages = walk(products, 4, descending)
+    assert [len(page) for page in pages] == [4, 4, 2]
+    assert sum(pages, []) == expected
+
+
+def test_keyset_page_exact_fit(products):
+    # Последняя полная страница не дает курсора на пустую
+    assert [len(page) for page in walk(products, 5)] == [5, 5]
+
+
+def test_cursor_with_wrong_key_length(products):
+    with pytest.raises(ValueError):
+        keyset_page(products, select(Product.barcode), [Product.barcode], 5, encode_cursor([1, '001']))
+
+
+def test_estimate_count_only_on_postgresql(db):
+    if db.get_bind().dialect.name != 'postgresql':
+        assert estimate_count(db, select(Product.barcode)) is None
+
+
+def test_count_cache_ttl(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr('app.utils.pagination.time.monotonic', lambda: now[0])
+    cache = CountCache(ttl=10)
+    cache.set(('brand',), 42)
+    assert cache.get(('brand',)) == 42
+
+    now[0] += 11
+    assert cache.get(('brand',)) is None
+
+    cache.set(('brand',), 1)
+    cache.clear()
+    assert cache.get(('brand',)) is None
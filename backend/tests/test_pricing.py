@@ -0,0 +1,75 @@
+import pandas as pd
+import pytest
+
+from app.services import pricing_service
+from app.services.pricing_service import PricingFrame, PricingSimulator
+
+COLUMNS = [
+    'barcode', 'marketplace', 'price_before_discount', 'current_price', 'min_price',
+    'brand', 'product_category', 'product_type', 'purchase_price', 'stock_total', 'abc_category'
+]
+
+
+@pytest.fixture
+def simulator(monkeypatch):
+    # Строки marketplace_data по штрихкоду, как их загружает PricingFrame.load
+    frame = PricingFrame(pd.DataFrame([
+        ('1', 'wb', 200.0, 100.0, 90.0, 'A', 'cups', 't', 50.0, 10, 'A'),
+        ('1', 'ozon', None, 80.0, None, 'A', 'cups', 't', 50.0, 10, 'A'),
+        ('2', 'wb', 400.0, 300.0, 250.0, 'B', 'mugs', 't', 100.0, 0, 'B'),
+        ('3', 'ozon', None, 10.0, None, 'B', 'mugs', 't', None, 5, None),
+    ], columns=COLUMNS), load_seconds=0)
+    monkeypatch.setattr(pricing_service, 'get_pricing_frame', lambda db, refresh=False: frame)
+    return PricingSimulator(db=None)
+
+
+def prices(result):
+    return {item['barcode']: item['price_after'] for item in result['items']}
+
+
+def test_price_changes_compose(simulator):
+    result = simulator.simulate([
+        {'brand': 'B', 'price_change_percent': 10},
+        {'barcodes': ['2'], 'price_change_percent': -10},
+    ])
+    # 300 * 1.1 * 0.9
+    assert prices(result) == {'2': 297.0, '3': 11.0}
+
+
+def test_discount_replaces_earlier_changes(simulator):
+    result = simulator.simulate([
+        {'price_change_percent': 50},
+        {'marketplace': 'wb', 'discount_percent': 25},
+    ])
+    # wb — от цены до скидки (у товара 2 вернулась прежняя цена 300); ozon без цены до скидки — только +50%
+    assert prices(result) == {'1': 150.0, '3': 15.0}
+    assert result['summary']['rows_changed'] == 3
+
+
+def test_margins_and_min_price(simulator):
+    result = simulator.simulate([{'marketplace': 'wb', 'discount_percent': 60}])
+    summary = result['summary']
+    assert summary['skus_total'] == 3
+    assert summary['skus_changed'] == 2
+    assert summary['below_min_price_before'] == 0
+    assert summary['below_min_price_after'] == 2
+
+    item = {item['barcode']: item for item in result['items']}['1']
+    # Наценка — по максимальной цене среди маркетплейсов: 80 (ozon) против закупочных 50
+    assert (item['price_before'], item['price_after']) == (100.0, 80.0)
+    assert (item['margin_after'], item['margin_percent_after']) == (30.0, 60.0)
+    assert item['below_min_price'] is True
+    # Сначала товары ниже минимальной цены, затем по падению наценки
+    assert [item['barcode'] for item in result['items']] == ['2', '1']
+
+
+def test_unknown_filter_value_changes_nothing(simulator):
+    result = simulator.simulate([{'brand': 'нет такого', 'price_change_percent': 10}])
+    assert result['summary']['rows_changed'] == 0
+    assert result['items'] == []
+
+
+@pytest.mark.parametrize('rule', [{}, {'discount_percent': 10, 'price_change_percent': 5}])
+def test_rule_needs_exactly_one_change(simulator, rule):
+    with pytest.raises(ValueError):
+        simulator.simulate([rule])
@@ -0,0 +1,25 @@
+from sqlalchemy import create_engine, inspect, text
+
+from app.models.upgrades import ADDED_COLUMNS, ADDED_INDEXES, upgrade_schema
+
+
+def test_upgrade_adds_missing_columns_and_indexes(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    # Таблицы в том виде, в каком их создавали прежние версии
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE products (barcode VARCHAR PRIMARY KEY, name VARCHAR NOT NULL, stock_total INTEGER)"))
+        conn.execute(text("CREATE TABLE calculated_data (barcode VARCHAR PRIMARY KEY, margin_percent FLOAT)"))
+        conn.execute(text("CREATE TABLE import_logs (id INTEGER PRIMARY KEY, source VARCHAR NOT NULL)"))
+        conn.execute(text("INSERT INTO import_logs (id, source) VALUES (1, '1c')"))
+
+    upgrade_schema(engine)
+    # Повторный запуск ничего не меняет
+    upgrade_schema(engine)
+
+    inspector = inspect(engine)
+    for column in ADDED_COLUMNS:
+        assert column.name in {c['name'] for c in inspector.get_columns(column.table.name)}
+    for index in ADDED_INDEXES:
+        assert index.name in {i['name'] for i in inspector.get_indexes(index.table.name)}
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT source, file_hash FROM import_logs")).all() == [('1c', None)]
@@ -44,7 +44,7 @@ const ImportCard = ({ title, description, onUpload, loading }) => {
         </Typography>
         <input
           type="file"
-          accept=".xlsx,.xls"
+          accept=".xlsx,.xls,.csv,.tsv,.txt"
           onChange={handleFileChange}
           style={{ display: 'none' }}
           id={`file-input-${title}`}
@@ -154,7 +154,7 @@ const ImportPage = () => {
       const url = window.URL.createObjectURL(new Blob([response.data]));
       const link = document.createElement('a');
       link.href = url;
-      link.setAttribute('download', lastImportResult.error_report_file || 'error-report.xlsx');
+      link.setAttribute('download', lastImportResult.error_report_file || `error_report_${lastImportResult.source}_${lastImportResult.id}.xlsx`);
       document.body.appendChild(link);
       link.click();
       document.body.removeChild(link);